@@ -0,0 +1 @@
+"""Coursia backend. Run from the repository root: uvicorn backend.main:app"""
@@ -0,0 +1,81 @@
+"""
+Streaming ZIP archives of generated course folders.
+
+The download ZIP is no longer materialized on disk: iter_zip() walks the job
+folder and yields the archive in chunks while it is being written, so a course
+is stored once and the download is ready as soon as the job folder is complete.
+"""
+import io
+import zipfile
+from pathlib import Path
+from typing import Iterator
+
+CHUNK_SIZE = 256 * 1024
+
+# already compressed formats are stored as-is
+STORED_SUFFIXES = {".png", ".jpg", ".jpeg", ".webp", ".mp4", ".webm", ".mov", ".zip", ".gz", ".br"}
+# never part of a download (partial uploads, precompressed variants, ...)
+EXCLUDED_SUFFIXES = {".part", ".tmp", ".gz", ".br"}
+
+
+class _StreamBuffer(io.RawIOBase):
+    """Write-only, non-seekable sink; zipfile then writes data descriptors."""
+
+    def __init__(self):
+        self._chunks = []
+        self._pos = 0
+
+    def writable(self):
+        return True
+
+    def write(self, b):
+        self._chunks.append(bytes(b))
+        self._pos += len(b)
+        return len(b)
+
+    def tell(self):
+        return self._pos
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def archive_members(folder: Path) -> list:
+    """Files that belong into the download, in a stable order."""
+    return sorted(
+        p for p in folder.rglob("*")
+        if p.is_file()
+        and p.suffix.lower() not in EXCLUDED_SUFFIXES
+        and not any(part.startswith(".") for part in p.relative_to(folder).parts)
+    )
+
+
+def iter_zip(folder: Path) -> Iterator[bytes]:
+    """Yields a ZIP of `folder` chunk by chunk (no temp file)."""
+    folder = Path(folder)
+    sink = _StreamBuffer()
+    with zipfile.ZipFile(sink, mode="w", compression=zipfile.ZIP_DEFLATED) as zf:
+        for path in archive_members(folder):
+            info = zipfile.ZipInfo.from_file(path, arcname=path.relative_to(folder).as_posix())
+            if path.suffix.lower() in STORED_SUFFIXES:
+                info.compress_type = zipfile.ZIP_STORED
+            else:
+                info.compress_type = zipfile.ZIP_DEFLATED
+            with open(path, "rb") as src, zf.open(info, mode="w", force_zip64=info.file_size > 0x7FFFFFFF) as dst:
+                while True:
+                    block = src.read(CHUNK_SIZE)
+                    if not block:
+                        break
+                    dst.write(block)
+                    data = sink.drain()
+                    if data:
+                        yield data
+            data = sink.drain()
+            if data:
+                yield data
+    # central directory
+    data = sink.drain()
+    if data:
+        yield data
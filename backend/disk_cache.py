@@ -0,0 +1,102 @@
+"""
+Size-bounded, content-addressed disk cache with LRU eviction.
+
+Entries live as files under <root>/<key[:2]>/<key>. Recency is the file mtime
+(touched on every hit), so the LRU order survives restarts; the in-memory index
+is rebuilt from a directory scan on first use, or up front via warm().
+
+All methods do blocking file I/O: async callers run them via asyncio.to_thread.
+"""
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional
+
+
+class DiskLRUCache:
+    def __init__(self, root: Path, max_bytes: int):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._index: Optional[OrderedDict] = None  # key -> size, oldest first
+        self._total = 0
+
+    def _path(self, key: str) -> Path:
+        return self.root / key[:2] / key
+
+    def _load_index(self):
+        if self._index is not None:
+            return
+        entries = []
+        if self.root.exists():
+            for shard in self.root.iterdir():
+                if not shard.is_dir():
+                    continue
+                for f in shard.iterdir():
+                    if f.name.endswith(".tmp"):
+                        continue
+                    try:
+                        st = f.stat()
+                    except FileNotFoundError:
+                        continue
+                    entries.append((st.st_mtime, f.name, st.st_size))
+        entries.sort()
+        self._index = OrderedDict((name, size) for _, name, size in entries)
+        self._total = sum(self._index.values())
+
+    def warm(self):
+        """Builds the index now (the directory scan), e.g. in a thread at startup."""
+        with self._lock:
+            self._load_index()
+
+    def get(self, key: str) -> Optional[bytes]:
+        path = self._path(key)
+        with self._lock:
+            self._load_index()
+            try:
+                data = path.read_bytes()
+            except FileNotFoundError:
+                # evicted by another process
+                if key in self._index:
+                    self._total -= self._index.pop(key)
+                return None
+            if key not in self._index:
+                self._index[key] = len(data)
+                self._total += len(data)
+            self._index.move_to_end(key)
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return data
+
+    def set(self, key: str, data: bytes):
+        if len(data) > self.max_bytes:
+            return
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        tmp.write_bytes(data)
+        os.replace(tmp, path)
+        with self._lock:
+            self._load_index()
+            if key in self._index:
+                self._total -= self._index.pop(key)
+            self._index[key] = len(data)
+            self._total += len(data)
+            self._evict()
+
+    def _evict(self):
+        while self._total > self.max_bytes and self._index:
+            key, size = self._index.popitem(last=False)
+            self._total -= size
+            try:
+                self._path(key).unlink()
+            except FileNotFoundError:
+                pass
+
+    def stats(self) -> dict:
+        with self._lock:
+            self._load_index()
+            return {"entries": len(self._index), "bytes": self._total, "max_bytes": self.max_bytes}
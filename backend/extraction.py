@@ -0,0 +1,207 @@
+"""
+Document text extraction shared by /api/materials and /api/read-file.
+
+EXTRACTORS maps file suffixes to a format name and a module-level extractor
+function. Parsing runs in the shared process pool (see process_pool.py); async
+extractors (OCR, see ocr.py) schedule their own pool work. Several files of one
+upload are extracted concurrently, and per-format timings are kept for
+/api/extraction/stats.
+
+Extracted text is cached on disk under sha256(format, extractor version, file
+bytes), so the same file going through /api/upload, /api/materials and
+/api/read-file is parsed once. Bump EXTRACTOR_VERSIONS when an extractor's
+output changes. Hashing and cache file I/O run in a thread (one hop for the
+lookup, one for the store), never in the event loop.
+"""
+import asyncio
+import hashlib
+import io
+import os
+import time
+from collections import defaultdict
+from pathlib import Path, PurePath
+
+import docx
+from PyPDF2 import PdfReader
+
+from .disk_cache import DiskLRUCache
+from .ocr import OCR_LANG, ocr_image
+from .process_pool import run_in_process
+
+EXTRACTION_CACHE_ENABLED = os.environ.get("EXTRACTION_CACHE_ENABLED", "1") != "0"
+EXTRACTION_CACHE_DIR = Path(os.environ.get("EXTRACTION_CACHE_DIR", ".cache/extraction"))
+EXTRACTION_CACHE_MAX_BYTES = int(os.environ.get("EXTRACTION_CACHE_MAX_MB", "128")) * 1024 * 1024
+
+# part of the cache key: bump when an extractor's output changes
+EXTRACTOR_VERSIONS = {
+    "pdf": "1",
+    "docx": "1",
+    "txt": "1",
+    "image": f"2:{OCR_LANG}",
+}
+
+
+class UnsupportedFileType(ValueError):
+    pass
+
+
+class ExtractionError(RuntimeError):
+    pass
+
+
+def extract_pdf(content: bytes) -> str:
+    reader = PdfReader(io.BytesIO(content))
+    return "".join(page.extract_text() or "" for page in reader.pages)
+
+
+def extract_docx(content: bytes) -> str:
+    doc = docx.Document(io.BytesIO(content))
+    return "".join(para.text + "\n" for para in doc.paragraphs)
+
+
+def extract_txt(content: bytes) -> str:
+    return content.decode("utf-8", errors="ignore")
+
+
+async def extract_image(content: bytes) -> str:
+    return await ocr_image(content)
+
+
+def _run_extractor(extractor, content: bytes) -> str:
+    """
+    Pool entry point. Library exceptions (e.g. TesseractNotFoundError) are not always
+    picklable and would break the pool, so they cross the process boundary as
+    ExtractionError.
+    """
+    try:
+        return extractor(content)
+    except Exception as e:
+        raise ExtractionError(f"{type(e).__name__}: {e}") from None
+
+
+# suffix -> (format name, extractor, runs in process pool); async extractors are awaited directly
+EXTRACTORS = {
+    ".pdf": ("pdf", extract_pdf, True),
+    ".docx": ("docx", extract_docx, True),
+    ".txt": ("txt", extract_txt, False),
+    ".png": ("image", extract_image, False),
+    ".jpg": ("image", extract_image, False),
+    ".jpeg": ("image", extract_image, False),
+}
+
+_timings = defaultdict(lambda: {"files": 0, "bytes": 0, "seconds": 0.0, "errors": 0, "cache_hits": 0})
+_cache = DiskLRUCache(EXTRACTION_CACHE_DIR, EXTRACTION_CACHE_MAX_BYTES)
+# cache key -> running extraction, so concurrent requests for the same bytes parse once
+_inflight: dict = {}
+
+
+def cache_key(fmt: str, content: bytes) -> str:
+    h = hashlib.sha256(f"{fmt}:{EXTRACTOR_VERSIONS[fmt]}:".encode())
+    h.update(content)
+    return h.hexdigest()
+
+
+async def _extract(fmt: str, extractor, offload: bool, content: bytes) -> str:
+    stats = _timings[fmt]
+    started = time.perf_counter()
+    try:
+        if asyncio.iscoroutinefunction(extractor):
+            return await extractor(content)
+        if offload:
+            return await run_in_process(_run_extractor, extractor, content)
+        return extractor(content)
+    except Exception:
+        stats["errors"] += 1
+        raise
+    finally:
+        stats["files"] += 1
+        stats["bytes"] += len(content)
+        stats["seconds"] += time.perf_counter() - started
+
+
+def _lookup(fmt: str, content: bytes) -> tuple:
+    """(cache key, cached bytes or None); blocking, runs in a thread."""
+    key = cache_key(fmt, content)
+    return key, _cache.get(key)
+
+
+def _store(key: str, text: str):
+    try:
+        _cache.set(key, text.encode("utf-8"))
+    except OSError as e:
+        print("⚠️ Extraction cache write failed:", e)
+
+
+async def _extract_and_store(key: str, fmt: str, extractor, offload: bool, content: bytes) -> str:
+    text = await _extract(fmt, extractor, offload, content)
+    await asyncio.to_thread(_store, key, text)
+    return text
+
+
+def warm_cache():
+    """Scans the cache directory once (blocking; call it in a thread)."""
+    _cache.warm()
+
+
+async def extract_text(filename: str, content: bytes) -> str:
+    """Extracts the text of one file; raises UnsupportedFileType for unknown suffixes."""
+    suffix = PurePath(filename.lower()).suffix
+    if suffix not in EXTRACTORS:
+        raise UnsupportedFileType(f"Unsupported file type: {suffix or filename}")
+    fmt, extractor, offload = EXTRACTORS[suffix]
+    if not EXTRACTION_CACHE_ENABLED:
+        return await _extract(fmt, extractor, offload, content)
+
+    key, cached = await asyncio.to_thread(_lookup, fmt, content)
+    if cached is not None:
+        _timings[fmt]["cache_hits"] += 1
+        return cached.decode("utf-8")
+
+    task = _inflight.get(key)
+    if task is None:
+        task = asyncio.ensure_future(_extract_and_store(key, fmt, extractor, offload, content))
+        _inflight[key] = task
+        task.add_done_callback(lambda _: _inflight.pop(key, None))
+    else:
+        _timings[fmt]["cache_hits"] += 1
+    return await asyncio.shield(task)
+
+
+async def extract_many(files: list) -> list:
+    """
+    Extracts [(filename, content), ...] concurrently. Returns one entry per file:
+    the text, or the exception raised for that file.
+    """
+    return await asyncio.gather(
+        *[extract_text(name, content) for name, content in files],
+        return_exceptions=True,
+    )
+
+
+_background: set = set()
+
+
+def prewarm(files: list):
+    """Starts extraction of [(filename, content), ...] in the background so later reads hit the cache."""
+    for name, content in files:
+        if PurePath(name.lower()).suffix not in EXTRACTORS:
+            continue
+        task = asyncio.ensure_future(extract_text(name, content))
+        _background.add(task)
+        task.add_done_callback(_prewarm_done)
+
+
+def _prewarm_done(task):
+    _background.discard(task)
+    if not task.cancelled() and task.exception() is not None:
+        print("⚠️ Background extraction failed:", task.exception())
+
+
+def stats() -> dict:
+    return {
+        **{
+            fmt: {**s, "avg_ms": round(1000 * s["seconds"] / s["files"], 1) if s["files"] else 0.0}
+            for fmt, s in _timings.items()
+        },
+        "cache": _cache.stats(),
+    }
@@ -0,0 +1,54 @@
+"""
+Per-job progress events.
+
+_simulate_full_generation publishes stage events here (lesson started/finished,
+zip built, logo/banner done, done/error) and /api/job-events/{job_id} pushes them
+to the browser as SSE, so the frontend no longer has to poll the full job result.
+
+Events are persisted in the job store, so a subscriber connected to a different
+uvicorn worker than the one running the job still sees them: local publishes wake
+subscribers immediately, remote ones are picked up every EVENT_POLL_INTERVAL.
+Store access runs in a thread (asyncio.to_thread), so publishing and the polls of
+many subscribers never block the event loop on SQLite.
+"""
+import asyncio
+import os
+import time
+
+from .job_store import JobStore
+
+TERMINAL_EVENTS = {"done", "error"}
+EVENT_POLL_INTERVAL = float(os.environ.get("JOB_EVENT_POLL_INTERVAL", "0.5"))
+
+
+class JobEventBus:
+    def __init__(self, store: JobStore):
+        self.store = store
+        self._signals = {}  # job_id -> asyncio.Event
+
+    async def publish(self, job_id: str, event: str, **data):
+        await asyncio.to_thread(self.store.append_event, job_id, event, data)
+        signal = self._signals.pop(job_id, None)
+        if signal is not None:
+            signal.set()
+
+    async def since(self, job_id: str, seq: int = 0) -> list:
+        """Events with a sequence number greater than `seq`."""
+        return await asyncio.to_thread(self.store.events_since, job_id, seq)
+
+    async def wait(self, job_id: str, seq: int, timeout: float) -> bool:
+        """Waits until an event newer than `seq` exists; False on timeout."""
+        deadline = time.monotonic() + timeout
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            signal = self._signals.get(job_id)
+            if signal is None:
+                signal = self._signals[job_id] = asyncio.Event()
+            try:
+                await asyncio.wait_for(signal.wait(), min(remaining, EVENT_POLL_INTERVAL))
+                return True
+            except asyncio.TimeoutError:
+                if await self.since(job_id, seq):
+                    return True
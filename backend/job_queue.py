@@ -0,0 +1,363 @@
+"""
+Work queue for background jobs (full-course generation, course slides).
+
+With JOB_EXECUTION=queue the API only enqueues; `python -m backend.worker`
+processes claim jobs, run them and report back. A claimed job is leased for
+JOB_LEASE_SECONDS and the worker keeps renewing the lease (heartbeat) while the
+job runs. If a worker dies, its lease runs out and the job is handed to the
+next worker, up to JOB_MAX_ATTEMPTS times.
+
+JOB_QUEUE=sqlite (default) uses a table next to the job store (same database
+file, WAL mode), enough for API and workers on one host / one shared volume.
+JOB_QUEUE=redis (REDIS_URL) is the option for workers on other machines.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Optional
+
+from .job_store import JOB_STORE_PATH
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+JOB_QUEUE_BACKEND = os.environ.get("JOB_QUEUE", "sqlite")
+JOB_QUEUE_PATH = Path(os.environ.get("JOB_QUEUE_PATH", str(JOB_STORE_PATH)))
+JOB_LEASE_SECONDS = int(os.environ.get("JOB_LEASE_SECONDS", "60"))
+JOB_MAX_ATTEMPTS = int(os.environ.get("JOB_MAX_ATTEMPTS", "3"))
+# erledigte/fehlgeschlagene Einträge werden nach dieser Zeit gelöscht
+JOB_QUEUE_RETENTION_SECONDS = int(os.environ.get("JOB_QUEUE_RETENTION_SECONDS", str(7 * 24 * 3600)))
+REDIS_URL = os.environ.get("REDIS_URL", "redis://localhost:6379/0")
+
+
+class JobQueue:
+    """
+    Interface shared by all backends. Claimed jobs are dicts:
+    job_id, kind, payload, attempts.
+    """
+
+    def enqueue(self, job_id: str, kind: str, payload: dict):
+        """Adds the job; does nothing if it is already queued or running."""
+        raise NotImplementedError
+
+    def claim(self, worker_id: str, lease_seconds: int = JOB_LEASE_SECONDS) -> Optional[dict]:
+        """Leases the oldest queued job to `worker_id`, or returns None."""
+        raise NotImplementedError
+
+    def heartbeat(self, job_id: str, worker_id: str, lease_seconds: int = JOB_LEASE_SECONDS) -> bool:
+        """Extends the lease; False if the worker no longer holds it."""
+        raise NotImplementedError
+
+    def complete(self, job_id: str, worker_id: str) -> bool:
+        raise NotImplementedError
+
+    def fail(self, job_id: str, worker_id: str, error: str) -> bool:
+        raise NotImplementedError
+
+    def release(self, job_id: str, worker_id: str) -> bool:
+        """Gives the job back to the queue without counting the attempt (worker shutdown)."""
+        raise NotImplementedError
+
+    def requeue_expired(self, max_attempts: int = JOB_MAX_ATTEMPTS) -> dict:
+        """Re-queues jobs with expired leases. Returns {"requeued": [ids], "failed": [ids]}."""
+        raise NotImplementedError
+
+    def purge_finished(self, older_than: int = JOB_QUEUE_RETENTION_SECONDS) -> int:
+        raise NotImplementedError
+
+    def stats(self) -> dict:
+        raise NotImplementedError
+
+
+class SQLiteJobQueue(JobQueue):
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS job_queue (
+        job_id TEXT PRIMARY KEY,
+        kind TEXT NOT NULL,
+        payload TEXT NOT NULL,
+        state TEXT NOT NULL,
+        attempts INTEGER NOT NULL DEFAULT 0,
+        worker TEXT,
+        lease_expires_at REAL,
+        error TEXT,
+        enqueued_at REAL NOT NULL,
+        updated_at REAL NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS job_queue_state ON job_queue (state, enqueued_at);
+    """
+
+    def __init__(self, path: Path = JOB_QUEUE_PATH):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._local = threading.local()
+        with self._conn() as conn:
+            conn.executescript(self.SCHEMA)
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def enqueue(self, job_id, kind, payload):
+        now = time.time()
+        # a finished entry with the same id is replaced (re-run / resume)
+        self._conn().execute(
+            "INSERT INTO job_queue (job_id, kind, payload, state, enqueued_at, updated_at) "
+            "VALUES (?, ?, ?, 'queued', ?, ?) "
+            "ON CONFLICT (job_id) DO UPDATE SET kind = excluded.kind, payload = excluded.payload, "
+            "state = 'queued', attempts = 0, worker = NULL, lease_expires_at = NULL, error = NULL, "
+            "enqueued_at = excluded.enqueued_at, updated_at = excluded.updated_at "
+            "WHERE job_queue.state IN ('done', 'failed')",
+            (job_id, kind, json.dumps(payload, ensure_ascii=False), now, now),
+        )
+
+    def claim(self, worker_id, lease_seconds=JOB_LEASE_SECONDS):
+        conn = self._conn()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT job_id, kind, payload, attempts FROM job_queue "
+                "WHERE state = 'queued' ORDER BY enqueued_at LIMIT 1"
+            ).fetchone()
+            if row is not None:
+                conn.execute(
+                    "UPDATE job_queue SET state = 'leased', worker = ?, lease_expires_at = ?, "
+                    "attempts = attempts + 1, updated_at = ? WHERE job_id = ?",
+                    (worker_id, now + lease_seconds, now, row["job_id"]),
+                )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        if row is None:
+            return None
+        return {
+            "job_id": row["job_id"],
+            "kind": row["kind"],
+            "payload": json.loads(row["payload"]),
+            "attempts": row["attempts"] + 1,
+        }
+
+    def _update_leased(self, job_id, worker_id, sql, params) -> bool:
+        cur = self._conn().execute(
+            f"UPDATE job_queue SET {sql}, updated_at = ? "
+            "WHERE job_id = ? AND worker = ? AND state = 'leased'",
+            (*params, time.time(), job_id, worker_id),
+        )
+        return cur.rowcount == 1
+
+    def heartbeat(self, job_id, worker_id, lease_seconds=JOB_LEASE_SECONDS):
+        return self._update_leased(
+            job_id, worker_id, "lease_expires_at = ?", (time.time() + lease_seconds,))
+
+    def complete(self, job_id, worker_id):
+        return self._update_leased(
+            job_id, worker_id, "state = 'done', lease_expires_at = NULL", ())
+
+    def fail(self, job_id, worker_id, error):
+        return self._update_leased(
+            job_id, worker_id, "state = 'failed', lease_expires_at = NULL, error = ?", (error,))
+
+    def release(self, job_id, worker_id):
+        return self._update_leased(
+            job_id, worker_id,
+            "state = 'queued', worker = NULL, lease_expires_at = NULL, attempts = attempts - 1", ())
+
+    def requeue_expired(self, max_attempts=JOB_MAX_ATTEMPTS):
+        conn = self._conn()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            rows = conn.execute(
+                "SELECT job_id, attempts FROM job_queue WHERE state = 'leased' AND lease_expires_at < ?",
+                (now,),
+            ).fetchall()
+            failed = [r["job_id"] for r in rows if r["attempts"] >= max_attempts]
+            requeued = [r["job_id"] for r in rows if r["attempts"] < max_attempts]
+            conn.executemany(
+                "UPDATE job_queue SET state = 'failed', error = 'lease expired', "
+                "lease_expires_at = NULL, updated_at = ? WHERE job_id = ?",
+                [(now, j) for j in failed],
+            )
+            conn.executemany(
+                "UPDATE job_queue SET state = 'queued', worker = NULL, "
+                "lease_expires_at = NULL, updated_at = ? WHERE job_id = ?",
+                [(now, j) for j in requeued],
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return {"requeued": requeued, "failed": failed}
+
+    def purge_finished(self, older_than=JOB_QUEUE_RETENTION_SECONDS):
+        return self._conn().execute(
+            "DELETE FROM job_queue WHERE state IN ('done', 'failed') AND updated_at < ?",
+            (time.time() - older_than,),
+        ).rowcount
+
+    def stats(self):
+        rows = self._conn().execute(
+            "SELECT state, COUNT(*) AS n FROM job_queue GROUP BY state").fetchall()
+        out = {"backend": "sqlite", "queued": 0, "leased": 0, "done": 0, "failed": 0}
+        out.update({r["state"]: r["n"] for r in rows})
+        return out
+
+
+class RedisJobQueue(JobQueue):
+    """
+    Keys (prefix jobq:): "queued" list (LPUSH / RPOP = FIFO), "leases" sorted set
+    (job_id -> lease expiry), "job:<id>" hash (kind, payload, state, attempts,
+    worker, error). State changes are Lua scripts, so each step is atomic.
+    """
+
+    PREFIX = "jobq:"
+
+    _CLAIM = """
+    local id = redis.call('RPOP', KEYS[1])
+    if not id then return nil end
+    local key = ARGV[3] .. id
+    redis.call('ZADD', KEYS[2], ARGV[1], id)
+    redis.call('HSET', key, 'state', 'leased', 'worker', ARGV[2], 'updated_at', ARGV[4])
+    redis.call('HINCRBY', key, 'attempts', 1)
+    return {id, redis.call('HGET', key, 'kind'), redis.call('HGET', key, 'payload'),
+            redis.call('HGET', key, 'attempts')}
+    """
+
+    # KEYS: job hash, leases, queued; ARGV: worker, new state, lease expiry, now, error
+    _UPDATE = """
+    if redis.call('HGET', KEYS[1], 'worker') ~= ARGV[1]
+       or redis.call('HGET', KEYS[1], 'state') ~= 'leased' then return 0 end
+    local id = string.sub(KEYS[1], string.len(ARGV[6]) + 1)
+    if ARGV[2] == 'leased' then
+        redis.call('ZADD', KEYS[2], ARGV[3], id)
+    else
+        redis.call('ZREM', KEYS[2], id)
+        redis.call('HSET', KEYS[1], 'state', ARGV[2], 'error', ARGV[5])
+        if ARGV[2] == 'queued' then
+            redis.call('HDEL', KEYS[1], 'worker')
+            redis.call('HINCRBY', KEYS[1], 'attempts', -1)
+            redis.call('RPUSH', KEYS[3], id)
+        end
+    end
+    redis.call('HSET', KEYS[1], 'updated_at', ARGV[4])
+    return 1
+    """
+
+    _REQUEUE = """
+    local ids = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1])
+    local out = {}
+    for _, id in ipairs(ids) do
+        redis.call('ZREM', KEYS[1], id)
+        local key = ARGV[3] .. id
+        local attempts = tonumber(redis.call('HGET', key, 'attempts') or '0')
+        if attempts >= tonumber(ARGV[2]) then
+            redis.call('HSET', key, 'state', 'failed', 'error', 'lease expired', 'updated_at', ARGV[1])
+            table.insert(out, 'F' .. id)
+        else
+            redis.call('HSET', key, 'state', 'queued', 'updated_at', ARGV[1])
+            redis.call('HDEL', key, 'worker')
+            redis.call('RPUSH', KEYS[2], id)
+            table.insert(out, 'Q' .. id)
+        end
+    end
+    return out
+    """
+
+    def __init__(self, url: str = REDIS_URL):
+        if redis is None:
+            raise RuntimeError("JOB_QUEUE=redis requires the 'redis' package")
+        self.client = redis.Redis.from_url(url, decode_responses=True)
+        self._claim = self.client.register_script(self._CLAIM)
+        self._update = self.client.register_script(self._UPDATE)
+        self._requeue = self.client.register_script(self._REQUEUE)
+
+    def _key(self, name: str) -> str:
+        return self.PREFIX + name
+
+    def enqueue(self, job_id, kind, payload):
+        key = self._key(f"job:{job_id}")
+        if self.client.hget(key, "state") in ("queued", "leased"):
+            return
+        now = time.time()
+        pipe = self.client.pipeline()
+        pipe.delete(key)
+        pipe.hset(key, mapping={
+            "kind": kind, "payload": json.dumps(payload, ensure_ascii=False),
+            "state": "queued", "attempts": 0, "enqueued_at": now, "updated_at": now,
+        })
+        pipe.lpush(self._key("queued"), job_id)
+        pipe.execute()
+
+    def claim(self, worker_id, lease_seconds=JOB_LEASE_SECONDS):
+        now = time.time()
+        row = self._claim(
+            keys=[self._key("queued"), self._key("leases")],
+            args=[now + lease_seconds, worker_id, self._key("job:"), now],
+        )
+        if not row:
+            return None
+        job_id, kind, payload, attempts = row
+        return {"job_id": job_id, "kind": kind, "payload": json.loads(payload), "attempts": int(attempts)}
+
+    def _transition(self, job_id, worker_id, state, lease_seconds=0, error="") -> bool:
+        now = time.time()
+        return bool(self._update(
+            keys=[self._key(f"job:{job_id}"), self._key("leases"), self._key("queued")],
+            args=[worker_id, state, now + lease_seconds, now, error, self._key("job:")],
+        ))
+
+    def heartbeat(self, job_id, worker_id, lease_seconds=JOB_LEASE_SECONDS):
+        return self._transition(job_id, worker_id, "leased", lease_seconds)
+
+    def complete(self, job_id, worker_id):
+        return self._transition(job_id, worker_id, "done")
+
+    def fail(self, job_id, worker_id, error):
+        return self._transition(job_id, worker_id, "failed", error=error)
+
+    def release(self, job_id, worker_id):
+        return self._transition(job_id, worker_id, "queued")
+
+    def requeue_expired(self, max_attempts=JOB_MAX_ATTEMPTS):
+        out = self._requeue(
+            keys=[self._key("leases"), self._key("queued")],
+            args=[time.time(), max_attempts, self._key("job:")],
+        ) or []
+        return {
+            "requeued": [x[1:] for x in out if x.startswith("Q")],
+            "failed": [x[1:] for x in out if x.startswith("F")],
+        }
+
+    def purge_finished(self, older_than=JOB_QUEUE_RETENTION_SECONDS):
+        cutoff = time.time() - older_than
+        purged = 0
+        for key in self.client.scan_iter(self._key("job:*")):
+            state, updated_at = self.client.hmget(key, "state", "updated_at")
+            if state in ("done", "failed") and float(updated_at or 0) < cutoff:
+                purged += self.client.delete(key)
+        return purged
+
+    def stats(self):
+        return {
+            "backend": "redis",
+            "queued": self.client.llen(self._key("queued")),
+            "leased": self.client.zcard(self._key("leases")),
+        }
+
+
+def get_job_queue() -> JobQueue:
+    if JOB_QUEUE_BACKEND == "redis":
+        return RedisJobQueue()
+    return SQLiteJobQueue()
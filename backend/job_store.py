@@ -0,0 +1,443 @@
+"""
+Pluggable job store for full-course generation.
+
+JOB_STORE=sqlite (default) keeps jobs and their progress events in a local SQLite
+database in WAL mode, so every uvicorn worker sees the same jobs and a restart
+keeps finished ones. JOB_STORE=memory is the old single-process dict behaviour.
+Both backends expire jobs JOB_TTL_SECONDS after their last update.
+
+The stores are synchronous. Async code uses AsyncJobStore, which runs every call
+in a worker thread, so SQLite I/O and waits for the write lock (up to
+JOB_STORE_BUSY_TIMEOUT) never block the event loop.
+
+Submissions (Idempotency-Key header, preview fingerprint) are recorded here too,
+so a repeated POST returns the job that is already running instead of a new one.
+
+Checkpoints are named results of finished job steps (a lesson, the logo, ...).
+A resumed job reuses them and only redoes the missing steps. Saving a
+checkpoint, like update(), counts as a sign of life for stale-job detection.
+"""
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Optional
+
+JOB_STORE_BACKEND = os.environ.get("JOB_STORE", "sqlite")
+JOB_STORE_PATH = Path(os.environ.get("JOB_STORE_PATH", ".cache/jobs.sqlite3"))
+JOB_TTL_SECONDS = int(os.environ.get("JOB_TTL_SECONDS", str(7 * 24 * 3600)))
+# max. Wartezeit auf die Schreibsperre (läuft im Thread, nicht im Event-Loop)
+JOB_STORE_BUSY_TIMEOUT = float(os.environ.get("JOB_STORE_BUSY_TIMEOUT_SECONDS", "10"))
+
+
+class JobStore:
+    """Interface shared by all backends. Job dicts: status, preview, result, error, created_at, updated_at."""
+
+    def create(self, job_id: str, status: str = "queued", preview=None):
+        """Creates the job; does nothing if it already exists."""
+        raise NotImplementedError
+
+    def get(self, job_id: str) -> Optional[dict]:
+        raise NotImplementedError
+
+    def get_status(self, job_id: str) -> Optional[str]:
+        raise NotImplementedError
+
+    def get_meta(self, job_id: str) -> Optional[dict]:
+        """status, error and updated_at without loading preview/result."""
+        raise NotImplementedError
+
+    def update(self, job_id: str, **fields):
+        """Updates status/result/error and extends the TTL."""
+        raise NotImplementedError
+
+    def append_event(self, job_id: str, event: str, data: dict) -> dict:
+        """Stores a progress event and returns it with its per-job sequence number."""
+        raise NotImplementedError
+
+    def events_since(self, job_id: str, seq: int = 0) -> list:
+        raise NotImplementedError
+
+    def claim_submission(self, keys: dict, job_id: str, fingerprint: str) -> Optional[dict]:
+        """
+        keys: {submission key: window in seconds}. If one of the keys was claimed
+        within its window by a job that has not failed, returns that claim
+        ({"key", "job_id", "fingerprint"}). Otherwise claims all keys for job_id
+        and returns None. Atomic across processes.
+        """
+        raise NotImplementedError
+
+    def save_checkpoint(self, job_id: str, name: str, data):
+        raise NotImplementedError
+
+    def get_checkpoints(self, job_id: str) -> dict:
+        """{checkpoint name: data}"""
+        raise NotImplementedError
+
+    def list_stale(self, older_than: float) -> list:
+        """
+        Ids of running jobs without any update for `older_than` seconds. Queued jobs
+        are not stale: they are waiting for a worker, not sending heartbeats.
+        """
+        raise NotImplementedError
+
+    def claim_for_resume(self, job_id: str, stale_after: float) -> bool:
+        """
+        Sets the job back to "queued" if it failed ("error") or is "running" but
+        stale. False otherwise: alive, queued, done (nothing to resume) or unknown.
+        Atomic across processes, so only one caller resumes a job.
+        """
+        raise NotImplementedError
+
+    def purge_expired(self) -> int:
+        raise NotImplementedError
+
+
+class MemoryJobStore(JobStore):
+    def __init__(self, ttl_seconds: int = JOB_TTL_SECONDS):
+        self.ttl = ttl_seconds
+        self._jobs = {}
+        self._events = {}
+        self._submissions = {}
+        self._checkpoints = {}
+        self._lock = threading.Lock()
+
+    def _live(self, job_id: str) -> Optional[dict]:
+        job = self._jobs.get(job_id)
+        if job and job["expires_at"] < time.time():
+            return None
+        return job
+
+    def create(self, job_id, status="queued", preview=None):
+        now = time.time()
+        with self._lock:
+            self._jobs.setdefault(job_id, {
+                "status": status, "preview": preview, "result": None, "error": None,
+                "created_at": now, "updated_at": now, "expires_at": now + self.ttl,
+            })
+
+    def get(self, job_id):
+        job = self._live(job_id)
+        if job is None:
+            return None
+        return {k: v for k, v in job.items() if k != "expires_at"}
+
+    def get_status(self, job_id):
+        job = self._live(job_id)
+        return job["status"] if job else None
+
+    def get_meta(self, job_id):
+        job = self._live(job_id)
+        if job is None:
+            return None
+        return {"status": job["status"], "error": job["error"], "updated_at": job["updated_at"]}
+
+    def update(self, job_id, **fields):
+        now = time.time()
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return
+            job.update(fields)
+            job["updated_at"] = now
+            job["expires_at"] = now + self.ttl
+
+    def append_event(self, job_id, event, data):
+        with self._lock:
+            events = self._events.setdefault(job_id, [])
+            evt = {"seq": len(events) + 1, "event": event, "ts": time.time(), **data}
+            events.append(evt)
+        return evt
+
+    def events_since(self, job_id, seq=0):
+        return self._events.get(job_id, [])[seq:]
+
+    def claim_submission(self, keys, job_id, fingerprint):
+        now = time.time()
+        with self._lock:
+            for key in keys:
+                claim = self._submissions.get(key)
+                if claim and claim["expires_at"] >= now:
+                    job = self._jobs.get(claim["job_id"])
+                    if not job or job["status"] != "error":
+                        return {"key": key, "job_id": claim["job_id"], "fingerprint": claim["fingerprint"]}
+            for key, window in keys.items():
+                self._submissions[key] = {
+                    "job_id": job_id, "fingerprint": fingerprint, "expires_at": now + window}
+        return None
+
+    def save_checkpoint(self, job_id, name, data):
+        with self._lock:
+            self._checkpoints.setdefault(job_id, {})[name] = data
+        self.update(job_id)
+
+    def get_checkpoints(self, job_id):
+        return dict(self._checkpoints.get(job_id, {}))
+
+    def list_stale(self, older_than):
+        cutoff = time.time() - older_than
+        return [
+            job_id for job_id, job in self._jobs.items()
+            if job["status"] == "running" and job["updated_at"] < cutoff
+            and self._live(job_id)
+        ]
+
+    def claim_for_resume(self, job_id, stale_after):
+        now = time.time()
+        with self._lock:
+            job = self._live(job_id)
+            if job is None:
+                return False
+            stale = job["status"] == "running" and job["updated_at"] < now - stale_after
+            if job["status"] != "error" and not stale:
+                return False
+            job.update(status="queued", error=None, updated_at=now, expires_at=now + self.ttl)
+        return True
+
+    def purge_expired(self):
+        now = time.time()
+        with self._lock:
+            expired = [j for j, job in self._jobs.items() if job["expires_at"] < now]
+            for job_id in expired:
+                self._jobs.pop(job_id, None)
+                self._events.pop(job_id, None)
+                self._checkpoints.pop(job_id, None)
+            for key in [k for k, c in self._submissions.items() if c["expires_at"] < now]:
+                del self._submissions[key]
+        return len(expired)
+
+
+class SQLiteJobStore(JobStore):
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS jobs (
+        job_id TEXT PRIMARY KEY,
+        status TEXT NOT NULL,
+        preview TEXT,
+        result TEXT,
+        error TEXT,
+        created_at REAL NOT NULL,
+        updated_at REAL NOT NULL,
+        expires_at REAL NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS jobs_expires_at ON jobs (expires_at);
+    CREATE TABLE IF NOT EXISTS job_events (
+        job_id TEXT NOT NULL,
+        seq INTEGER NOT NULL,
+        event TEXT NOT NULL,
+        data TEXT NOT NULL,
+        ts REAL NOT NULL,
+        PRIMARY KEY (job_id, seq)
+    );
+    CREATE TABLE IF NOT EXISTS job_checkpoints (
+        job_id TEXT NOT NULL,
+        name TEXT NOT NULL,
+        data TEXT NOT NULL,
+        updated_at REAL NOT NULL,
+        PRIMARY KEY (job_id, name)
+    );
+    CREATE TABLE IF NOT EXISTS job_submissions (
+        key TEXT PRIMARY KEY,
+        job_id TEXT NOT NULL,
+        fingerprint TEXT NOT NULL,
+        expires_at REAL NOT NULL
+    );
+    """
+
+    def __init__(self, path: Path = JOB_STORE_PATH, ttl_seconds: int = JOB_TTL_SECONDS):
+        self.path = Path(path)
+        self.ttl = ttl_seconds
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._local = threading.local()
+        with self._conn() as conn:
+            conn.executescript(self.SCHEMA)
+
+    def _conn(self) -> sqlite3.Connection:
+        # one connection per thread; WAL lets readers run alongside the writer
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=JOB_STORE_BUSY_TIMEOUT, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def create(self, job_id, status="queued", preview=None):
+        now = time.time()
+        self._conn().execute(
+            "INSERT OR IGNORE INTO jobs (job_id, status, preview, created_at, updated_at, expires_at) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (job_id, status, json.dumps(preview, ensure_ascii=False), now, now, now + self.ttl),
+        )
+
+    def get(self, job_id):
+        row = self._conn().execute(
+            "SELECT status, preview, result, error, created_at, updated_at FROM jobs "
+            "WHERE job_id = ? AND expires_at >= ?",
+            (job_id, time.time()),
+        ).fetchone()
+        if row is None:
+            return None
+        return {
+            "status": row["status"],
+            "preview": json.loads(row["preview"]) if row["preview"] else None,
+            "result": json.loads(row["result"]) if row["result"] else None,
+            "error": row["error"],
+            "created_at": row["created_at"],
+            "updated_at": row["updated_at"],
+        }
+
+    def get_status(self, job_id):
+        row = self._conn().execute(
+            "SELECT status FROM jobs WHERE job_id = ? AND expires_at >= ?",
+            (job_id, time.time()),
+        ).fetchone()
+        return row["status"] if row else None
+
+    def get_meta(self, job_id):
+        row = self._conn().execute(
+            "SELECT status, error, updated_at FROM jobs WHERE job_id = ? AND expires_at >= ?",
+            (job_id, time.time()),
+        ).fetchone()
+        return dict(row) if row else None
+
+    def update(self, job_id, **fields):
+        now = time.time()
+        columns, values = [], []
+        for key, value in fields.items():
+            if key in ("preview", "result"):
+                value = json.dumps(value, ensure_ascii=False)
+            elif key not in ("status", "error"):
+                raise ValueError(f"unknown job field: {key}")
+            columns.append(f"{key} = ?")
+            values.append(value)
+        columns += ["updated_at = ?", "expires_at = ?"]
+        values += [now, now + self.ttl, job_id]
+        self._conn().execute(
+            f"UPDATE jobs SET {', '.join(columns)} WHERE job_id = ?", values)
+
+    def append_event(self, job_id, event, data):
+        conn = self._conn()
+        ts = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            seq = conn.execute(
+                "SELECT COALESCE(MAX(seq), 0) + 1 FROM job_events WHERE job_id = ?",
+                (job_id,),
+            ).fetchone()[0]
+            conn.execute(
+                "INSERT INTO job_events (job_id, seq, event, data, ts) VALUES (?, ?, ?, ?, ?)",
+                (job_id, seq, event, json.dumps(data, ensure_ascii=False), ts),
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return {"seq": seq, "event": event, "ts": ts, **data}
+
+    def events_since(self, job_id, seq=0):
+        rows = self._conn().execute(
+            "SELECT seq, event, data, ts FROM job_events WHERE job_id = ? AND seq > ? ORDER BY seq",
+            (job_id, seq),
+        ).fetchall()
+        return [
+            {"seq": r["seq"], "event": r["event"], "ts": r["ts"], **json.loads(r["data"])}
+            for r in rows
+        ]
+
+    def claim_submission(self, keys, job_id, fingerprint):
+        conn = self._conn()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for key in keys:
+                row = conn.execute(
+                    "SELECT s.job_id, s.fingerprint, j.status FROM job_submissions s "
+                    "LEFT JOIN jobs j ON j.job_id = s.job_id WHERE s.key = ? AND s.expires_at >= ?",
+                    (key, now),
+                ).fetchone()
+                if row is not None and row["status"] != "error":
+                    conn.execute("COMMIT")
+                    return {"key": key, "job_id": row["job_id"], "fingerprint": row["fingerprint"]}
+            conn.executemany(
+                "INSERT OR REPLACE INTO job_submissions (key, job_id, fingerprint, expires_at) "
+                "VALUES (?, ?, ?, ?)",
+                [(key, job_id, fingerprint, now + window) for key, window in keys.items()],
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return None
+
+    def save_checkpoint(self, job_id, name, data):
+        self._conn().execute(
+            "INSERT OR REPLACE INTO job_checkpoints (job_id, name, data, updated_at) VALUES (?, ?, ?, ?)",
+            (job_id, name, json.dumps(data, ensure_ascii=False), time.time()),
+        )
+        self.update(job_id)
+
+    def get_checkpoints(self, job_id):
+        rows = self._conn().execute(
+            "SELECT name, data FROM job_checkpoints WHERE job_id = ?", (job_id,)).fetchall()
+        return {r["name"]: json.loads(r["data"]) for r in rows}
+
+    def list_stale(self, older_than):
+        now = time.time()
+        rows = self._conn().execute(
+            "SELECT job_id FROM jobs WHERE status = 'running' "
+            "AND updated_at < ? AND expires_at >= ?",
+            (now - older_than, now),
+        ).fetchall()
+        return [r["job_id"] for r in rows]
+
+    def claim_for_resume(self, job_id, stale_after):
+        now = time.time()
+        cur = self._conn().execute(
+            "UPDATE jobs SET status = 'queued', error = NULL, updated_at = ?, expires_at = ? "
+            "WHERE job_id = ? AND expires_at >= ? "
+            "AND (status = 'error' OR (status = 'running' AND updated_at < ?))",
+            (now, now + self.ttl, job_id, now, now - stale_after),
+        )
+        return cur.rowcount == 1
+
+    def purge_expired(self):
+        conn = self._conn()
+        now = time.time()
+        conn.execute("DELETE FROM job_submissions WHERE expires_at < ?", (now,))
+        conn.execute(
+            "DELETE FROM job_checkpoints WHERE job_id IN (SELECT job_id FROM jobs WHERE expires_at < ?)",
+            (now,),
+        )
+        conn.execute(
+            "DELETE FROM job_events WHERE job_id IN (SELECT job_id FROM jobs WHERE expires_at < ?)",
+            (now,),
+        )
+        return conn.execute("DELETE FROM jobs WHERE expires_at < ?", (now,)).rowcount
+
+
+class AsyncJobStore:
+    """
+    Awaitable view of a JobStore: `await store.update(...)` runs the call via
+    asyncio.to_thread. Each thread keeps its own SQLite connection.
+    """
+
+    def __init__(self, store: JobStore):
+        self.store = store
+
+    def __getattr__(self, name):
+        method = getattr(self.store, name)
+
+        async def call(*args, **kwargs):
+            return await asyncio.to_thread(method, *args, **kwargs)
+
+        return call
+
+
+def get_job_store() -> JobStore:
+    if JOB_STORE_BACKEND == "memory":
+        return MemoryJobStore()
+    return SQLiteJobStore()
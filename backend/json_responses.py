@@ -0,0 +1,116 @@
+"""
+Cacheable JSON responses for frequently polled endpoints.
+
+Bodies are serialized with orjson (stdlib json as fallback), compressed with br
+(if the brotli package is installed) or gzip depending on Accept-Encoding, and
+kept in a small LRU keyed by ETag + encoding. A repeated poll of an unchanged
+job therefore costs a dict lookup, and a client that sends If-None-Match gets
+an empty 304.
+"""
+import gzip
+import json
+import threading
+from collections import OrderedDict
+from typing import Callable, Optional
+
+from fastapi import Request
+from fastapi.responses import Response
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+MIN_COMPRESS_BYTES = 1024
+ENCODED_CACHE_SIZE = 64
+
+
+def dumps(obj) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def choose_encoding(accept_encoding: str) -> Optional[str]:
+    accepted = {part.split(";")[0].strip() for part in accept_encoding.lower().split(",")}
+    if brotli is not None and "br" in accepted:
+        return "br"
+    if "gzip" in accepted:
+        return "gzip"
+    return None
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    tags = {t.strip() for t in header.split(",")}
+    return etag in tags or etag.removeprefix("W/") in tags
+
+
+class _EncodedBodyCache:
+    """(etag, requested encoding) -> (body, content encoding or None)"""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key, entry: tuple):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+_encoded = _EncodedBodyCache(ENCODED_CACHE_SIZE)
+
+
+def cached_json_response(
+    request: Request,
+    etag: str,
+    build_payload: Callable[[], object],
+    cache_control: str = "no-cache",
+) -> Response:
+    """
+    Returns 304 if the client already has `etag`, otherwise the (possibly cached)
+    encoded body. `build_payload` is only called when nothing is cached for the ETag.
+    """
+    headers = {"ETag": etag, "Cache-Control": cache_control, "Vary": "Accept-Encoding"}
+    if etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+
+    encoding = choose_encoding(request.headers.get("accept-encoding", ""))
+    cached = _encoded.get((etag, encoding))
+    if cached is None:
+        plain = _encoded.get((etag, None))
+        raw = plain[0] if plain else dumps(build_payload())
+        if plain is None:
+            _encoded.put((etag, None), (raw, None))
+        if encoding is None or len(raw) < MIN_COMPRESS_BYTES:
+            cached = (raw, None)
+        elif encoding == "br":
+            cached = (brotli.compress(raw, quality=5), "br")
+        else:
+            cached = (gzip.compress(raw, compresslevel=6), "gzip")
+        _encoded.put((etag, encoding), cached)
+
+    body, content_encoding = cached
+    if content_encoding is not None:
+        headers["Content-Encoding"] = content_encoding
+    return Response(content=body, media_type="application/json", headers=headers)
@@ -0,0 +1,93 @@
+"""
+LLM response cache.
+
+Responses are stored in a DiskLRUCache keyed on sha256(call kind, model, parameters,
+normalized prompt). Caching is decided per endpoint: deterministic calls
+(temperature 0) are cached by default, everything else only if the endpoint is
+listed in LLM_CACHE_ENDPOINTS. LLM_CACHE_EXCLUDE switches endpoints off.
+
+get/put are coroutines: the disk I/O runs in a thread, not in the event loop of
+the LLM call that uses them.
+"""
+import asyncio
+import hashlib
+import json
+import os
+from collections import Counter
+from pathlib import Path
+from typing import Optional
+
+from .disk_cache import DiskLRUCache
+
+LLM_CACHE_ENABLED = os.environ.get("LLM_CACHE_ENABLED", "1") != "0"
+LLM_CACHE_DIR = Path(os.environ.get("LLM_CACHE_DIR", ".cache/llm"))
+LLM_CACHE_MAX_BYTES = int(os.environ.get("LLM_CACHE_MAX_MB", "256")) * 1024 * 1024
+
+# Komma-separierte Endpoint-Namen, z.B. "generate_course,auto_improve_lesson"
+LLM_CACHE_ENDPOINTS = {e.strip() for e in os.environ.get(
+    "LLM_CACHE_ENDPOINTS", "").split(",") if e.strip()}
+LLM_CACHE_EXCLUDE = {e.strip() for e in os.environ.get(
+    "LLM_CACHE_EXCLUDE", "").split(",") if e.strip()}
+
+_cache = DiskLRUCache(LLM_CACHE_DIR, LLM_CACHE_MAX_BYTES)
+_hits: Counter = Counter()
+_misses: Counter = Counter()
+
+
+def is_enabled(endpoint: Optional[str], temperature: Optional[float]) -> bool:
+    if not LLM_CACHE_ENABLED or not endpoint or endpoint in LLM_CACHE_EXCLUDE:
+        return False
+    if endpoint in LLM_CACHE_ENDPOINTS:
+        return True
+    return temperature == 0
+
+
+def _normalize(text: str) -> str:
+    return " ".join(text.split())
+
+
+def make_key(kind: str, model: str, params: dict, messages: list) -> str:
+    payload = {
+        "kind": kind,
+        "model": model,
+        "params": params,
+        "messages": [
+            {"role": m.get("role"), "content": _normalize(m.get("content") or "")}
+            for m in messages
+        ],
+    }
+    raw = json.dumps(payload, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def warm():
+    """Scans the cache directory once (blocking; call it in a thread)."""
+    _cache.warm()
+
+
+async def get(endpoint: str, key: str) -> Optional[str]:
+    data = await asyncio.to_thread(_cache.get, key)
+    if data is None:
+        _misses[endpoint] += 1
+        return None
+    _hits[endpoint] += 1
+    return data.decode("utf-8")
+
+
+async def put(key: str, content: str):
+    try:
+        await asyncio.to_thread(_cache.set, key, content.encode("utf-8"))
+    except OSError as e:
+        print("⚠️ LLM cache write failed:", e)
+
+
+def stats() -> dict:
+    endpoints = sorted(set(_hits) | set(_misses))
+    return {
+        **_cache.stats(),
+        "hits": sum(_hits.values()),
+        "misses": sum(_misses.values()),
+        "endpoints": {
+            e: {"hits": _hits[e], "misses": _misses[e]} for e in endpoints
+        },
+    }
@@ -0,0 +1,221 @@
+"""
+Shared LLM gateway.
+
+Every OpenAI call of the backend goes through this module. It owns one pooled
+AsyncOpenAI client per process (keep-alive connections, per-call timeouts), so a
+slow completion never blocks the event loop and overlapping generations reuse the
+same TCP/TLS connections instead of building a new client per call.
+
+Rate limiting, retries and coalescing of identical in-flight calls are done by
+llm_scheduler; the client itself does not retry.
+"""
+import base64
+import os
+from typing import AsyncIterator, Optional
+
+import httpx
+from openai import AsyncOpenAI
+
+from . import llm_cache, llm_scheduler
+
+# --- Connection pool ---
+LLM_MAX_CONNECTIONS = int(os.environ.get("LLM_MAX_CONNECTIONS", "64"))
+LLM_MAX_KEEPALIVE = int(os.environ.get("LLM_MAX_KEEPALIVE", "32"))
+LLM_KEEPALIVE_EXPIRY = float(os.environ.get("LLM_KEEPALIVE_EXPIRY", "90"))
+LLM_CONNECT_TIMEOUT = float(os.environ.get("LLM_CONNECT_TIMEOUT", "10"))
+
+# --- Default timeouts per call type (seconds) ---
+CHAT_TIMEOUT = float(os.environ.get("LLM_CHAT_TIMEOUT", "90"))
+RESPONSES_TIMEOUT = float(os.environ.get("LLM_RESPONSES_TIMEOUT", "180"))
+IMAGE_TIMEOUT = float(os.environ.get("LLM_IMAGE_TIMEOUT", "180"))
+
+_client: Optional[AsyncOpenAI] = None
+
+
+def get_client() -> AsyncOpenAI:
+    """Returns the process-wide AsyncOpenAI client (created on first use)."""
+    global _client
+    if _client is None:
+        http_client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=LLM_MAX_CONNECTIONS,
+                max_keepalive_connections=LLM_MAX_KEEPALIVE,
+                keepalive_expiry=LLM_KEEPALIVE_EXPIRY,
+            ),
+            timeout=httpx.Timeout(CHAT_TIMEOUT, connect=LLM_CONNECT_TIMEOUT),
+        )
+        _client = AsyncOpenAI(
+            api_key=os.getenv("OPENAI_API_KEY"), http_client=http_client, max_retries=0)
+    return _client
+
+
+async def close():
+    """Closes the pooled client (called on app shutdown)."""
+    global _client
+    if _client is not None:
+        await _client.close()
+        _client = None
+
+
+def _usage_tokens(result) -> Optional[int]:
+    usage = getattr(result, "usage", None)
+    return getattr(usage, "total_tokens", None)
+
+
+async def chat(
+    messages: list,
+    *,
+    model: str = "gpt-4o-mini",
+    temperature: Optional[float] = None,
+    max_tokens: Optional[int] = None,
+    timeout: Optional[float] = None,
+    endpoint: Optional[str] = None,
+) -> str:
+    """
+    Chat completion; returns the message content of the first choice.
+    `endpoint` names the caller for the response cache (see llm_cache.is_enabled).
+    """
+    params = {}
+    if temperature is not None:
+        params["temperature"] = temperature
+    if max_tokens is not None:
+        params["max_tokens"] = max_tokens
+
+    key = llm_cache.make_key("chat", model, params, messages)
+    cache_key = None
+    if llm_cache.is_enabled(endpoint, temperature):
+        cache_key = key
+        cached = await llm_cache.get(endpoint, cache_key)
+        if cached is not None:
+            return cached
+
+    completion = await llm_scheduler.submit(
+        model,
+        lambda: get_client().chat.completions.create(
+            model=model,
+            messages=messages,
+            timeout=timeout or CHAT_TIMEOUT,
+            **params,
+        ),
+        tokens=llm_scheduler.estimate_tokens(
+            "".join(m.get("content") or "" for m in messages), max_tokens),
+        key=key,
+        usage=_usage_tokens,
+    )
+    content = completion.choices[0].message.content or ""
+    if cache_key and content:
+        await llm_cache.put(cache_key, content)
+    return content
+
+
+async def chat_stream(
+    messages: list,
+    *,
+    model: str = "gpt-4o-mini",
+    temperature: Optional[float] = None,
+    max_tokens: Optional[int] = None,
+    timeout: Optional[float] = None,
+    endpoint: Optional[str] = None,
+) -> AsyncIterator[str]:
+    """
+    Streaming chat completion; yields content deltas as they arrive.
+    Shares the response cache with chat(): a hit is yielded as a single chunk,
+    and a completed stream is written back to the cache.
+    """
+    params = {}
+    if temperature is not None:
+        params["temperature"] = temperature
+    if max_tokens is not None:
+        params["max_tokens"] = max_tokens
+
+    cache_key = None
+    if llm_cache.is_enabled(endpoint, temperature):
+        cache_key = llm_cache.make_key("chat", model, params, messages)
+        cached = await llm_cache.get(endpoint, cache_key)
+        if cached is not None:
+            yield cached
+            return
+
+    # nur der Verbindungsaufbau wird geplant/wiederholt, nicht ein halb gelesener Stream
+    stream = await llm_scheduler.submit(
+        model,
+        lambda: get_client().chat.completions.create(
+            model=model,
+            messages=messages,
+            timeout=timeout or CHAT_TIMEOUT,
+            stream=True,
+            **params,
+        ),
+        tokens=llm_scheduler.estimate_tokens(
+            "".join(m.get("content") or "" for m in messages), max_tokens),
+    )
+    parts = []
+    async for chunk in stream:
+        if not chunk.choices:
+            continue
+        delta = chunk.choices[0].delta.content
+        if delta:
+            parts.append(delta)
+            yield delta
+
+    if cache_key and parts:
+        await llm_cache.put(cache_key, "".join(parts))
+
+
+async def respond(
+    prompt: str,
+    *,
+    model: str = "gpt-4.1",
+    timeout: Optional[float] = None,
+    endpoint: Optional[str] = None,
+) -> str:
+    """
+    Responses API call; returns output_text. The Responses API runs at the model's
+    default temperature, so caching only applies if `endpoint` is opted in.
+    """
+    key = llm_cache.make_key(
+        "responses", model, {}, [{"role": "user", "content": prompt}])
+    cache_key = None
+    if llm_cache.is_enabled(endpoint, None):
+        cache_key = key
+        cached = await llm_cache.get(endpoint, cache_key)
+        if cached is not None:
+            return cached
+
+    response = await llm_scheduler.submit(
+        model,
+        lambda: get_client().responses.create(
+            model=model,
+            input=prompt,
+            timeout=timeout or RESPONSES_TIMEOUT,
+        ),
+        tokens=llm_scheduler.estimate_tokens(prompt),
+        key=key,
+        usage=_usage_tokens,
+    )
+    output = response.output_text
+    if cache_key and output:
+        await llm_cache.put(cache_key, output)
+    return output
+
+
+async def image(
+    prompt: str,
+    *,
+    size: str = "1024x1024",
+    model: str = "gpt-image-1",
+    timeout: Optional[float] = None,
+) -> bytes:
+    """Image generation; returns the decoded PNG bytes of the first image."""
+    result = await llm_scheduler.submit(
+        model,
+        lambda: get_client().images.generate(
+            model=model,
+            prompt=prompt,
+            size=size,
+            n=1,
+            timeout=timeout or IMAGE_TIMEOUT,
+        ),
+        key=llm_cache.make_key("image", model, {"size": size}, [{"role": "user", "content": prompt}]),
+    )
+    return base64.b64decode(result.data[0].b64_json)
@@ -0,0 +1,389 @@
+"""
+Rate-limit-aware scheduling of upstream model calls.
+
+Every call of llm_gateway runs through submit():
+
+- Token buckets per model for requests/min and tokens/min, so bursts from many
+  parallel generations are spread out before they hit the API instead of
+  coming back as 429s.
+- Priority lanes: callers waiting for a model are admitted in weighted-fair
+  order between the interactive lane (a user is waiting: previews, course
+  outlines) and the batch lane (full-course jobs, slide pipelines). A new
+  interactive call is admitted ahead of queued batch calls; the weights keep
+  batch from starving, and batch is capped in concurrent calls per model.
+  The lane is a context variable, set once at the start of a background job.
+- Retries with jittered exponential backoff on 429 / 408 / 409 / 5xx /
+  connection errors. A Retry-After (or retry-after-ms) header is honored, and a
+  429 pauses the whole model, so the other waiting callers back off too.
+- Single-flight: identical calls (same key) that are in flight at the same
+  time share one upstream request.
+
+The OpenAI client itself is created with max_retries=0; retrying happens here.
+Limits are per process.
+"""
+import asyncio
+import json
+import os
+import random
+import time
+from collections import Counter, defaultdict, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from email.utils import parsedate_to_datetime
+from typing import Awaitable, Callable, Optional
+
+import openai
+
+LLM_DEFAULT_RPM = int(os.environ.get("LLM_DEFAULT_RPM", "500"))
+LLM_DEFAULT_TPM = int(os.environ.get("LLM_DEFAULT_TPM", "200000"))
+# z.B. '{"gpt-4.1": {"rpm": 500, "tpm": 30000}, "gpt-image-1": {"rpm": 5}}'
+LLM_RATE_LIMITS = json.loads(os.environ.get("LLM_RATE_LIMITS", "{}") or "{}")
+
+LLM_MAX_RETRIES = int(os.environ.get("LLM_MAX_RETRIES", "5"))
+LLM_BACKOFF_BASE = float(os.environ.get("LLM_BACKOFF_BASE", "1.0"))
+LLM_BACKOFF_MAX = float(os.environ.get("LLM_BACKOFF_MAX", "30"))
+
+RETRYABLE_STATUS = {408, 409, 429}
+
+# --- Priority lanes ---
+INTERACTIVE = "interactive"
+BATCH = "batch"
+LANES = (INTERACTIVE, BATCH)  # Reihenfolge = Vorrang bei Gleichstand
+LANE_WEIGHTS = {
+    INTERACTIVE: float(os.environ.get("LLM_INTERACTIVE_WEIGHT", "8")),
+    BATCH: float(os.environ.get("LLM_BATCH_WEIGHT", "1")),
+}
+# Batch darf pro Modell nur so viele Aufrufe gleichzeitig offen haben (0 = unbegrenzt),
+# damit für interaktive Aufrufe immer Verbindungen/Quota frei bleiben
+LANE_MAX_IN_FLIGHT = {BATCH: int(os.environ.get("LLM_BATCH_MAX_IN_FLIGHT", "16"))}
+LANE_WAIT_SAMPLES = 500
+
+_lane: ContextVar = ContextVar("llm_lane", default=INTERACTIVE)
+
+_stats: dict = defaultdict(Counter)
+_lane_stats: dict = {name: Counter() for name in LANES}
+_lane_waits: dict = {name: deque(maxlen=LANE_WAIT_SAMPLES) for name in LANES}
+
+
+def set_lane(name: str):
+    """Puts the current task (and tasks it creates afterwards) into lane `name`."""
+    if name not in LANES:
+        raise ValueError(f"unknown lane: {name}")
+    return _lane.set(name)
+
+
+@contextmanager
+def lane(name: str):
+    token = set_lane(name)
+    try:
+        yield
+    finally:
+        _lane.reset(token)
+
+
+def current_lane() -> str:
+    return _lane.get()
+
+
+def _record_wait(name: str, seconds: float):
+    _lane_stats[name]["admitted"] += 1
+    _lane_stats[name]["wait_ms"] += int(seconds * 1000)
+    _lane_waits[name].append(seconds)
+
+
+class TokenBucket:
+    """Refills `per_minute` units per minute, holds at most one minute's worth."""
+
+    def __init__(self, per_minute: int):
+        self.capacity = max(1, per_minute)
+        self.rate = self.capacity / 60.0
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay_for(self, amount: float) -> float:
+        """Seconds until `amount` units are available (0 = now)."""
+        self._refill()
+        amount = min(amount, self.capacity)
+        return max(0.0, (amount - self.tokens) / self.rate)
+
+    def take(self, amount: float):
+        self._refill()
+        self.tokens -= min(amount, self.capacity)
+
+    def adjust(self, amount: float):
+        """Gives back (positive) or charges (negative) units after the actual usage is known."""
+        self._refill()
+        self.tokens = min(self.capacity, self.tokens + amount)
+
+
+class _Waiter:
+    __slots__ = ("lane", "tokens", "queued_at")
+
+    def __init__(self, lane: str, tokens: int):
+        self.lane = lane
+        self.tokens = tokens
+        self.queued_at = time.monotonic()
+
+
+class _ModelLimiter:
+    """
+    Rate buckets of one model plus the lane-aware queue in front of them.
+    Waiters are admitted one at a time, in weighted-fair order across lanes
+    (start-time fair queuing on a per-lane virtual clock) and FIFO within a lane.
+    """
+
+    def __init__(self, rpm: int, tpm: int):
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm) if tpm else None
+        self.paused_until = 0.0
+        self.queues = {name: deque() for name in LANES}
+        self.vtime = {name: 0.0 for name in LANES}
+        self.in_flight = Counter()
+        self.clock = 0.0
+        self._wake: Optional[asyncio.Event] = None
+
+    def pause(self, seconds: float):
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+    def _notify(self):
+        if self._wake is not None:
+            self._wake.set()
+            self._wake = None
+
+    def _changed(self) -> asyncio.Event:
+        if self._wake is None:
+            self._wake = asyncio.Event()
+        return self._wake
+
+    def _head(self) -> Optional[_Waiter]:
+        """Next waiter to admit: lane with the smallest virtual time (ties: lane order)."""
+        best = None
+        for name in LANES:
+            queue = self.queues[name]
+            cap = LANE_MAX_IN_FLIGHT.get(name)
+            if not queue or (cap and self.in_flight[name] >= cap):
+                continue
+            if best is None or self.vtime[name] < self.vtime[best]:
+                best = name
+        return self.queues[best][0] if best else None
+
+    def _delay(self, waiter: _Waiter) -> float:
+        delay = max(0.0, self.paused_until - time.monotonic(), self.requests.delay_for(1))
+        if self.tokens and waiter.tokens:
+            delay = max(delay, self.tokens.delay_for(waiter.tokens))
+        return delay
+
+    async def acquire(self, tokens: int, lane: str):
+        """Waits for this call's turn and rate capacity. Pair with release(lane)."""
+        waiter = _Waiter(lane, tokens)
+        queue = self.queues[lane]
+        if not queue:
+            # a lane that was idle starts at the current clock: it neither banks
+            # credit while idle nor waits behind the backlog of the other lanes
+            self.vtime[lane] = max(self.vtime[lane], self.clock)
+        queue.append(waiter)
+        # ein neuer interaktiver Aufruf kann vor wartende Batch-Aufrufe rücken
+        self._notify()
+        try:
+            while True:
+                changed = self._changed()
+                timeout = None
+                if self._head() is waiter:
+                    delay = self._delay(waiter)
+                    if delay <= 0:
+                        break
+                    timeout = delay
+                try:
+                    await asyncio.wait_for(changed.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+        except BaseException:
+            queue.remove(waiter)
+            self._notify()
+            raise
+
+        queue.popleft()
+        self.requests.take(1)
+        if self.tokens and tokens:
+            self.tokens.take(tokens)
+        self.clock = self.vtime[lane]
+        self.vtime[lane] += 1.0 / LANE_WEIGHTS[lane]
+        self.in_flight[lane] += 1
+        _record_wait(lane, time.monotonic() - waiter.queued_at)
+        self._notify()
+
+    def release(self, lane: str):
+        self.in_flight[lane] -= 1
+        self._notify()
+
+
+_limiters: dict = {}
+_inflight: dict = {}
+
+
+def _limiter(model: str) -> _ModelLimiter:
+    limiter = _limiters.get(model)
+    if limiter is None:
+        cfg = LLM_RATE_LIMITS.get(model, {})
+        limiter = _limiters[model] = _ModelLimiter(
+            int(cfg.get("rpm", LLM_DEFAULT_RPM)), int(cfg.get("tpm", LLM_DEFAULT_TPM)))
+    return limiter
+
+
+def estimate_tokens(text: str, max_output: Optional[int] = None) -> int:
+    """Prompt tokens (~4 chars each) plus the expected completion size."""
+    return len(text) // 4 + (max_output or 1000)
+
+
+def _retry_after(error: Exception) -> Optional[float]:
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    value = headers.get("retry-after-ms")
+    if value:
+        try:
+            return float(value) / 1000
+        except ValueError:
+            pass
+    value = headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def _is_retryable(error: Exception) -> bool:
+    if isinstance(error, openai.APIConnectionError):  # includes APITimeoutError
+        return True
+    if isinstance(error, openai.APIStatusError):
+        return error.status_code in RETRYABLE_STATUS or error.status_code >= 500
+    return False
+
+
+def _backoff(attempt: int) -> float:
+    # "full jitter": zufällig in [0, base * 2^attempt], gedeckelt
+    return random.uniform(0, min(LLM_BACKOFF_MAX, LLM_BACKOFF_BASE * 2 ** attempt))
+
+
+async def _run(model: str, call: Callable[[], Awaitable], tokens: int,
+               usage: Optional[Callable[[object], Optional[int]]]):
+    limiter = _limiter(model)
+    stats = _stats[model]
+    lane_name = current_lane()
+    for attempt in range(LLM_MAX_RETRIES + 1):
+        started = time.monotonic()
+        await limiter.acquire(tokens, lane_name)
+        stats["wait_ms"] += int((time.monotonic() - started) * 1000)
+        try:
+            result = await call()
+        except Exception as e:
+            if not _is_retryable(e) or attempt == LLM_MAX_RETRIES:
+                stats["failed"] += 1
+                raise
+            delay = _backoff(attempt)
+            hinted = _retry_after(e)
+            if hinted is not None:
+                delay = max(delay, hinted)
+            if getattr(e, "status_code", None) == 429:
+                stats["rate_limited"] += 1
+                limiter.pause(delay)
+            stats["retries"] += 1
+            print(f"⏳ {model}: {type(e).__name__}, retry {attempt + 1}/{LLM_MAX_RETRIES} in {delay:.1f}s")
+            await asyncio.sleep(delay)
+            continue
+        finally:
+            limiter.release(lane_name)
+
+        stats["calls"] += 1
+        used = usage(result) if usage else None
+        if used is not None and limiter.tokens:
+            limiter.tokens.adjust(tokens - used)
+        return result
+
+
+def _settle(key: str, task: asyncio.Future):
+    _inflight.pop(key, None)
+    if not task.cancelled():
+        task.exception()  # als abgeholt markieren, auch wenn alle Aufrufer weg sind
+
+
+async def submit(
+    model: str,
+    call: Callable[[], Awaitable],
+    *,
+    tokens: int = 0,
+    key: Optional[str] = None,
+    usage: Optional[Callable[[object], Optional[int]]] = None,
+):
+    """
+    Runs `call()` (one upstream request) under the limits of `model`, with retries.
+    `tokens` is the estimated token usage; `usage(result)` may return the actual
+    count to settle the bucket. Calls with the same `key` in flight at the same
+    time are coalesced into one request.
+    """
+    if key is None:
+        return await _run(model, call, tokens, usage)
+
+    task = _inflight.get(key)
+    if task is None:
+        task = asyncio.ensure_future(_run(model, call, tokens, usage))
+        _inflight[key] = task
+        task.add_done_callback(lambda t: _settle(key, t))
+    else:
+        _stats[model]["coalesced"] += 1
+    # shield: ein abgebrochener Aufrufer bricht den geteilten Request nicht ab
+    return await asyncio.shield(task)
+
+
+def _percentile(values: list, p: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(p * len(values)))]
+
+
+def lane_stats() -> dict:
+    """Per lane: queue depth, calls in flight, admitted calls and queue wait times."""
+    out = {}
+    for name in LANES:
+        waits = list(_lane_waits[name])
+        counters = _lane_stats[name]
+        out[name] = {
+            "weight": LANE_WEIGHTS[name],
+            "queued": sum(len(l.queues[name]) for l in _limiters.values()),
+            "in_flight": sum(l.in_flight[name] for l in _limiters.values()),
+            "admitted": counters["admitted"],
+            "avg_wait_ms": int(counters["wait_ms"] / counters["admitted"]) if counters["admitted"] else 0,
+            "p50_wait_ms": int(_percentile(waits, 0.5) * 1000),
+            "p95_wait_ms": int(_percentile(waits, 0.95) * 1000),
+            "max_wait_ms": int(max(waits, default=0.0) * 1000),
+        }
+    return out
+
+
+def stats() -> dict:
+    return {
+        "in_flight": len(_inflight),
+        "lanes": lane_stats(),
+        "models": {
+            model: {
+                **counters,
+                "rpm_available": int(_limiters[model].requests.tokens) if model in _limiters else None,
+                "tpm_available": int(_limiters[model].tokens.tokens)
+                if model in _limiters and _limiters[model].tokens else None,
+            }
+            for model, counters in _stats.items()
+        },
+    }
@@ -1,55 +1,59 @@
 import time
-from PIL import Image, ImageDraw, ImageFont
-import hmac
 import hashlib
-from fastapi.responses import JSONResponse, FileResponse
+from fastapi.responses import JSONResponse, FileResponse, StreamingResponse
 from fastapi import FastAPI, HTTPException, UploadFile, File, BackgroundTasks
-from fastapi.staticfiles import StaticFiles
 from fastapi import BackgroundTasks
-import base64
 import os
-from openai import OpenAI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi import FastAPI
 from pydantic import BaseModel
 from fastapi import Request
 from fastapi import UploadFile, File
-from pathlib import Path
-import io
-import tempfile
-from PyPDF2 import PdfReader
-from docx import Document
+from pathlib import Path, PurePath
 from fastapi import UploadFile, File, Form
 from fastapi import Request
 from typing import List
 from typing import List, Optional
 import asyncio
+import re
 import uuid
 import json
 import shutil
 from fastapi.responses import FileResponse
 from fastapi import File, UploadFile, Form
-from PIL import Image
-import docx
-import pytesseract
-pytesseract.pytesseract.tesseract_cmd = r"C:\Program Files\Tesseract-OCR\tesseract.exe"
-
-# OpenAI Client initialisieren
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+from . import llm_gateway, llm_cache, llm_scheduler, extraction, process_pool, uploads, static_delivery
+from .streaming import LessonStreamParser, SSE_HEADERS, sse_event
+from .job_events import JobEventBus, TERMINAL_EVENTS
+from .job_store import AsyncJobStore, get_job_store
+from .job_queue import get_job_queue
+from .json_responses import cached_json_response
+from .stages import Stage, run_stages
+from .archive import iter_zip
+from .slides import render_deck, slide_files, load_manifest
+from . import signing, text_rank, retrieval, structured_output
+
+# OpenAI-Aufrufe laufen alle über llm_gateway (ein gepoolter AsyncOpenAI-Client)
 app = FastAPI()
 
+
+@app.on_event("shutdown")
+async def _close_llm_gateway():
+    await llm_gateway.close()
+    process_pool.shutdown()
+
+
+@app.on_event("startup")
+async def _warm_disk_caches():
+    # Verzeichnis-Scan im Thread, nicht beim ersten LLM-Aufruf im Event-Loop
+    app.state.cache_warm_task = asyncio.gather(
+        asyncio.to_thread(llm_cache.warm), asyncio.to_thread(extraction.warm_cache))
+
 STORAGE_ROOT = Path(os.environ.get("SLIDE_STORAGE", "./generated"))
 STORAGE_ROOT.mkdir(parents=True, exist_ok=True)  # <== Diese Zeile sorgt dafür!
 
-SIGNED_TOKEN_SECRET = os.environ.get(
-    "SIGNED_TOKEN_SECRET", "replace_me_with_strong_secret")
-
-# ensure folder exists before mounting
+# ensure folder exists (served by serve_generated at the end of this file)
 os.makedirs("generated", exist_ok=True)
 
-app.mount("/generated", StaticFiles(directory=os.path.join(os.getcwd(),
-          "generated")), name="generated")
-
 # --- CORS (Frontend darf Backend ansprechen) ---
 app.add_middleware(
     CORSMiddleware,
@@ -57,6 +61,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Upload-Offset", "Upload-Length", "Location"],
 )
 
 # --- Testroute ---
@@ -67,6 +72,24 @@ def read_root():
     return {"message": "Backend is running 🚀"}
 
 
+@app.get("/api/llm/stats")
+async def llm_scheduler_stats():
+    """Per-model call, retry, rate-limit and coalescing counters."""
+    return llm_scheduler.stats()
+
+
+@app.get("/api/llm/lanes")
+async def llm_lane_stats():
+    """Queue depth, in-flight calls and queue wait times per priority lane."""
+    return llm_scheduler.lane_stats()
+
+
+@app.get("/api/llm-cache/stats")
+async def llm_cache_stats():
+    """Hit/miss counters per endpoint and current size of the LLM response cache."""
+    return await asyncio.to_thread(llm_cache.stats)
+
+
 class PreviewRequest(BaseModel):
     prompt: str
     num_lessons: int
@@ -81,15 +104,8 @@ class PreviewRequest(BaseModel):
     links: str | None = None  # 👈 Neu
 
 
-@app.post("/api/preview-course")
-async def preview_course(req: PreviewRequest):
-    """
-    Generate a simple course preview (structure only, no full content).
-    Deterministic lesson count chosen from format ranges (no randomness).
-    """
-    # Log input for easier debugging
-    print("🧩 preview_course called with:", req.model_dump())
-
+def _build_preview_prompt(req: PreviewRequest) -> str:
+    """Builds the preview prompt (shared by /api/preview-course and its stream variant)."""
     # Logical lesson ranges by format
     format_ranges = {
         "Micro": (3, 5),
@@ -141,21 +157,61 @@ Always keep "quiz"={req.include_quiz} and "workbook"={req.include_workbook}.
 
 Return ONLY valid JSON. Do NOT wrap output in markdown code fences or add explanatory text.
 """
+    return prompt
+
+
+@app.post("/api/preview-course")
+async def preview_course(req: PreviewRequest):
+    """
+    Generate a simple course preview (structure only, no full content).
+    Deterministic lesson count chosen from format ranges (no randomness).
+    """
+    # Log input for easier debugging
+    print("🧩 preview_course called with:", req.model_dump())
+
+    prompt = _build_preview_prompt(req)
 
     # Use low temperature for deterministic output
-    completion = client.chat.completions.create(
+    raw = await llm_gateway.chat(
+        [{"role": "user", "content": prompt}],
         model="gpt-4o-mini",
-        messages=[{"role": "user", "content": prompt}],
         temperature=0.0,
+        endpoint="preview_course",
     )
-
-    raw = completion.choices[0].message.content
     print("🧠 Raw OpenAI Output:", raw[:1000])
     return {"preview": raw}
 
 
 UPLOAD_DIR = Path("uploaded_files")
 UPLOAD_DIR.mkdir(exist_ok=True)
+# Kursmaterialien nach Inhalts-Hash: gleiche Dateinamen verschiedener Nutzer
+# überschreiben sich nicht, und ein Job findet nur Dateien, deren Hash er kennt
+MATERIALS_DIR = UPLOAD_DIR / "materials"
+_MATERIAL_KEY = re.compile(r"^([0-9a-f]{64})/([^/\\]+)$")
+
+
+def _save_material(filename: str, content: bytes) -> str:
+    """
+    Stores an uploaded material under its sha256 and returns its key "<sha256>/<name>".
+    The key goes into the preview's "files"; the name is kept for extraction and display.
+    """
+    digest = hashlib.sha256(content).hexdigest()
+    path = MATERIALS_DIR / digest
+    if not path.exists():
+        MATERIALS_DIR.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f".{digest}.{uuid.uuid4().hex[:8]}.tmp")
+        tmp.write_bytes(content)
+        os.replace(tmp, path)
+    name = PurePath((filename or "").replace("\\", "/")).name or "upload"
+    return f"{digest}/{name}"
+
+
+def _material_path(key) -> Optional[tuple]:
+    """(name, path) for a key from _save_material, None for anything else (e.g. a bare filename)."""
+    match = _MATERIAL_KEY.match(str(key))
+    if not match:
+        return None
+    return match.group(2), MATERIALS_DIR / match.group(1)
 
 
 @app.post("/api/outcome")
@@ -186,39 +242,50 @@ async def receive_audience(payload: AudienceRequest):
     return {"status": "ok", "received": payload.model_dump()}
 
 
-@app.post("/api/materials")
-async def receive_materials(files: list[UploadFile] = File(...)):
-    extracted_texts = []
-
-    for file in files:
-        filename = file.filename.lower()
-        content = await file.read()
-        text = ""
+# Token-Budget für das Material im Outline-Prompt (text_rank.pack_context)
+MATERIALS_TOKEN_BUDGET = int(os.environ.get("MATERIALS_TOKEN_BUDGET", "3000"))
 
-        # 1️⃣ PDFs
-        if filename.endswith(".pdf"):
-            pdf_reader = PdfReader(io.BytesIO(content))
-            for page in pdf_reader.pages:
-                text += page.extract_text() or ""
 
-        # 2️⃣ Bilder (OCR)
-        elif filename.endswith((".png", ".jpg", ".jpeg")):
-            image = Image.open(io.BytesIO(content))
-            text = pytesseract.image_to_string(image)
+@app.post("/api/materials")
+async def receive_materials(
+    files: list[UploadFile] = File(...),
+    topic: str = Form(""),
+    outcome: str = Form(""),
+    token_budget: int = Form(MATERIALS_TOKEN_BUDGET),
+):
+    extracted_texts = []
 
-        # 3️⃣ Textdateien
-        elif filename.endswith(".txt"):
-            text = content.decode("utf-8")
+    # 1️⃣ Alle Dateien parallel extrahieren (PDF/DOCX/OCR im Process-Pool)
+    received = [(PurePath(file.filename).name.lower(), await file.read()) for file in files]
+    results = await extraction.extract_many(received)
+    # Full-Generation holt sich die Passagen über den Inhalts-Key (retrieval.py)
+    file_keys = [
+        await asyncio.to_thread(_save_material, filename, content) for filename, content in received
+    ]
 
+    documents = []
+    for (filename, _), text in zip(received, results):
+        if isinstance(text, Exception):
+            if not isinstance(text, extraction.UnsupportedFileType):
+                print(f"⚠️ Extraction failed for {filename}:", text)
+            text = ""
+        documents.append({"filename": filename, "content": text})
+
+    # 2️⃣ Nur die relevantesten Abschnitte (BM25 gegen Thema + Ziel) bis zum Token-Budget
+    selected = await asyncio.to_thread(
+        text_rank.pack_context, documents, f"{topic}\n{outcome}", max(200, token_budget))
+    for doc, file_key in zip(documents, file_keys):
         extracted_texts.append({
-            "filename": filename,
-            "content": text[:2000]  # Safety limit
+            "filename": doc["filename"],
+            "file_key": file_key,  # -> preview "files" for generate-full-course
+            "content": "\n\n".join(c["text"] for c in selected if c["filename"] == doc["filename"]),
         })
+    all_texts = text_rank.format_context(selected)
+    print(f"📄 Materials: {sum(len(d['content']) for d in documents)} chars extracted, "
+          f"{len(selected)} chunks / ~{text_rank.estimate_tokens(all_texts)} tokens packed")
 
-    print("📄 Extracted texts from uploaded files:", extracted_texts)
-    # 🧠 Schritt 2: An OpenAI schicken, um Vorschaukurs zu generieren
+    # 🧠 Schritt 3: An OpenAI schicken, um Vorschaukurs zu generieren
     try:
-        all_texts = "\n\n".join([t["content"] for t in extracted_texts])
         prompt = f"""
 You are an expert course designer. Based on the following uploaded materials, create a structured course outline.
 
@@ -242,13 +309,12 @@ Return a JSON structure describing the course, like:
 Return ONLY valid JSON — no markdown, no explanations.
 """
 
-        completion = client.chat.completions.create(
+        ai_output = (await llm_gateway.chat(
+            [{"role": "user", "content": prompt}],
             model="gpt-4o-mini",
-            messages=[{"role": "user", "content": prompt}],
             temperature=0.3,
-        )
-
-        ai_output = completion.choices[0].message.content.strip()
+            endpoint="receive_materials",
+        )).strip()
         print("🧠 OpenAI Output:", ai_output[:1000])
 
         return {"status": "ok", "materials": extracted_texts, "course": ai_output}
@@ -262,16 +328,23 @@ Return ONLY valid JSON — no markdown, no explanations.
 async def upload_files(files: list[UploadFile] = File(...)):
     """
     Handle file uploads from the wizard.
-    Saves uploaded files to the /uploaded_files directory.
+    Saves uploaded files under uploaded_files/materials by content hash; "keys"
+    can be passed as preview "files" to generate-full-course.
     """
     saved_files = []
+    keys = []
+    contents = []
     for file in files:
-        file_path = UPLOAD_DIR / file.filename
-        with open(file_path, "wb") as f:
-            f.write(await file.read())
+        content = await file.read()
+        keys.append(await asyncio.to_thread(_save_material, file.filename, content))
         saved_files.append(file.filename)
+        contents.append((file.filename, content))
+
+    # Text schon jetzt extrahieren -> /api/materials und /api/read-file treffen den Cache
+    extraction.prewarm(contents)
 
-    return {"message": f"{len(saved_files)} file(s) uploaded successfully", "files": saved_files}
+    return {"message": f"{len(saved_files)} file(s) uploaded successfully",
+            "files": saved_files, "keys": keys}
 
 
 class GenerateCourseRequest(BaseModel):
@@ -280,18 +353,8 @@ class GenerateCourseRequest(BaseModel):
     files: list[str] | None = None  # Dateinamen von /api/upload
 
 
-@app.post("/api/generate-course")
-async def generate_course(
-    materials: str = Form(...),
-    links: str = Form(""),
-    courseSize: str = Form("standard"),
-    files: Optional[List[UploadFile]] = File(None)
-):
-    print("📥 generate_course endpoint triggered!")
-    print(f"📏 Course size received: {courseSize}")
-
-    file_names = [f.filename for f in files] if files else []
-
+def _build_generate_course_prompt(materials: str, links: str, courseSize: str, file_names: list) -> str:
+    """Builds the full-outline prompt (shared by /api/generate-course and its stream variant)."""
     format_ranges = {
         "micro": (3, 5),
         "standard": (6, 10),
@@ -354,26 +417,69 @@ Output rules:
 - All lesson titles must be natural, meaningful, and unique.
 - Keep the number of lessons exactly {exact_count}.
 """
+    return prompt
+
+
+# Erwartete Struktur der Modell-Antworten (Notation siehe structured_output.py)
+COURSE_SCHEMA = {"course_title": str, "course_description?": str, "lessons": [dict]}
+LESSON_SCHEMA = {"scripts": dict, "quiz": {"questions": [dict]}, "workbook": (str, list)}
+IMPROVED_SCRIPT_SCHEMA = {"improved_script": str}
+SLIDES_SCHEMA = {"slides": [{"SlideTitle": str, "KeyPoints": [str],
+                             "IconDescription?": str, "ColorAccent?": str}]}
+
+
+def _repair_via_chat(endpoint: str, model: str = "gpt-4o-mini", max_tokens: Optional[int] = None):
+    """Follow-up call used by structured_output.parse for missing fields only."""
+    async def _call(prompt: str) -> str:
+        return await llm_gateway.chat(
+            [{"role": "user", "content": prompt}],
+            model=model, temperature=0.0, max_tokens=max_tokens,
+            endpoint=f"{endpoint}_repair",
+        )
+    return _call
+
+
+def _repair_via_responses(endpoint: str, model: str = "gpt-4.1"):
+    async def _call(prompt: str) -> str:
+        return await llm_gateway.respond(prompt, model=model, endpoint=f"{endpoint}_repair")
+    return _call
+
+
+def _parse_course_output(raw_output: str) -> dict:
+    """Parses the course JSON, tolerating fences, prose, trailing commas and truncation."""
+    return structured_output.extract_json(raw_output)
+
+
+@app.post("/api/generate-course")
+async def generate_course(
+    materials: str = Form(...),
+    links: str = Form(""),
+    courseSize: str = Form("standard"),
+    files: Optional[List[UploadFile]] = File(None)
+):
+    print("📥 generate_course endpoint triggered!")
+    print(f"📏 Course size received: {courseSize}")
+
+    file_names = [f.filename for f in files] if files else []
+
+    prompt = _build_generate_course_prompt(
+        materials, links, courseSize, file_names)
 
     try:
-        completion = client.chat.completions.create(
+        raw_output = (await llm_gateway.chat(
+            [{"role": "user", "content": prompt}],
             model="gpt-4o-mini",
-            messages=[{"role": "user", "content": prompt}],
             temperature=0.7,
-        )
-
-        raw_output = completion.choices[0].message.content.strip()
+            endpoint="generate_course",
+        )).strip()
         print("🧠 Raw OpenAI Output (vollständig):")
         print(raw_output)
 
-        if raw_output.startswith("```"):
-            raw_output = raw_output.split("```")[1]
-            if raw_output.strip().startswith("json"):
-                raw_output = raw_output.split("\n", 1)[1]
-            raw_output = raw_output.strip()
-
-        import json
-        parsed = json.loads(raw_output)
+        parsed, problems = await structured_output.parse(
+            raw_output, COURSE_SCHEMA, prompt=prompt,
+            call=_repair_via_chat("generate_course"), label="generate_course")
+        if problems:
+            raise ValueError(f"course JSON incomplete: {problems}")
         print(f"✅ Parsed JSON with {len(parsed.get('lessons', []))} lessons.")
         return JSONResponse(
             status_code=200,
@@ -387,29 +493,485 @@ Output rules:
             content={"success": False, "error": str(e)},
         )
 
+
+# ============================================================
+# 📡 Streaming-Varianten (Server-Sent Events)
+# ============================================================
+
+async def _stream_course_completion(prompt: str, temperature: float, endpoint: str, on_done):
+    """
+    Streams a course completion as SSE: `token` events with raw deltas, a `lesson`
+    event per lesson object as soon as it is complete, then `done` (payload from
+    on_done(raw)) or `error`.
+    """
+    parser = LessonStreamParser()
+    parts = []
+    lesson_index = 0
+    try:
+        async for delta in llm_gateway.chat_stream(
+            [{"role": "user", "content": prompt}],
+            model="gpt-4o-mini",
+            temperature=temperature,
+            endpoint=endpoint,
+        ):
+            parts.append(delta)
+            yield sse_event("token", {"delta": delta})
+            for lesson in parser.feed(delta):
+                yield sse_event("lesson", {"index": lesson_index, "lesson": lesson})
+                lesson_index += 1
+        yield sse_event("done", on_done("".join(parts)))
+    except Exception as e:
+        print(f"💥 Streaming error in {endpoint}:", e)
+        yield sse_event("error", {"error": str(e)})
+
+
+@app.post("/api/preview-course/stream")
+async def preview_course_stream(req: PreviewRequest):
+    """
+    Streaming variant of /api/preview-course. The final `done` event carries the
+    same {"preview": raw} payload as the non-streaming endpoint.
+    """
+    print("🧩 preview_course_stream called with:", req.model_dump())
+    prompt = _build_preview_prompt(req)
+    return StreamingResponse(
+        _stream_course_completion(
+            prompt, 0.0, "preview_course", lambda raw: {"preview": raw}),
+        media_type="text/event-stream",
+        headers=SSE_HEADERS,
+    )
+
+
+@app.post("/api/generate-course/stream")
+async def generate_course_stream(
+    materials: str = Form(...),
+    links: str = Form(""),
+    courseSize: str = Form("standard"),
+    files: Optional[List[UploadFile]] = File(None)
+):
+    """
+    Streaming variant of /api/generate-course. The final `done` event carries
+    {"success": True, "course": {...}} (or success False if the JSON is invalid).
+    """
+    file_names = [f.filename for f in files] if files else []
+    prompt = _build_generate_course_prompt(
+        materials, links, courseSize, file_names)
+
+    def _done(raw: str) -> dict:
+        try:
+            return {"success": True, "course": _parse_course_output(raw)}
+        except Exception as e:
+            return {"success": False, "error": str(e), "raw": raw}
+
+    return StreamingResponse(
+        _stream_course_completion(prompt, 0.7, "generate_course", _done),
+        media_type="text/event-stream",
+        headers=SSE_HEADERS,
+    )
+
 # --- FULL GENERATION BACKGROUND JOBS ---
 
 
 GENERATED_DIR = Path("generated")
 GENERATED_DIR.mkdir(exist_ok=True)
 
-# In-Memory Job Registry (MVP)
-JOBS: dict = {}
+# Job Registry (SQLite/WAL by default, shared by all workers; see job_store.py)
+JOB_STORE = get_job_store()
+JOBS = AsyncJobStore(JOB_STORE)  # awaitable view for async code: SQLite I/O runs off the event loop
+EVENTS = JobEventBus(JOB_STORE)
+JOB_PURGE_INTERVAL = int(os.environ.get("JOB_PURGE_INTERVAL", "3600"))
+
+
+# inline: Jobs laufen als Task im API-Prozess; queue: nur einreihen, `python -m backend.worker` arbeitet sie ab
+JOB_EXECUTION = os.environ.get("JOB_EXECUTION", "inline")
+JOB_QUEUE = get_job_queue() if JOB_EXECUTION == "queue" else None
+# strong references, damit laufende Job-Tasks nicht vom GC eingesammelt werden
+_background_tasks = set()
+# laufende Jobs melden sich regelmäßig; ohne Lebenszeichen gelten sie als abgebrochen
+JOB_HEARTBEAT_SECONDS = float(os.environ.get("JOB_HEARTBEAT_SECONDS", "30"))
+JOB_STALE_SECONDS = float(os.environ.get("JOB_STALE_SECONDS", "120"))
+
+
+def _job_coroutine(kind: str, job_id: str, payload: dict):
+    """The coroutine that runs a background job of `kind` (used inline and by backend.worker)."""
+    if kind == "full_course":
+        return _simulate_full_generation(job_id, payload.get("preview") or {})
+    if kind == "course_slides":
+        return _run_course_slides(job_id, payload["course_job_id"], payload.get("lessons") or [])
+    raise ValueError(f"unknown job kind: {kind}")
+
+
+async def _with_job_heartbeat(job_id: str, coro):
+    """Touches the job every JOB_HEARTBEAT_SECONDS while `coro` runs (see _recover_stale_jobs)."""
+    async def _beat():
+        while True:
+            await asyncio.sleep(JOB_HEARTBEAT_SECONDS)
+            await JOBS.update(job_id)
+
+    beat = asyncio.create_task(_beat())
+    try:
+        return await coro
+    finally:
+        beat.cancel()
+
+
+def _start_job(job_id: str, kind: str, payload: dict):
+    if JOB_QUEUE is not None:
+        JOB_QUEUE.enqueue(job_id, kind, payload)
+        return
+    task = asyncio.create_task(_with_job_heartbeat(job_id, _job_coroutine(kind, job_id, payload)))
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+
+
+def _job_kind(job: dict) -> str:
+    preview = job.get("preview")
+    if isinstance(preview, dict) and preview.get("kind") == "course_slides":
+        return "course_slides"
+    return "full_course"
+
+
+async def _resume_job(job_id: str, job: dict, start=_start_job):
+    """
+    Restarts a full-course job; finished lessons/assets are taken from its checkpoints.
+    `start(job_id, kind, payload)` runs it (backend.worker passes its own queue's enqueue).
+    """
+    checkpoints = await JOBS.get_checkpoints(job_id)
+    print(f"♻️ Resuming job {job_id} ({len(checkpoints)} checkpoints)")
+    await EVENTS.publish(job_id, "resumed", checkpoints=len(checkpoints))
+    start(job_id, "full_course", {"preview": job.get("preview") or {}})
+
+
+async def _restart_course_slides(job_id: str, job: dict, start=_start_job):
+    """
+    Reruns an interrupted course-slides job (unchanged slides are not re-rendered,
+    see slides.py). If its course job is gone, the slides job is marked failed.
+    """
+    course_job_id = (job.get("preview") or {}).get("course_job_id")
+    course = await JOBS.get(course_job_id) if course_job_id else None
+    if not course or course.get("status") != "done" or not course.get("result"):
+        error = "interrupted, course job no longer available"
+        await JOBS.update(job_id, status="error", error=error)
+        await EVENTS.publish(job_id, "error", error=error)
+        return
+    print(f"♻️ Restarting slide job {job_id} for course {course_job_id}")
+    await EVENTS.publish(job_id, "resumed", checkpoints=0)
+    start(job_id, "course_slides", {"course_job_id": course_job_id,
+                                    "lessons": course["result"].get("lessons") or []})
+
+
+async def _recover_stale_jobs(start=_start_job) -> int:
+    """Resumes jobs whose process died (no heartbeat for JOB_STALE_SECONDS)."""
+    resumed = 0
+    for job_id in await JOBS.list_stale(JOB_STALE_SECONDS):
+        job = await JOBS.get(job_id)
+        # atomar: bei mehreren Prozessen nimmt nur einer den Job
+        if not job or not await JOBS.claim_for_resume(job_id, JOB_STALE_SECONDS):
+            continue
+        if _job_kind(job) == "course_slides":
+            await _restart_course_slides(job_id, job, start)
+        else:
+            await _resume_job(job_id, job, start)
+        resumed += 1
+    return resumed
+
+
+async def _recover_stale_jobs_loop():
+    while True:
+        try:
+            await _recover_stale_jobs()
+        except Exception as e:
+            print("⚠️ Stale job recovery failed:", e)
+        await asyncio.sleep(JOB_STALE_SECONDS / 2)
+
+
+async def _purge_expired_jobs():
+    while True:
+        try:
+            purged = await JOBS.purge_expired()
+            if purged:
+                print(f"🧹 Purged {purged} expired jobs")
+            if JOB_QUEUE is not None:
+                JOB_QUEUE.purge_finished()
+            purged = uploads.purge_expired()
+            if purged:
+                print(f"🧹 Purged {purged} abandoned video uploads")
+        except Exception as e:
+            print("⚠️ Job purge failed:", e)
+        await asyncio.sleep(JOB_PURGE_INTERVAL)
+
+
+@app.on_event("startup")
+async def _start_job_purge():
+    app.state.job_purge_task = asyncio.create_task(_purge_expired_jobs())
+    if JOB_QUEUE is None:
+        # inline: abgebrochene Jobs (Deploy, Crash) hier fortsetzen; sonst macht das backend.worker
+        app.state.job_recovery_task = asyncio.create_task(_recover_stale_jobs_loop())
+
+# Max. Anzahl Lektionen, die pro Job gleichzeitig generiert werden (1 = sequentiell)
+LESSON_CONCURRENCY = max(1, int(os.environ.get("LESSON_CONCURRENCY", "4")))
+
+
+async def _publish_progress(job_id: str, event: str, **data):
+    """Progress event, best effort: a store hiccup must not fail the lesson or the job."""
+    try:
+        await EVENTS.publish(job_id, event, **data)
+    except Exception as e:
+        print(f"  ⚠️ Job {job_id}: event '{event}' not recorded: {e}")
+
+
+async def _save_checkpoint(job_id: str, name: str, data):
+    """Checkpoint, best effort: without it a resume just redoes the step."""
+    try:
+        await JOBS.save_checkpoint(job_id, name, data)
+    except Exception as e:
+        print(f"  ⚠️ Job {job_id}: checkpoint '{name}' not saved: {e}")
+
+
+async def _generate_lesson(job_id: str, job_folder: Path, li: int, lesson,
+                           materials: Optional[retrieval.MaterialIndex] = None) -> Optional[dict]:
+    """
+    Generates scripts, quiz and workbook for a single lesson under generated/<job_id>/lesson_<li>.
+    With a materials index, the top passages for the lesson are added to the prompt.
+    Falls OpenAI-Aufruf fehlschlägt, werden placeholders geschrieben (graceful fallback).
+    Returns the lesson entry for course.json, or None if even the fallback failed.
+    """
+    # normalize
+    if isinstance(lesson, str):
+        lesson_title = lesson
+        video_titles = []
+    else:
+        lesson_title = lesson.get("lesson_title") or lesson.get(
+            "title") or f"Lesson {li}"
+        video_titles = lesson.get(
+            "video_titles") or lesson.get("videos") or []
+
+    # default if no video titles
+    if not video_titles:
+        video_titles = [f"{lesson_title} — Part 1",
+                        f"{lesson_title} — Part 2"]
+
+    lesson_folder = job_folder / f"lesson_{li}"
+    lesson_folder.mkdir(parents=True, exist_ok=True)
+    await _publish_progress(job_id, "lesson_started", lesson=li, title=lesson_title)
+
+    # Prompt: ask for structured JSON containing scripts, quiz, workbook
+    prompt = f"""
+You are an expert instructional designer and professional scriptwriter.
+Create full lesson materials for the lesson titled: "{lesson_title}".
+Videos: {', '.join(video_titles)}
+
+Return valid JSON ONLY (no markdown fences) in this exact structure:
+{{
+  "scripts": {{
+    "video_1": "Full script text for first video...",
+    "video_2": "Full script text for second video..."
+  }},
+  "quiz": {{
+    "questions": [
+      {{
+        "question": "Question text",
+        "options": ["A", "B", "C", "D"],
+        "answer": "A"
+      }}
+    ]
+  }},
+  "workbook": "Short workbook/exercise text (a few bullet tasks or reflections)."
+}}
+
+Keep scripts actionable and specific to the lesson title. Keep quiz questions short and focused. Workbook should include 3-5 reflection/exercise bullets.
+"""
+    # nur die passendsten Abschnitte der hochgeladenen Materialien (ein paar hundert Tokens)
+    passages = materials.search(f"{lesson_title} {' '.join(video_titles)}") if materials else []
+    if passages:
+        prompt += f"""
+Ground the lesson in these excerpts from the course materials (use their facts and terminology, do not copy them verbatim):
+{retrieval.format_passages(passages)}
+"""
+
+    try:
+        raw = (await llm_gateway.chat(
+            [
+                {"role": "system", "content": "You are an expert course creator producing lesson scripts, quizzes and workbooks in strict JSON."},
+                {"role": "user", "content": prompt}
+            ],
+            model="gpt-4o-mini",
+            temperature=0.6,
+            max_tokens=1500,
+            endpoint="full_generation",
+        )).strip()
+        # tolerant parse; only missing/invalid fields are requested again
+        data, problems = await structured_output.parse(
+            raw, LESSON_SCHEMA, prompt=prompt,
+            call=_repair_via_chat("full_generation", max_tokens=1500),
+            label=f"lesson {li}")
+        if not data:
+            raise ValueError("no usable JSON in lesson answer")
+        if problems:
+            print(f"  ⚠️ Lesson {li}: still incomplete after repair: {problems}")
+
+        # save scripts, quiz, workbook
+        scripts = data.get("scripts") if isinstance(data.get("scripts"), dict) else {}
+        quiz_obj = data.get("quiz") if isinstance(data.get("quiz"), dict) else {}
+        workbook_text = data.get("workbook") or ""
+        if isinstance(workbook_text, list):
+            workbook_text = "\n".join(f"- {item}" for item in workbook_text)
+
+        video_entries = []
+        for idx, vtitle in enumerate(video_titles, start=1):
+            key = f"video_{idx}"
+            script_text = scripts.get(key) or scripts.get(
+                str(idx)) or scripts.get(vtitle) or ""
+            if not script_text:
+                # fallback to small placeholder
+                script_text = f"Script for '{vtitle}'\n\nLesson: {lesson_title}\n\n(Automatically generated placeholder - model returned no script.)"
+
+            script_path = lesson_folder / f"script_l{li}_v{idx}.txt"
+            script_path.write_text(script_text, encoding="utf-8")
+
+            video_entries.append({
+                "title": vtitle,
+                "script_file": str(script_path.resolve()),
+                "script_content": script_text  # keep inline too so frontend can use immediately
+            })
+
+        # quiz
+        quiz_path = lesson_folder / "quiz.json"
+        quiz_path.write_text(json.dumps(
+            quiz_obj or {}, indent=2, ensure_ascii=False), encoding="utf-8")
+
+        # workbook
+        workbook_path = lesson_folder / "workbook.txt"
+        workbook_path.write_text(workbook_text or "", encoding="utf-8")
+
+        # lesson entry for course.json
+        lesson_entry = {
+            "lesson_title": lesson_title,
+            "videos": video_entries,
+            "quiz_file": str(quiz_path.resolve()),
+            "workbook_file": str(workbook_path.resolve())
+        }
+        print(
+            f"  ✅ Generated lesson {li}: {lesson_title} (videos: {len(video_entries)})")
+
+    except Exception as e:
+        print(
+            f"  ⚠️ OpenAI generation failed for lesson {li} ({lesson_title}): {e}")
+        # fallback: create placeholders like earlier
+        try:
+            # create 2 placeholder scripts
+            scripts_entries = []
+            for vi, vtitle in enumerate(video_titles, start=1):
+                script_text = (
+                    f"Script for '{vtitle}'\n\n"
+                    f"Lesson: {lesson_title}\n"
+                    "This is an automatically generated placeholder script. Replace with full AI output if desired."
+                )
+                script_path = lesson_folder / f"script_l{li}_v{vi}.txt"
+                script_path.write_text(script_text, encoding="utf-8")
+                scripts_entries.append({
+                    "title": vtitle,
+                    "script_file": str(script_path.resolve()),
+                    "script_content": script_text
+                })
+
+            quiz_obj = {
+                "questions": [
+                    {
+                        "question": f"What is a key point from '{lesson_title}'?",
+                        "options": ["A", "B", "C", "D"],
+                        "answer": "A"
+                    }
+                ]
+            }
+            quiz_path = lesson_folder / "quiz.json"
+            quiz_path.write_text(json.dumps(
+                quiz_obj, indent=2, ensure_ascii=False), encoding="utf-8")
+
+            workbook_text = f"Workbook / exercise for lesson '{lesson_title}'. Reflect and answer the questions."
+            workbook_path = lesson_folder / "workbook.txt"
+            workbook_path.write_text(workbook_text, encoding="utf-8")
+
+            lesson_entry = {
+                "lesson_title": lesson_title,
+                "videos": scripts_entries,
+                "quiz_file": str(quiz_path.resolve()),
+                "workbook_file": str(workbook_path.resolve())
+            }
+            print(
+                f"  ℹ️ Fallback placeholders created for lesson {li}")
+        except Exception as e2:
+            print(
+                f"  💥 Failed creating fallback for lesson {li}: {e2}")
+            await _publish_progress(job_id, "lesson_failed", lesson=li,
+                                    title=lesson_title, error=str(e2))
+            # the other lessons still continue
+            return None
+        await _publish_progress(job_id, "lesson_finished", lesson=li,
+                                title=lesson_title, fallback=True)
+        return lesson_entry
+
+    # außerhalb des try: ein Store-Fehler darf die fertige Lektion nicht verwerfen.
+    # placeholder lessons (above) get no checkpoint, so a resume retries them
+    await _save_checkpoint(job_id, f"lesson:{li}", lesson_entry)
+    await _publish_progress(job_id, "lesson_finished", lesson=li,
+                            title=lesson_title, fallback=False)
+    return lesson_entry
+
+
+async def _job_material_documents(preview: dict) -> list:
+    """
+    Materials of a job as [{"filename", "content"}]: the free-text "materials" of the
+    wizard plus the extracted text of "files" (content keys from /api/materials or
+    /api/upload; bare filenames are ignored, they could name another user's upload).
+    """
+    documents = []
+    if isinstance(preview.get("materials"), str) and preview["materials"].strip():
+        documents.append({"filename": "materials", "content": preview["materials"]})
+
+    files = []
+    for key in preview.get("files") or []:
+        material = _material_path(key)
+        if material and material[1].is_file():
+            files.append((material[0], await asyncio.to_thread(material[1].read_bytes)))
+    # extraction results are cached by content hash, so this is usually instant
+    for (name, _), text in zip(files, await extraction.extract_many(files)):
+        if isinstance(text, str) and text.strip():
+            documents.append({"filename": name, "content": text})
+    return documents
+
+
+def _lesson_checkpoint_valid(entry) -> bool:
+    """A lesson checkpoint counts only if all of its files are still on disk."""
+    if not isinstance(entry, dict) or not entry.get("videos"):
+        return False
+    files = [v.get("script_file") for v in entry["videos"]]
+    files += [entry.get("quiz_file"), entry.get("workbook_file")]
+    return all(f and Path(f).exists() for f in files)
 
 
 async def _simulate_full_generation(job_id: str, preview_data: dict):
     """
     Full generation: for each lesson generate scripts, quiz and workbook content using OpenAI.
     Robust parsing, saves files under generated/<job_id>/lesson_X and writes course.json + zip.
+    Lessons, logo and banner run as concurrent stages; the zip is built last (includes images).
     Falls OpenAI-Aufruf fehlschlägt, werden lokale placeholders geschrieben (graceful fallback).
+    Finished lessons, logo, banner and the materials index are checkpointed; a resumed
+    job only redoes what is missing (or was a placeholder) and then rebuilds course.json.
     """
+    # Hintergrund-Job: alle Modell-Aufrufe dieses Tasks laufen in der Batch-Lane
+    llm_scheduler.set_lane(llm_scheduler.BATCH)
     job_folder = GENERATED_DIR / job_id
     job_folder.mkdir(parents=True, exist_ok=True)
 
     # ensure job exists
-    JOBS[job_id] = JOBS.get(job_id, {})
-    JOBS[job_id]["status"] = "running"
-    print(f"🔁 Job {job_id} started: preparing generation...")
+    await JOBS.create(job_id)
+    await JOBS.update(job_id, status="running")
+    # results of an earlier, interrupted run of this job (empty for new jobs)
+    checkpoints = await JOBS.get_checkpoints(job_id)
+    if checkpoints:
+        print(f"🔁 Job {job_id} resumed: {len(checkpoints)} checkpoints reused")
+    else:
+        print(f"🔁 Job {job_id} started: preparing generation...")
 
     try:
         await asyncio.sleep(0.5)  # small kick-off pause
@@ -455,245 +1017,144 @@ async def _simulate_full_generation(job_id: str, preview_data: dict):
 
         print(
             f"🧠 Generating content for course '{course_title}' with {len(preview_lessons)} lessons...")
+        await _publish_progress(job_id, "job_started", course_title=course_title,
+                                lessons=len(preview_lessons))
 
-        # ---- main loop: call OpenAI per lesson to produce scripts, quiz, workbook ----
-        for li, lesson in enumerate(preview_lessons, start=1):
-            # normalize
-            if isinstance(lesson, str):
-                lesson_title = lesson
-                video_titles = []
-            else:
-                lesson_title = lesson.get("lesson_title") or lesson.get(
-                    "title") or f"Lesson {li}"
-                video_titles = lesson.get(
-                    "video_titles") or lesson.get("videos") or []
-
-            # default if no video titles
-            if not video_titles:
-                video_titles = [f"{lesson_title} — Part 1",
-                                f"{lesson_title} — Part 2"]
-
-            lesson_folder = job_folder / f"lesson_{li}"
-            lesson_folder.mkdir(parents=True, exist_ok=True)
-
-            # Prompt: ask for structured JSON containing scripts, quiz, workbook
-            prompt = f"""
-You are an expert instructional designer and professional scriptwriter.
-Create full lesson materials for the lesson titled: "{lesson_title}".
-Videos: {', '.join(video_titles)}
-
-Return valid JSON ONLY (no markdown fences) in this exact structure:
-{{
-  "scripts": {{
-    "video_1": "Full script text for first video...",
-    "video_2": "Full script text for second video..."
-  }},
-  "quiz": {{
-    "questions": [
-      {{
-        "question": "Question text",
-        "options": ["A", "B", "C", "D"],
-        "answer": "A"
-      }}
-    ]
-  }},
-  "workbook": "Short workbook/exercise text (a few bullet tasks or reflections)."
-}}
-
-Keep scripts actionable and specific to the lesson title. Keep quiz questions short and focused. Workbook should include 3-5 reflection/exercise bullets.
-"""
-
-            ai_success = False
+        # ---- stages: lessons, logo and banner run concurrently; course.json and the
+        # archive follow as soon as their inputs exist (see stages.py) ----
+        async def _materials_index_stage(_deps):
+            # BM25 index over the uploaded materials, built once per job
             try:
-                # call OpenAI chat completions (your client)
-                completion = client.chat.completions.create(
-                    model="gpt-4o-mini",
-                    messages=[
-                        {"role": "system", "content": "You are an expert course creator producing lesson scripts, quizzes and workbooks in strict JSON."},
-                        {"role": "user", "content": prompt}
-                    ],
-                    temperature=0.6,
-                    max_tokens=1500,
-                )
-
-                raw = completion.choices[0].message.content.strip()
-                # strip triple-backticks and leading "json"
-                if raw.startswith("```"):
-                    parts = raw.split("```")
-                    if len(parts) >= 2:
-                        raw = parts[1]
-                        # remove optional "json" header
-                        if raw.strip().lower().startswith("json"):
-                            raw = raw.split("\n", 1)[1]
-                    raw = raw.strip()
-
-                data = json.loads(raw)  # may raise
-
-                # save scripts, quiz, workbook
-                scripts = data.get("scripts", {})
-                quiz_obj = data.get("quiz", {})
-                workbook_text = data.get("workbook", "")
-
-                video_entries = []
-                for idx, vtitle in enumerate(video_titles, start=1):
-                    key = f"video_{idx}"
-                    script_text = scripts.get(key) or scripts.get(
-                        str(idx)) or scripts.get(vtitle) or ""
-                    if not script_text:
-                        # fallback to small placeholder
-                        script_text = f"Script for '{vtitle}'\n\nLesson: {lesson_title}\n\n(Automatically generated placeholder - model returned no script.)"
-
-                    script_path = lesson_folder / f"script_l{li}_v{idx}.txt"
-                    script_path.write_text(script_text, encoding="utf-8")
-
-                    video_entries.append({
-                        "title": vtitle,
-                        "script_file": str(script_path.resolve()),
-                        "script_content": script_text  # keep inline too so frontend can use immediately
-                    })
-
-                # quiz
-                quiz_path = lesson_folder / "quiz.json"
-                quiz_path.write_text(json.dumps(
-                    quiz_obj or {}, indent=2, ensure_ascii=False), encoding="utf-8")
-
-                # workbook
-                workbook_path = lesson_folder / "workbook.txt"
-                workbook_path.write_text(workbook_text or "", encoding="utf-8")
-
-                # add lesson to course_out
-                lesson_entry = {
-                    "lesson_title": lesson_title,
-                    "videos": video_entries,
-                    "quiz_file": str(quiz_path.resolve()),
-                    "workbook_file": str(workbook_path.resolve())
-                }
-                course_out["lessons"].append(lesson_entry)
-                ai_success = True
-                print(
-                    f"  ✅ Generated lesson {li}: {lesson_title} (videos: {len(video_entries)})")
-
+                if "materials_index" in checkpoints:
+                    return await asyncio.to_thread(retrieval.MaterialIndex.load, job_folder)
+                documents = await _job_material_documents(parsed_preview)
+                if not documents:
+                    await _save_checkpoint(job_id, "materials_index", {"passages": 0})
+                    return None
+                index = await asyncio.to_thread(retrieval.MaterialIndex.build, documents)
+                await asyncio.to_thread(index.save, job_folder)
+                await _save_checkpoint(job_id, "materials_index", {"passages": len(index)})
+                print(f"  📚 Materials index: {len(index)} passages from {len(documents)} sources")
+                return index
             except Exception as e:
-                print(
-                    f"  ⚠️ OpenAI generation failed for lesson {li} ({lesson_title}): {e}")
-                # fallback: create placeholders like earlier
-                try:
-                    # create 2 placeholder scripts
-                    scripts_entries = []
-                    for vi, vtitle in enumerate(video_titles, start=1):
-                        script_text = (
-                            f"Script for '{vtitle}'\n\n"
-                            f"Lesson: {lesson_title}\n"
-                            "This is an automatically generated placeholder script. Replace with full AI output if desired."
-                        )
-                        script_path = lesson_folder / f"script_l{li}_v{vi}.txt"
-                        script_path.write_text(script_text, encoding="utf-8")
-                        scripts_entries.append({
-                            "title": vtitle,
-                            "script_file": str(script_path.resolve()),
-                            "script_content": script_text
-                        })
-
-                    quiz_obj = {
-                        "questions": [
-                            {
-                                "question": f"What is a key point from '{lesson_title}'?",
-                                "options": ["A", "B", "C", "D"],
-                                "answer": "A"
-                            }
-                        ]
-                    }
-                    quiz_path = lesson_folder / "quiz.json"
-                    quiz_path.write_text(json.dumps(
-                        quiz_obj, indent=2, ensure_ascii=False), encoding="utf-8")
-
-                    workbook_text = f"Workbook / exercise for lesson '{lesson_title}'. Reflect and answer the questions."
-                    workbook_path = lesson_folder / "workbook.txt"
-                    workbook_path.write_text(workbook_text, encoding="utf-8")
-
-                    lesson_entry = {
-                        "lesson_title": lesson_title,
-                        "videos": scripts_entries,
-                        "quiz_file": str(quiz_path.resolve()),
-                        "workbook_file": str(workbook_path.resolve())
-                    }
-                    course_out["lessons"].append(lesson_entry)
-                    print(
-                        f"  ℹ️ Fallback placeholders created for lesson {li}")
-                except Exception as e2:
-                    print(
-                        f"  💥 Failed creating fallback for lesson {li}: {e2}")
-                    # still continue to next lesson
-
-        # Save course.json
-        course_json_path = job_folder / "course.json"
-        course_json_path.write_text(json.dumps(
-            course_out, indent=2, ensure_ascii=False), encoding="utf-8")
-
-        # zip
-        zip_path = GENERATED_DIR / f"{job_id}.zip"
-        if zip_path.exists():
-            zip_path.unlink()
-        shutil.make_archive(str(zip_path.with_suffix('')),
-                            'zip', root_dir=job_folder)
-
-        # try logo + banner (keep your existing calls but ensure they work non-blocking)
-        logo_abs_path = None
-        banner_abs_path = None
-        try:
-            dalle = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-            logo_prompt = f"Create a minimalist, modern course logo for the course titled '{course_title}'. Simple, flat, high-end."
-            logo_result = dalle.images.generate(
-                model="gpt-image-1", prompt=logo_prompt, size="1024x1024", n=1)
-            logo_b64 = logo_result.data[0].b64_json
-            logo_bytes = base64.b64decode(logo_b64)
-            logo_path = job_folder / "logo.png"
-            logo_path.write_bytes(logo_bytes)
-            logo_abs_path = str(logo_path.resolve())
-            print("  ✅ Logo generated")
-        except Exception as e:
-            print("  ⚠️ Logo generation skipped/failed:", e)
-
-        # banner (optional)
-        try:
-            dalle = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-            banner_prompt = f"Create a cinematic hero banner for the course titled '{course_title}', 16:9, modern, minimal."
-            # Note: some model endpoints accept only certain sizes; keep try/except
-            banner_result = dalle.images.generate(
-                model="gpt-image-1", prompt=banner_prompt, size="1536x1024", n=1)
-            banner_b64 = banner_result.data[0].b64_json
-            banner_bytes = base64.b64decode(banner_b64)
-            banner_path = job_folder / "banner.png"
-            banner_path.write_bytes(banner_bytes)
-            banner_abs_path = str(banner_path.resolve())
-            print("  ✅ Banner generated")
-        except Exception as e:
-            print("  ⚠️ Banner generation skipped/failed:", e)
+                print("  ⚠️ Materials index skipped:", e)
+                return None
+
+        async def _lessons_stage(deps):
+            # one OpenAI call per lesson, at most LESSON_CONCURRENCY at a time
+            semaphore = asyncio.Semaphore(LESSON_CONCURRENCY)
+
+            async def _bounded(li: int, lesson):
+                done = checkpoints.get(f"lesson:{li}")
+                if _lesson_checkpoint_valid(done):
+                    await _publish_progress(job_id, "lesson_finished", lesson=li,
+                                            title=done.get("lesson_title"), fallback=False, resumed=True)
+                    return done
+                async with semaphore:
+                    return await _generate_lesson(job_id, job_folder, li, lesson,
+                                                  materials=deps["materials_index"])
+
+            lesson_entries = await asyncio.gather(*[
+                _bounded(li, lesson)
+                for li, lesson in enumerate(preview_lessons, start=1)
+            ])
+            # gather keeps input order, so lessons stay in preview order
+            return [e for e in lesson_entries if e is not None]
+
+        async def _logo_stage(_deps):
+            done = checkpoints.get("logo")
+            if done and Path(done).exists():
+                return done
+            try:
+                logo_prompt = f"Create a minimalist, modern course logo for the course titled '{course_title}'. Simple, flat, high-end."
+                logo_bytes = await llm_gateway.image(logo_prompt, size="1024x1024")
+                logo_path = job_folder / "logo.png"
+                logo_path.write_bytes(logo_bytes)
+                await _save_checkpoint(job_id, "logo", str(logo_path.resolve()))
+                print("  ✅ Logo generated")
+                await _publish_progress(job_id, "logo_done",
+                                        url=f"/generated/{job_id}/logo.png")
+                return str(logo_path.resolve())
+            except Exception as e:
+                print("  ⚠️ Logo generation skipped/failed:", e)
+                await _publish_progress(job_id, "logo_failed", error=str(e))
+                return None
+
+        async def _banner_stage(_deps):
+            done = checkpoints.get("banner")
+            if done and Path(done).exists():
+                return done
+            try:
+                banner_prompt = f"Create a cinematic hero banner for the course titled '{course_title}', 16:9, modern, minimal."
+                # Note: some model endpoints accept only certain sizes; keep try/except
+                banner_bytes = await llm_gateway.image(banner_prompt, size="1536x1024")
+                banner_path = job_folder / "banner.png"
+                banner_path.write_bytes(banner_bytes)
+                await _save_checkpoint(job_id, "banner", str(banner_path.resolve()))
+                print("  ✅ Banner generated")
+                await _publish_progress(job_id, "banner_done",
+                                        url=f"/generated/{job_id}/banner.png")
+                return str(banner_path.resolve())
+            except Exception as e:
+                print("  ⚠️ Banner generation skipped/failed:", e)
+                await _publish_progress(job_id, "banner_failed", error=str(e))
+                return None
+
+        async def _course_json_stage(deps):
+            course_out["lessons"] = deps["lessons"]
+            course_json_path = job_folder / "course.json"
+            course_json_path.write_text(json.dumps(
+                course_out, indent=2, ensure_ascii=False), encoding="utf-8")
+            return str(course_json_path.resolve())
+
+        async def _archive_stage(_deps):
+            # the zip is streamed from the job folder on download (archive.py), so the
+            # archive is ready once course.json, logo and banner are on disk.
+            # JSON/TXT bekommen einmalig .gz/.br-Varianten für /generated (static_delivery.py)
+            await asyncio.to_thread(static_delivery.precompress_tree, job_folder)
+            zip_url = f"/generated/{job_id}.zip"
+            await _publish_progress(job_id, "zip_built", url=zip_url)
+            return zip_url
+
+        stage_results = await run_stages([
+            Stage("materials_index", _materials_index_stage),
+            Stage("lessons", _lessons_stage, deps=["materials_index"]),
+            Stage("logo", _logo_stage),
+            Stage("banner", _banner_stage),
+            Stage("course_json", _course_json_stage, deps=["lessons"]),
+            Stage("archive", _archive_stage, deps=["course_json", "logo", "banner"]),
+        ], label=job_id[:8])
+        zip_url = stage_results["archive"]
+        logo_abs_path = stage_results["logo"]
+        banner_abs_path = stage_results["banner"]
 
         # final result
         final_result = {
             "course_title": course_out.get("course_title"),
             "course_description": course_out.get("course_description"),
             "lessons": course_out.get("lessons"),
-            "zip": str(zip_path.resolve()),
+            "zip": zip_url,
         }
+        # versioned URLs (?v=...) are served with Cache-Control: immutable
         base_url = "/generated"
         if logo_abs_path:
             final_result["logo_path"] = logo_abs_path
-            final_result["logo_url"] = f"{base_url}/{job_id}/logo.png"
+            final_result["logo_url"] = static_delivery.versioned_url(
+                f"{base_url}/{job_id}/logo.png", logo_abs_path)
         if banner_abs_path:
             final_result["banner_path"] = banner_abs_path
-            final_result["banner_url"] = f"{base_url}/{job_id}/banner.png"
+            final_result["banner_url"] = static_delivery.versioned_url(
+                f"{base_url}/{job_id}/banner.png", banner_abs_path)
 
-        JOBS[job_id]["status"] = "done"
-        JOBS[job_id]["result"] = final_result
+        await JOBS.update(job_id, status="done", result=final_result)
         print(
             f"✅ Job {job_id} completed: {len(final_result['lessons'])} lessons. ZIP: {final_result['zip']}")
+        await EVENTS.publish(job_id, "done", lessons=len(final_result["lessons"]))
 
     except Exception as e:
-        JOBS[job_id]["status"] = "error"
-        JOBS[job_id]["error"] = str(e)
+        await JOBS.update(job_id, status="error", error=str(e))
         print(f"💥 Job {job_id} failed with exception: {e}")
+        await EVENTS.publish(job_id, "error", error=str(e))
 
 
 # ============================================================
@@ -733,15 +1194,7 @@ Output: ultra-wide 2048x1152 pixels.
 """
 
     try:
-        dalle = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-        result = dalle.images.generate(
-            model="gpt-image-1",
-            prompt=banner_prompt,
-            size="2048x1152",
-            n=1
-        )
-        image_b64 = result.data[0].b64_json
-        image_bytes = base64.b64decode(image_b64)
+        image_bytes = await llm_gateway.image(banner_prompt, size="2048x1152")
 
         banner_path = job_folder / "banner.png"
         with open(banner_path, "wb") as f:
@@ -782,15 +1235,7 @@ async def generate_logo(payload: dict):
     """
 
     try:
-        dalle = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-        result = dalle.images.generate(
-            model="gpt-image-1",
-            prompt=logo_prompt,
-            size="1024x1024",
-            n=1
-        )
-        image_b64 = result.data[0].b64_json
-        image_bytes = base64.b64decode(image_b64)
+        image_bytes = await llm_gateway.image(logo_prompt, size="1024x1024")
 
         logo_path = job_folder / "logo.png"
         with open(logo_path, "wb") as f:
@@ -808,12 +1253,34 @@ async def generate_logo(payload: dict):
 # 🚀 Full Course Generation Job
 # ============================================================
 
+# Doppelklicks / Retries: gleiche Vorschau innerhalb des Fensters -> bestehender Job (0 = aus)
+JOB_DEDUPE_WINDOW_SECONDS = int(os.environ.get("JOB_DEDUPE_WINDOW_SECONDS", "600"))
+IDEMPOTENCY_KEY_TTL_SECONDS = int(os.environ.get("IDEMPOTENCY_KEY_TTL_SECONDS", str(24 * 3600)))
+
+
+def _normalize_preview(value):
+    """Drops empty values, collapses whitespace; dict key order does not matter for json.dumps(sort_keys)."""
+    if isinstance(value, dict):
+        out = {k: _normalize_preview(v) for k, v in value.items()}
+        return {k: v for k, v in out.items() if v not in (None, "", [], {})}
+    if isinstance(value, list):
+        return [_normalize_preview(v) for v in value]
+    if isinstance(value, str):
+        return " ".join(value.split())
+    return value
+
+
+def _preview_fingerprint(preview) -> str:
+    normalized = json.dumps(_normalize_preview(preview), sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+
 @app.post("/api/generate-full-course")
 async def generate_full_course(request: Request):
     """
     Startet die Full-Generation als Hintergrundjob.
     Erwartet im Request JSON mit preview/course info (optional).
-    Liefert sofort jobId zurück; Hintergrundtask füllt JOBS[job_id]["result"] später.
+    Liefert sofort jobId zurück; Hintergrundtask schreibt das Ergebnis später in den JOB_STORE.
     """
     try:
         payload = await request.json()
@@ -843,13 +1310,33 @@ async def generate_full_course(request: Request):
         preview = {}
 
     job_id = str(uuid.uuid4())
-    # create job placeholder in memory
-    JOBS[job_id] = {"status": "queued", "preview": preview}
+
+    # duplicate submission (same Idempotency-Key, or same preview within the window) -> existing job
+    fingerprint = _preview_fingerprint(preview)
+    submission_keys = {}
+    idempotency_key = (request.headers.get("Idempotency-Key") or "").strip()
+    if idempotency_key:
+        submission_keys[f"key:{idempotency_key[:200]}"] = IDEMPOTENCY_KEY_TTL_SECONDS
+    if JOB_DEDUPE_WINDOW_SECONDS > 0:
+        submission_keys[f"fp:{fingerprint}"] = JOB_DEDUPE_WINDOW_SECONDS
+    claim = await JOBS.claim_submission(submission_keys, job_id, fingerprint) if submission_keys else None
+    if claim:
+        if claim["key"].startswith("key:") and claim["fingerprint"] != fingerprint:
+            return JSONResponse(status_code=422, content={
+                "error": "Idempotency-Key was already used for a different course"})
+        existing = claim["job_id"]
+        print(f"♻️ generate-full-course: duplicate submission, returning job {existing}")
+        return {"jobId": existing, "status": await JOBS.get_status(existing) or "queued",
+                "deduplicated": True}
+
+    # create job placeholder in the job store
+    await JOBS.create(job_id, status="queued", preview=preview)
+    await EVENTS.publish(job_id, "queued")
     print(
         f"🚀 generate-full-course called — queuing job {job_id} with preview keys: {list(preview.keys()) if isinstance(preview, dict) else 'n/a'}")
 
-    # start background generation task (non-blocking)
-    asyncio.create_task(_simulate_full_generation(job_id, preview or {}))
+    # start background generation (task in this process, or via the job queue)
+    _start_job(job_id, "full_course", {"preview": preview or {}})
 
     return {"jobId": job_id, "status": "queued"}
 
@@ -858,30 +1345,166 @@ async def generate_full_course(request: Request):
 # 📦 Download & Status Endpoints
 # ============================================================
 
+@app.post("/api/jobs/{job_id}/resume")
+async def resume_job(job_id: str):
+    """
+    Setzt einen abgebrochenen oder fehlgeschlagenen Full-Course-Job fort: nur fehlende
+    bzw. Platzhalter-Lektionen und Assets werden neu erzeugt, dann course.json + Archiv.
+    """
+    job = await JOBS.get(job_id)
+    if not job:
+        return JSONResponse(status_code=404, content={"error": "job not found"})
+    if _job_kind(job) != "full_course":
+        return JSONResponse(status_code=400, content={"error": "only full-course jobs can be resumed"})
+    if job["status"] == "done":
+        return JSONResponse(status_code=409, content={"error": "job is already done"})
+    if not await JOBS.claim_for_resume(job_id, JOB_STALE_SECONDS):
+        return JSONResponse(status_code=409, content={"error": "job is still running"})
+    await _resume_job(job_id, job)
+    return {"jobId": job_id, "status": "queued", "checkpoints": len(await JOBS.get_checkpoints(job_id))}
+
+
+@app.get("/api/job-queue/stats")
+async def job_queue_stats():
+    """Queue depth per state (only with JOB_EXECUTION=queue)."""
+    if JOB_QUEUE is None:
+        return {"execution": JOB_EXECUTION}
+    return {"execution": JOB_EXECUTION, **JOB_QUEUE.stats()}
+
+
 @app.get("/api/job/{job_id}")
 async def get_job(job_id: str):
-    job = JOBS.get(job_id)
-    if not job:
+    status = await JOBS.get_status(job_id)
+    if not status:
         return {"error": "job not found"}
-    return {"job_id": job_id, "status": job.get("status")}
+    return {"job_id": job_id, "status": status}
+
+
+JOB_STATUS_FIELDS = ("status", "summary", "full")
+
+
+def _summarize_result(result: Optional[dict]) -> Optional[dict]:
+    """Job result without the inline script texts (lesson/video titles and file refs only)."""
+    if not result:
+        return result
+    summary = {k: v for k, v in result.items() if k != "lessons"}
+    summary["lessons"] = [
+        {
+            **{k: v for k, v in lesson.items() if k != "videos"},
+            "videos": [
+                {k: v for k, v in video.items() if k != "script_content"}
+                for video in lesson.get("videos", [])
+            ],
+        }
+        for lesson in result.get("lessons") or []
+    ]
+    return summary
 
 
 @app.get("/api/job-status/{job_id}")
-async def get_job_status(job_id: str):
+async def get_job_status(job_id: str, request: Request, fields: str = "full"):
     """
     Compatibility endpoint for frontend polling (/api/job-status/{job_id})
+    ?fields=status|summary|full projects the result (default full). Responses carry
+    an ETag derived from the job version; If-None-Match returns 304.
     """
-    job = JOBS.get(job_id)
-    if not job:
+    if fields not in JOB_STATUS_FIELDS:
+        return JSONResponse(status_code=400, content={
+            "error": f"fields must be one of {', '.join(JOB_STATUS_FIELDS)}"})
+
+    meta = await JOBS.get_meta(job_id)
+    if not meta:
         return {"error": "job not found"}
-    return {"jobId": job_id, "status": job.get("status"), "result": job.get("result")}
+
+    etag = 'W/"' + hashlib.sha1(
+        f"{job_id}:{meta['updated_at']}:{meta['status']}:{fields}".encode()).hexdigest() + '"'
+
+    def _payload():
+        payload = {"jobId": job_id, "status": meta["status"]}
+        if meta.get("error"):
+            payload["error"] = meta["error"]
+        if fields != "status":
+            job = JOB_STORE.get(job_id) or {}
+            result = job.get("result")
+            payload["result"] = _summarize_result(result) if fields == "summary" else result
+        return payload
+
+    return cached_json_response(request, etag, _payload)
+
+
+@app.get("/api/job-events/{job_id}")
+async def job_events(job_id: str, request: Request):
+    """
+    Push channel for job progress (SSE). Replays all events of the job, then streams
+    new ones as _simulate_full_generation publishes them; closes after done/error.
+    Reconnecting clients resume via Last-Event-ID. After a resume, replay starts at the
+    latest "resumed" event: the done/error of the earlier run is no longer final.
+    """
+    if not await JOBS.get_status(job_id):
+        return JSONResponse(status_code=404, content={"error": "job not found"})
+
+    try:
+        seq = int(request.headers.get("last-event-id", "0"))
+    except ValueError:
+        seq = 0
+
+    async def _stream():
+        nonlocal seq
+        while True:
+            events = await EVENTS.since(job_id, seq)
+            # alles vor dem letzten Resume ist überholt
+            start = max((i for i, e in enumerate(events) if e["event"] == "resumed"), default=0)
+            for evt in events[start:]:
+                seq = evt["seq"]
+                yield sse_event(evt["event"], evt, event_id=seq)
+                if evt["event"] in TERMINAL_EVENTS:
+                    return
+            if await request.is_disconnected():
+                return
+            if not await EVENTS.wait(job_id, seq, timeout=15):
+                yield ": keep-alive\n\n"
+
+    return StreamingResponse(_stream(), media_type="text/event-stream", headers=SSE_HEADERS)
 
 
 @app.get("/generated/{job_id}.zip")
 async def download_generated_zip(job_id: str):
+    """
+    Streams the course archive straight from generated/<job_id>/ (no zip on disk).
+    Older jobs that still have a pre-built generated/<job_id>.zip are served as file.
+    Jobs the store knows are only downloadable once done (a running job would give a
+    partial zip). Jobs it no longer knows (pre-store or past JOB_TTL_SECONDS) are served
+    if the id is a job id and the folder was finished (course.json) or a zip exists.
+    """
+    if "/" in job_id or "\\" in job_id or job_id.startswith("."):
+        return JSONResponse(status_code=404, content={"error": "not found"})
+
+    job_folder = GENERATED_DIR / job_id
+    job = await JOBS.get(job_id)
+    if job is not None:
+        if _job_kind(job) != "full_course":
+            return JSONResponse(status_code=404, content={"error": "not found"})
+        if job["status"] != "done":
+            return JSONResponse(status_code=409, content={"error": "job not finished", "status": job["status"]})
+    else:
+        try:
+            uuid.UUID(job_id)
+        except ValueError:
+            # keine Job-ID (z.B. slides, coach) -> kein Kurs-Archiv
+            return JSONResponse(status_code=404, content={"error": "not found"})
+        if not (job_folder / "course.json").is_file():
+            job_folder = None  # unfertig oder nicht vorhanden -> höchstens die alte ZIP
+
+    if job_folder is not None and job_folder.is_dir():
+        return StreamingResponse(
+            iter_zip(job_folder),
+            media_type="application/zip",
+            headers={"Content-Disposition": f'attachment; filename="{job_id}.zip"'},
+        )
+
     zip_path = GENERATED_DIR / f"{job_id}.zip"
     if not zip_path.exists():
-        return {"error": "not found"}
+        return JSONResponse(status_code=404, content={"error": "not found"})
     return FileResponse(path=str(zip_path), filename=f"{job_id}.zip")
 
 
@@ -898,34 +1521,10 @@ async def read_file(file: UploadFile = File(...)):
     try:
         filename = file.filename.lower()
         content = await file.read()
-        text = ""
-
-        # 🧾 PDF
-        if filename.endswith(".pdf"):
-            pdf_reader = PdfReader(io.BytesIO(content))
-            for page in pdf_reader.pages:
-                text += page.extract_text() or ""
-
-        # 📄 DOCX
-        elif filename.endswith(".docx"):
-            doc = docx.Document(io.BytesIO(content))
-            for para in doc.paragraphs:
-                text += para.text + "\n"
-
-        # 📝 TXT
-        elif filename.endswith(".txt"):
-            text = content.decode("utf-8", errors="ignore")
-
-        # 🖼️ IMAGE (OCR mit pytesseract)
-        elif filename.endswith((".png", ".jpg", ".jpeg")):
-            with tempfile.NamedTemporaryFile(delete=False, suffix=os.path.splitext(filename)[1]) as tmp:
-                tmp.write(content)
-                tmp_path = tmp.name
-            image = Image.open(tmp_path)
-            text = pytesseract.image_to_string(image)
-            os.remove(tmp_path)
 
-        else:
+        try:
+            text = await extraction.extract_text(filename, content)
+        except extraction.UnsupportedFileType:
             return {"error": "Unsupported file type"}
 
         if not text.strip():
@@ -939,6 +1538,17 @@ async def read_file(file: UploadFile = File(...)):
         return {"error": str(e)}
 
 
+@app.get("/api/structured-output/stats")
+async def structured_output_stats():
+    return structured_output.stats()
+
+
+@app.get("/api/extraction/stats")
+async def extraction_stats():
+    """Per-format extraction counters and timings."""
+    return await asyncio.to_thread(extraction.stats)
+
+
 @app.post("/api/upload-video")
 async def upload_video(
     request: Request,
@@ -946,16 +1556,105 @@ async def upload_video(
     course_id: str = Form(...),
     lesson_id: str = Form(...)
 ):
-    base_path = Path("generated") / course_id / lesson_id
+    """
+    Single-request upload (kept for small recordings). The multipart body is already
+    spooled to a temp file by Starlette and is copied to disk in chunks; large videos
+    should use the resumable /api/upload-video/sessions protocol below.
+    """
+    try:
+        base_path = uploads.target_dir(course_id, lesson_id)
+        filename = uploads.safe_filename(video.filename)
+    except uploads.UploadError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
     base_path.mkdir(parents=True, exist_ok=True)
-    video_path = base_path / video.filename
+    video_path = base_path / filename
+    part_path = base_path / f"{filename}.part"
+
+    def _copy():
+        with open(part_path, "wb") as f:
+            shutil.copyfileobj(video.file, f, uploads.UPLOAD_WRITE_BUFFER)
+        os.replace(part_path, video_path)
+
+    await asyncio.to_thread(_copy)
+
+    base_url = str(request.base_url).rstrip("/")
+    return {"video_url": f"{base_url}{uploads.public_path(course_id, lesson_id, filename)}"}
+
+
+# =====================================
+# Resumable video upload (tus-style)
+#   POST   /api/upload-video/sessions        -> upload_id, offset 0
+#   GET    /api/upload-video/{upload_id}     -> committed offset (HEAD: Upload-Offset header)
+#   PATCH  /api/upload-video/{upload_id}     -> body = bytes from Upload-Offset on
+#   DELETE /api/upload-video/{upload_id}     -> abort
+# =====================================
+
+class VideoUploadSessionRequest(BaseModel):
+    course_id: str
+    lesson_id: str
+    filename: str
+    length: int
 
-    with open(video_path, "wb") as f:
-        f.write(await video.read())
 
+def _upload_state(request: Request, session: dict) -> JSONResponse:
+    body = {
+        "upload_id": session["upload_id"],
+        "offset": session["offset"],
+        "length": session["length"],
+        "complete": session.get("complete", False),
+    }
+    if body["complete"]:
         base_url = str(request.base_url).rstrip("/")
+        body["video_url"] = base_url + uploads.public_path(
+            session["course_id"], session["lesson_id"], session["filename"])
+    return JSONResponse(body, headers={
+        "Upload-Offset": str(session["offset"]),
+        "Upload-Length": str(session["length"]),
+        "Cache-Control": "no-store",
+    })
+
+
+@app.post("/api/upload-video/sessions", status_code=201)
+async def create_video_upload(req: VideoUploadSessionRequest, request: Request):
+    try:
+        session = await asyncio.to_thread(
+            uploads.create_session, req.course_id, req.lesson_id, req.filename, req.length)
+    except uploads.UploadError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+    response = _upload_state(request, session)
+    # 200: bestehende Session für dieses Ziel, der Client macht ab deren Offset weiter
+    response.status_code = 200 if session["resumed"] else 201
+    response.headers["Location"] = f"/api/upload-video/{session['upload_id']}"
+    return response
+
+
+@app.api_route("/api/upload-video/{upload_id}", methods=["GET", "HEAD"])
+async def get_video_upload(upload_id: str, request: Request):
+    try:
+        return _upload_state(request, uploads.get_session(upload_id))
+    except uploads.UploadError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+
+
+@app.patch("/api/upload-video/{upload_id}")
+async def patch_video_upload(upload_id: str, request: Request):
+    try:
+        offset = int(request.headers["upload-offset"])
+    except (KeyError, ValueError):
+        raise HTTPException(status_code=400, detail="Upload-Offset header required")
+    try:
+        session = await uploads.append(upload_id, offset, request.stream())
+    except uploads.UploadError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+    return _upload_state(request, session)
 
-        return {"video_url": f"{base_url}/generated/{course_id}/{lesson_id}/{video.filename}"}
+
+@app.delete("/api/upload-video/{upload_id}", status_code=204)
+async def delete_video_upload(upload_id: str):
+    try:
+        uploads.delete_session(upload_id)
+    except uploads.UploadError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
 
 
 class CoachImproveScriptRequest(BaseModel):
@@ -992,13 +1691,15 @@ Original Script:
 {req.script}
 """
 
-    response = client.responses.create(model="gpt-4.1", input=prompt)
-    cleaned = response.output_text.strip()
+    cleaned = (await llm_gateway.respond(
+        prompt, model="gpt-4.1", endpoint="auto_improve_lesson")).strip()
 
-    # Ensure valid JSON
+    # Ensure valid JSON (plain text answers are taken as the script itself)
     try:
-        data = json.loads(cleaned)
-    except json.JSONDecodeError:
+        data = structured_output.extract_json(cleaned)
+    except structured_output.StructuredOutputError:
+        data = None
+    if structured_output.validate(data, IMPROVED_SCRIPT_SCHEMA):
         data = {"improved_script": cleaned}
 
     out_dir = f"generated/coach/{req.lesson_id}"
@@ -1057,13 +1758,14 @@ Script:
 {script}
 """
 
-    response = client.responses.create(model="gpt-4.1", input=prompt)
-    raw = response.output_text.strip()
+    raw = (await llm_gateway.respond(
+        prompt, model="gpt-4.1", endpoint="generate_slides")).strip()
 
-    try:
-        data = json.loads(raw)
-    except json.JSONDecodeError:
-        data = {"slides": []}
+    data, problems = await structured_output.parse(
+        raw, SLIDES_SCHEMA, prompt=prompt,
+        call=_repair_via_responses("generate_slides"), label=f"slides {lesson_id}")
+    if problems:
+        data = {"slides": [s for s in data.get("slides") or [] if isinstance(s, dict)]}
 
     output_dir = f"generated/slides/{lesson_id}"
     os.makedirs(output_dir, exist_ok=True)
@@ -1076,34 +1778,8 @@ Script:
 
 
 # ---------------------------------------------------------
-# --- Render Slides (PNG creation)
+# --- Render Slides (PNG creation, see slides.py)
 # ---------------------------------------------------------
-def generate_slide_png(slide, out_path):
-    """Render a single slide (title + bullet points) into PNG."""
-    W, H = 1600, 900
-    img = Image.new("RGB", (W, H), "white")
-    draw = ImageDraw.Draw(img)
-
-    try:
-        title_font = ImageFont.truetype("arial.ttf", 60)
-        text_font = ImageFont.truetype("arial.ttf", 42)
-    except:
-        title_font = ImageFont.load_default()
-        text_font = ImageFont.load_default()
-
-    # Draw title
-    draw.text((80, 80), slide.get("SlideTitle", ""),
-              fill="black", font=title_font)
-
-    # Draw bullet points
-    y = 200
-    for bullet in slide.get("KeyPoints", []):
-        draw.text((120, y), f"• {bullet}", fill="black", font=text_font)
-        y += 70
-
-    img.save(out_path)
-
-
 @app.post("/api/render-slides/{lesson_id}")
 async def render_slides(lesson_id: str):
     """
@@ -1117,33 +1793,20 @@ async def render_slides(lesson_id: str):
         data = json.load(f)
 
     out_dir = f"generated/slides/{lesson_id}/png"
-    os.makedirs(out_dir, exist_ok=True)
-
-    for i, slide in enumerate(data.get("slides", [])):
-        out_path = os.path.join(out_dir, f"slide-{i+1}.png")
-        generate_slide_png(slide, out_path)
+    # only new/changed slides are rendered (content hashes in png/manifest.json)
+    rendered = await render_deck(data.get("slides", []), out_dir)
 
-    return {"status": "ok", "count": len(data.get("slides", []))}
+    return {"status": "ok", "count": len(rendered["files"]), "rendered": rendered["rendered"]}
 
 
 # ---------------------------------------------------------
 # --- Full Auto Pipeline: Improve + Generate + Render
 # ---------------------------------------------------------
-@app.post("/api/full-pipeline/{lesson_id}")
-async def full_pipeline(lesson_id: str, payload: dict):
+async def _run_slide_pipeline(lesson_id: str, raw_script: str) -> list:
     """
-    Executes:
-      1) Auto-improves script
-      2) Generates structured slides
-      3) Renders slides to PNGs
-    Returns a list of generated PNG URLs.
+    Improve script -> structured slides -> PNGs for one lesson.
+    Returns the signed slide URLs. Shared by /api/full-pipeline and course-slides jobs.
     """
-    raw_script = payload.get("script", "")
-    title = payload.get("title", "")
-
-    if not raw_script:
-        return {"error": "No script provided"}
-
     # --- Step 1: Improve Script
     improve_prompt = f"""
 You are a world-class coaching content creator.
@@ -1155,10 +1818,13 @@ Return JSON:
 Original:
 {raw_script}
 """
-    improved_response = client.responses.create(
-        model="gpt-4.1", input=improve_prompt)
-    improved_json = json.loads(improved_response.output_text)
-    improved_script = improved_json["improved_script"]
+    improved_output = await llm_gateway.respond(
+        improve_prompt, model="gpt-4.1", endpoint="full_pipeline")
+    improved_json, problems = await structured_output.parse(
+        improved_output, IMPROVED_SCRIPT_SCHEMA, prompt=improve_prompt,
+        call=_repair_via_responses("full_pipeline"), label=f"improve {lesson_id}")
+    # kein JSON? dann ist die Antwort selbst das verbesserte Skript
+    improved_script = improved_json.get("improved_script") if not problems else improved_output.strip()
 
     # --- Step 2: Generate Slides
     slide_prompt = f"""
@@ -1179,9 +1845,13 @@ Format:
 Improved Script:
 {improved_script}
 """
-    slide_response = client.responses.create(
-        model="gpt-4.1", input=slide_prompt)
-    slide_json = json.loads(slide_response.output_text)
+    slide_output = await llm_gateway.respond(
+        slide_prompt, model="gpt-4.1", endpoint="full_pipeline")
+    slide_json, problems = await structured_output.parse(
+        slide_output, SLIDES_SCHEMA, prompt=slide_prompt,
+        call=_repair_via_responses("full_pipeline"), label=f"slides {lesson_id}")
+    if problems:
+        raise ValueError(f"slides JSON incomplete: {problems}")
 
     json_dir = f"generated/slides/{lesson_id}"
     os.makedirs(json_dir, exist_ok=True)
@@ -1190,15 +1860,29 @@ Improved Script:
 
     # --- Step 3: Render PNGs
     png_dir = f"generated/slides/{lesson_id}/png"
-    os.makedirs(png_dir, exist_ok=True)
-    for i, slide in enumerate(slide_json["slides"]):
-        out = os.path.join(png_dir, f"slide-{i+1}.png")
-        generate_slide_png(slide, out)
-
-    result_urls = [
-        f"/api/slide-file/{lesson_id}/slide-{i+1}.png"
-        for i in range(len(slide_json["slides"]))
-    ]
+    rendered = await render_deck(slide_json["slides"], png_dir)
+
+    result_urls = _signed_slide_urls(lesson_id, rendered["files"])
+
+    return result_urls
+
+
+@app.post("/api/full-pipeline/{lesson_id}")
+async def full_pipeline(lesson_id: str, payload: dict):
+    """
+    Executes:
+      1) Auto-improves script
+      2) Generates structured slides
+      3) Renders slides to PNGs
+    Returns a list of generated PNG URLs.
+    """
+    raw_script = payload.get("script", "")
+
+    if not raw_script:
+        return {"error": "No script provided"}
+
+    with llm_scheduler.lane(llm_scheduler.BATCH):
+        result_urls = await _run_slide_pipeline(lesson_id, raw_script)
 
     return {
         "status": "ok",
@@ -1208,6 +1892,103 @@ Improved Script:
     }
 
 
+# ---------------------------------------------------------
+# --- Course-wide slide pipeline (background job)
+# ---------------------------------------------------------
+# Lektionen, deren Slide-Pipeline gleichzeitig läuft (je 2 GPT-4.1-Aufrufe + Rendering)
+SLIDE_PIPELINE_CONCURRENCY = max(1, int(os.environ.get("SLIDE_PIPELINE_CONCURRENCY", "6")))
+
+
+def _lesson_script(lesson: dict) -> str:
+    """All video scripts of a lesson entry from course.json, inline or from their files."""
+    parts = []
+    for video in lesson.get("videos") or []:
+        text = video.get("script_content")
+        if not text and video.get("script_file"):
+            try:
+                text = Path(video["script_file"]).read_text(encoding="utf-8")
+            except OSError:
+                text = ""
+        if text:
+            parts.append(f"## {video.get('title', '')}\n{text}")
+    return "\n\n".join(parts)
+
+
+async def _run_course_slides(slides_job_id: str, course_job_id: str, lessons: list):
+    llm_scheduler.set_lane(llm_scheduler.BATCH)
+    await JOBS.update(slides_job_id, status="running")
+    await EVENTS.publish(slides_job_id, "job_started", lessons=len(lessons))
+    semaphore = asyncio.Semaphore(SLIDE_PIPELINE_CONCURRENCY)
+
+    async def _lesson(li: int, lesson: dict) -> dict:
+        lesson_id = f"{course_job_id}_l{li}"
+        entry = {
+            "lesson": li,
+            "lesson_title": lesson.get("lesson_title"),
+            "lesson_id": lesson_id,
+            # signed URLs expire; this endpoint hands out fresh ones
+            "slides_url": f"/api/slides-signed-urls/{lesson_id}",
+            "slides": [],
+        }
+        script = _lesson_script(lesson)
+        if not script:
+            entry["error"] = "no script"
+            await EVENTS.publish(slides_job_id, "lesson_failed", lesson=li, error="no script")
+            return entry
+        async with semaphore:
+            await EVENTS.publish(slides_job_id, "lesson_started", lesson=li, title=entry["lesson_title"])
+            try:
+                entry["slides"] = await _run_slide_pipeline(lesson_id, script)
+                await EVENTS.publish(slides_job_id, "lesson_finished", lesson=li,
+                               title=entry["lesson_title"], slides=len(entry["slides"]))
+            except Exception as e:
+                print(f"  ⚠️ Slide pipeline failed for lesson {li}: {e}")
+                entry["error"] = str(e)
+                await EVENTS.publish(slides_job_id, "lesson_failed", lesson=li, error=str(e))
+        return entry
+
+    try:
+        started = time.perf_counter()
+        entries = await asyncio.gather(*[
+            _lesson(li, lesson) for li, lesson in enumerate(lessons, start=1)
+        ])
+        result = {"course_job_id": course_job_id, "lessons": entries}
+        await JOBS.update(slides_job_id, status="done", result=result)
+        failed = sum(1 for e in entries if e.get("error"))
+        print(f"✅ Slides for course {course_job_id}: {len(entries) - failed}/{len(entries)} lessons "
+              f"in {time.perf_counter() - started:.1f}s")
+        await EVENTS.publish(slides_job_id, "done", lessons=len(entries), failed=failed)
+    except Exception as e:
+        await JOBS.update(slides_job_id, status="error", error=str(e))
+        print(f"💥 Slide job {slides_job_id} failed: {e}")
+        await EVENTS.publish(slides_job_id, "error", error=str(e))
+
+
+@app.post("/api/course-slides/{job_id}")
+async def course_slides(job_id: str):
+    """
+    Startet improve -> slides -> render für alle Lektionen eines fertigen
+    generate-full-course Jobs als eigenen Hintergrundjob.
+    Fortschritt über /api/job-events/{jobId}, Ergebnis über /api/job-status/{jobId}.
+    """
+    job = await JOBS.get(job_id)
+    if not job:
+        return JSONResponse(status_code=404, content={"error": "job not found"})
+    if job.get("status") != "done" or not job.get("result"):
+        return JSONResponse(status_code=409, content={"error": "course generation not finished"})
+
+    lessons = job["result"].get("lessons") or []
+    slides_job_id = str(uuid.uuid4())
+    await JOBS.create(slides_job_id, status="queued",
+                     preview={"kind": "course_slides", "course_job_id": job_id})
+    await EVENTS.publish(slides_job_id, "queued")
+    print(f"🚀 course-slides for job {job_id}: {len(lessons)} lessons -> job {slides_job_id}")
+
+    _start_job(slides_job_id, "course_slides", {"course_job_id": job_id, "lessons": lessons})
+
+    return {"jobId": slides_job_id, "status": "queued", "lessons": len(lessons)}
+
+
 @app.get("/api/slides-signed-urls/{lesson_id}")
 async def slides_signed_urls(lesson_id: str):
     """
@@ -1218,14 +1999,60 @@ async def slides_signed_urls(lesson_id: str):
     if not os.path.exists(png_dir):
         return {"slides": []}
 
-    files = sorted([f for f in os.listdir(png_dir) if f.endswith(".png")])
+    files = slide_files(png_dir)
 
     slides = [
         {
             "filename": fname,
-            "url": f"/api/slide-file/{lesson_id}/{fname}"
+            "url": url
         }
-        for fname in files
+        for fname, url in zip(files, _signed_slide_urls(lesson_id, files))
     ]
 
     return {"slides": slides}
+
+
+# ---------------------------------------------------------
+# --- Signed slide files (CDN-cacheable until expiry)
+# ---------------------------------------------------------
+SLIDES_DIR = GENERATED_DIR / "slides"
+
+
+def _signed_slide_urls(lesson_id: str, files: list) -> list:
+    """
+    Signed /api/slide-file URLs. The slide's content hash (png/manifest.json) is part
+    of the URL, so a re-rendered slide gets a new URL instead of a stale CDN copy.
+    """
+    versions = load_manifest(SLIDES_DIR / lesson_id / "png")["slides"]
+    return [
+        signing.signed_url(f"/api/slide-file/{lesson_id}/{fname}", versions.get(fname, ""))
+        for fname in files
+    ]
+
+
+@app.get("/api/slide-file/{lesson_id}/{fname}")
+async def slide_file(lesson_id: str, fname: str, request: Request,
+                     expires: str = "", sig: str = "", v: str = ""):
+    expires_at = signing.verify(f"/api/slide-file/{lesson_id}/{fname}", v, expires, sig)
+    if expires_at is None:
+        return JSONResponse(status_code=403, content={"error": "invalid or expired signature"})
+    if not fname.endswith(".png"):
+        return JSONResponse(status_code=404, content={"error": "not found"})
+
+    # shared caches may keep the response exactly until the URL expires
+    max_age = max(0, expires_at - int(time.time()))
+    return static_delivery.serve_file(
+        request, SLIDES_DIR, f"{lesson_id}/png/{fname}",
+        cache_control=f"public, max-age={max_age}, s-maxage={max_age}")
+
+
+# Generated artifacts last: routes match in registration order, and this
+# catch-all would otherwise shadow /generated/{job_id}.zip.
+@app.api_route("/generated/{file_path:path}", methods=["GET", "HEAD"])
+async def serve_generated(file_path: str, request: Request):
+    """Videos, logos, banners, course files: validators, ranges, precompressed variants."""
+    parts = [p for p in file_path.replace("\\", "/").split("/") if p]
+    if parts and parts[0] == SLIDES_DIR.name:
+        # Slide-PNGs nur über signierte /api/slide-file URLs
+        return JSONResponse(status_code=404, content={"error": "not found"})
+    return static_delivery.serve_file(request, GENERATED_DIR, file_path)
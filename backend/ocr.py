@@ -0,0 +1,130 @@
+"""
+OCR for uploaded images (screenshots, photos, scans).
+
+Images are prepared once (grayscale, downscale, dark-mode inversion, Otsu
+binarization) and very tall images are cut into tiles at blank rows. Every tile
+is a separate Tesseract job in the shared process pool, with a per-tile timeout
+enforced by Tesseract itself and an overall per-image timeout.
+
+The Tesseract binary comes from TESSERACT_CMD, else from PATH.
+"""
+import asyncio
+import io
+import os
+import shutil
+
+import pytesseract
+from PIL import Image, ImageOps
+
+from .process_pool import run_in_process
+
+TESSERACT_CMD = os.environ.get("TESSERACT_CMD") or shutil.which("tesseract")
+if TESSERACT_CMD:
+    pytesseract.pytesseract.tesseract_cmd = TESSERACT_CMD
+
+OCR_LANG = os.environ.get("OCR_LANG", "eng")
+OCR_MAX_WIDTH = int(os.environ.get("OCR_MAX_WIDTH", "2000"))
+OCR_TILE_HEIGHT = int(os.environ.get("OCR_TILE_HEIGHT", "1600"))
+OCR_TILE_TIMEOUT = float(os.environ.get("OCR_TILE_TIMEOUT", "30"))
+OCR_IMAGE_TIMEOUT = float(os.environ.get("OCR_IMAGE_TIMEOUT", "90"))
+
+# how far (px) around a tile boundary to look for a blank row to cut at
+_CUT_SEARCH = 120
+
+
+class OCRError(RuntimeError):
+    pass
+
+
+def _otsu_threshold(histogram: list) -> int:
+    total = sum(histogram)
+    sum_all = sum(i * h for i, h in enumerate(histogram))
+    sum_bg, weight_bg = 0.0, 0
+    best, threshold = 0.0, 128
+    for i, h in enumerate(histogram):
+        weight_bg += h
+        if weight_bg == 0:
+            continue
+        weight_fg = total - weight_bg
+        if weight_fg == 0:
+            break
+        sum_bg += i * h
+        mean_bg = sum_bg / weight_bg
+        mean_fg = (sum_all - sum_bg) / weight_fg
+        between = weight_bg * weight_fg * (mean_bg - mean_fg) ** 2
+        if between > best:
+            best, threshold = between, i
+    return threshold
+
+
+def preprocess(image: Image.Image) -> Image.Image:
+    """Grayscale, downscale to OCR_MAX_WIDTH, dark text on light background, binarize."""
+    image = ImageOps.exif_transpose(image).convert("L")
+    if image.width > OCR_MAX_WIDTH:
+        height = round(image.height * OCR_MAX_WIDTH / image.width)
+        image = image.resize((OCR_MAX_WIDTH, height), Image.LANCZOS)
+
+    histogram = image.histogram()
+    mean = sum(i * h for i, h in enumerate(histogram)) / max(1, sum(histogram))
+    if mean < 128:
+        # dark-mode screenshot: Tesseract expects dark text on a light background
+        image = ImageOps.invert(image)
+        histogram = histogram[::-1]
+
+    threshold = _otsu_threshold(histogram)
+    return image.point(lambda p: 255 if p > threshold else 0)
+
+
+def _ink(image: Image.Image, y: int) -> int:
+    """Number of black pixels in row y."""
+    return image.crop((0, y, image.width, y + 1)).histogram()[0]
+
+
+def split_tiles(image: Image.Image) -> list:
+    """Cuts tall images into tiles of about OCR_TILE_HEIGHT, preferring blank rows as cuts."""
+    tiles, top = [], 0
+    # the last tile may be up to 25% taller instead of leaving a thin strip
+    while image.height - top > OCR_TILE_HEIGHT + OCR_TILE_HEIGHT // 4:
+        target = top + OCR_TILE_HEIGHT
+        lo = max(top + OCR_TILE_HEIGHT // 2, target - _CUT_SEARCH)
+        hi = min(image.height - 1, target + _CUT_SEARCH)
+        cut = min(range(lo, hi), key=lambda y: (_ink(image, y), abs(y - target)))
+        tiles.append(image.crop((0, top, image.width, cut)))
+        top = cut
+    tiles.append(image.crop((0, top, image.width, image.height)))
+    return tiles
+
+
+def prepare_tiles(content: bytes) -> list:
+    """Pool entry point: decode + preprocess + tile; returns [(size, raw bytes), ...]."""
+    try:
+        image = preprocess(Image.open(io.BytesIO(content)))
+        return [(tile.size, tile.tobytes()) for tile in split_tiles(image)]
+    except Exception as e:
+        raise OCRError(f"{type(e).__name__}: {e}") from None
+
+
+def ocr_tile(size: tuple, data: bytes, lang: str, timeout: float) -> str:
+    """Pool entry point: runs Tesseract on one prepared tile."""
+    try:
+        tile = Image.frombytes("L", size, data)
+        return pytesseract.image_to_string(tile, lang=lang, timeout=timeout)
+    except Exception as e:
+        raise OCRError(f"{type(e).__name__}: {e}") from None
+
+
+async def _ocr(content: bytes) -> str:
+    tiles = await run_in_process(prepare_tiles, content)
+    texts = await asyncio.gather(*[
+        run_in_process(ocr_tile, size, data, OCR_LANG, OCR_TILE_TIMEOUT)
+        for size, data in tiles
+    ])
+    return "\n".join(t.strip("\n") for t in texts if t.strip())
+
+
+async def ocr_image(content: bytes) -> str:
+    """OCR of one uploaded image; raises OCRError on failure or after OCR_IMAGE_TIMEOUT."""
+    try:
+        return await asyncio.wait_for(_ocr(content), OCR_IMAGE_TIMEOUT)
+    except asyncio.TimeoutError:
+        raise OCRError(f"OCR timed out after {OCR_IMAGE_TIMEOUT:.0f}s") from None
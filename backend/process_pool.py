@@ -0,0 +1,49 @@
+"""
+Shared process pool for CPU-heavy work (PDF parsing, OCR, slide rendering).
+
+Work submitted through run_in_process() runs outside the event loop and across
+all cores. The pool uses the "spawn" start method, so children never inherit
+the parent's threads, sockets or SQLite handles; submitted callables must be
+module-level functions.
+"""
+import asyncio
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Optional
+
+PROCESS_POOL_WORKERS = int(os.environ.get(
+    "PROCESS_POOL_WORKERS", str(os.cpu_count() or 2)))
+
+_pool: Optional[ProcessPoolExecutor] = None
+
+
+def get_process_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(
+            max_workers=PROCESS_POOL_WORKERS,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+    return _pool
+
+
+async def run_in_process(fn, *args):
+    global _pool
+    loop = asyncio.get_running_loop()
+    pool = get_process_pool()
+    try:
+        return await loop.run_in_executor(pool, fn, *args)
+    except BrokenProcessPool:
+        # a worker died (crash, OOM kill); start a fresh pool for the next call
+        if _pool is pool:
+            _pool = None
+        raise
+
+
+def shutdown():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
@@ -0,0 +1,72 @@
+"""
+Per-job retrieval over the uploaded course materials.
+
+The materials of a job (free text from the wizard plus the extracted text of
+uploaded files) are chunked into passages and indexed once with BM25
+(text_rank.BM25Index). The index is stored as <job folder>/.retrieval.json
+(dotfiles are neither served nor zipped), so lesson prompts can pull just the
+top-k passages for their title instead of the whole corpus.
+"""
+import json
+import os
+from pathlib import Path
+from typing import Optional
+
+from . import text_rank
+
+RETRIEVAL_TOP_K = int(os.environ.get("RETRIEVAL_TOP_K", "4"))
+# Token-Budget pro Lektion für eingefügte Passagen
+RETRIEVAL_TOKEN_BUDGET = int(os.environ.get("RETRIEVAL_TOKEN_BUDGET", "400"))
+PASSAGE_CHARS = 600
+INDEX_FILENAME = ".retrieval.json"
+
+
+class MaterialIndex:
+    def __init__(self, passages: list, index: text_rank.BM25Index):
+        self.passages = passages  # [{"source", "text"}]
+        self.index = index
+
+    @classmethod
+    def build(cls, documents: list) -> "MaterialIndex":
+        """documents: [{"filename", "content"}]"""
+        passages = [
+            {"source": doc.get("filename") or "materials", "text": text}
+            for doc in documents
+            for text in text_rank.chunk_text(doc.get("content") or "", PASSAGE_CHARS)
+        ]
+        index = text_rank.BM25Index([text_rank.tokenize(p["text"]) for p in passages])
+        return cls(passages, index)
+
+    def __len__(self):
+        return len(self.passages)
+
+    def search(self, query: str, k: int = RETRIEVAL_TOP_K,
+               budget_tokens: int = RETRIEVAL_TOKEN_BUDGET) -> list:
+        """Best passages for `query`, at most k and within budget_tokens."""
+        results, used = [], 0
+        for i, score in self.index.top_k(text_rank.tokenize(query), k):
+            cost = text_rank.estimate_tokens(self.passages[i]["text"])
+            if used + cost > budget_tokens:
+                continue
+            results.append({**self.passages[i], "score": round(score, 3)})
+            used += cost
+        return results
+
+    def save(self, job_folder: Path):
+        path = Path(job_folder) / INDEX_FILENAME
+        tmp = path.with_name(path.name + ".tmp")
+        tmp.write_text(json.dumps(
+            {"passages": self.passages, "index": self.index.to_dict()}, ensure_ascii=False), encoding="utf-8")
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, job_folder: Path) -> Optional["MaterialIndex"]:
+        try:
+            data = json.loads((Path(job_folder) / INDEX_FILENAME).read_text(encoding="utf-8"))
+        except (FileNotFoundError, ValueError):
+            return None
+        return cls(data["passages"], text_rank.BM25Index.from_dict(data["index"]))
+
+
+def format_passages(passages: list) -> str:
+    return "\n\n".join(f"[{p['source']}] {p['text']}" for p in passages)
@@ -0,0 +1,56 @@
+"""
+HMAC-signed, expiring URLs (slide files).
+
+A URL is signed over its path, an optional content version and the expiry time.
+Expiry times are rounded up to SIGNED_URL_BUCKET seconds, so every viewer within
+one bucket gets the identical URL and a shared CDN can cache the response until
+it expires. Verification is one HMAC-SHA256 plus hmac.compare_digest.
+"""
+import base64
+import hashlib
+import hmac
+import os
+import time
+from typing import Optional
+
+SIGNED_TOKEN_SECRET = os.environ.get(
+    "SIGNED_TOKEN_SECRET", "replace_me_with_strong_secret")
+SIGNED_URL_TTL = int(os.environ.get("SIGNED_URL_TTL_SECONDS", "3600"))
+SIGNED_URL_BUCKET = int(os.environ.get("SIGNED_URL_BUCKET_SECONDS", "900"))
+
+if SIGNED_TOKEN_SECRET == "replace_me_with_strong_secret":
+    print("⚠️ SIGNED_TOKEN_SECRET is not set - signed URLs use the insecure default secret")
+
+_KEY = SIGNED_TOKEN_SECRET.encode("utf-8")
+
+
+def _signature(path: str, version: str, expires: int) -> str:
+    mac = hmac.new(_KEY, f"{path}\n{version}\n{expires}".encode("utf-8"), hashlib.sha256)
+    return base64.urlsafe_b64encode(mac.digest()).rstrip(b"=").decode("ascii")
+
+
+def expiry(now: Optional[float] = None, ttl: int = SIGNED_URL_TTL) -> int:
+    """now + ttl, rounded up to the next bucket boundary."""
+    t = int((now or time.time()) + ttl)
+    return -(-t // SIGNED_URL_BUCKET) * SIGNED_URL_BUCKET
+
+
+def signed_url(path: str, version: str = "", now: Optional[float] = None) -> str:
+    expires = expiry(now)
+    query = f"v={version}&" if version else ""
+    return f"{path}?{query}expires={expires}&sig={_signature(path, version, expires)}"
+
+
+def verify(path: str, version: str, expires: str, sig: str, now: Optional[float] = None) -> Optional[int]:
+    """Returns the expiry time if the signature is valid and not expired, else None."""
+    try:
+        expires_at = int(expires)
+    except (TypeError, ValueError):
+        return None
+    if expires_at <= (now or time.time()):
+        return None
+    # als Bytes vergleichen: compare_digest(str, str) wirft TypeError bei Nicht-ASCII
+    expected = _signature(path, version or "", expires_at).encode("ascii")
+    if not hmac.compare_digest(expected, (sig or "").encode("utf-8")):
+        return None
+    return expires_at
@@ -0,0 +1,214 @@
+"""
+Slide rendering engine (slides.json -> PNGs).
+
+- Fonts are loaded once per process (lru_cache); SLIDE_FONT / SLIDE_FONT_BOLD
+  override the candidates below.
+- Titles and bullets are measured with font.getlength and wrapped to the slide
+  width; decks that overflow are re-laid out with smaller text.
+- Every slide has a content hash; png/manifest.json remembers the hash each PNG
+  was rendered from, so only new or changed slides are rendered again.
+- Changed slides are rendered in batches in the shared process pool.
+"""
+import asyncio
+import hashlib
+import json
+import os
+from functools import lru_cache
+from pathlib import Path
+
+from PIL import Image, ImageDraw, ImageFont
+
+from .process_pool import PROCESS_POOL_WORKERS, run_in_process
+
+# bump when the layout changes, so every slide renders again
+RENDERER_VERSION = "2"
+
+SLIDE_W, SLIDE_H = 1600, 900
+MARGIN_X, MARGIN_TOP, MARGIN_BOTTOM = 80, 80, 70
+BULLET_INDENT = 40
+TITLE_SIZE = 60
+# bullet text sizes, tried in order until the slide fits
+TEXT_SIZES = (42, 36, 30, 26)
+
+FONT_CANDIDATES = [
+    "arial.ttf",
+    "DejaVuSans.ttf",
+    "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf",
+    "/usr/share/fonts/truetype/liberation/LiberationSans-Regular.ttf",
+    "/Library/Fonts/Arial.ttf",
+]
+BOLD_FONT_CANDIDATES = [
+    "arialbd.ttf",
+    "DejaVuSans-Bold.ttf",
+    "/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf",
+    "/usr/share/fonts/truetype/liberation/LiberationSans-Bold.ttf",
+    "/Library/Fonts/Arial Bold.ttf",
+]
+
+MANIFEST_NAME = "manifest.json"
+
+
+@lru_cache(maxsize=32)
+def get_font(size: int, bold: bool = False):
+    env = os.environ.get("SLIDE_FONT_BOLD" if bold else "SLIDE_FONT")
+    candidates = ([env] if env else []) + (BOLD_FONT_CANDIDATES if bold else FONT_CANDIDATES)
+    for candidate in candidates:
+        try:
+            return ImageFont.truetype(candidate, size)
+        except OSError:
+            continue
+    return ImageFont.load_default(size=size)
+
+
+def wrap_text(text: str, font, max_width: float) -> list:
+    """Greedy word wrap by measured width; words wider than a line are split."""
+    lines = []
+    for paragraph in str(text).splitlines() or [""]:
+        line = ""
+        for word in paragraph.split():
+            candidate = f"{line} {word}" if line else word
+            if font.getlength(candidate) <= max_width:
+                line = candidate
+                continue
+            if line:
+                lines.append(line)
+            while font.getlength(word) > max_width:
+                cut = len(word)
+                while cut > 1 and font.getlength(word[:cut]) > max_width:
+                    cut -= 1
+                lines.append(word[:cut])
+                word = word[cut:]
+            line = word
+        lines.append(line)
+    return lines
+
+
+def _line_height(font) -> int:
+    ascent, descent = font.getmetrics()
+    return ascent + descent
+
+
+def layout_slide(slide: dict) -> dict:
+    """Positions of all text lines: {"title": [(x, y, text)], "bullets": [...], "text_size": n}."""
+    title_font = get_font(TITLE_SIZE, bold=True)
+    title_lines = wrap_text(slide.get("SlideTitle", ""), title_font, SLIDE_W - 2 * MARGIN_X)
+    title_lh = _line_height(title_font)
+    title = [(MARGIN_X, MARGIN_TOP + i * title_lh, t) for i, t in enumerate(title_lines)]
+    top = MARGIN_TOP + len(title_lines) * title_lh + 50
+
+    bullets_x = MARGIN_X + BULLET_INDENT
+    for size in TEXT_SIZES:
+        font = get_font(size)
+        lh = int(_line_height(font) * 1.15)
+        bullet_w = font.getlength("• ")
+        y, bullets = top, []
+        for point in slide.get("KeyPoints", []) or []:
+            for i, text in enumerate(wrap_text(point, font, SLIDE_W - bullets_x - MARGIN_X - bullet_w)):
+                if i == 0:
+                    bullets.append((bullets_x, y, f"• {text}"))
+                else:
+                    # hanging indent under the bullet text
+                    bullets.append((bullets_x + bullet_w, y, text))
+                y += lh
+            y += lh // 3
+        if y <= SLIDE_H - MARGIN_BOTTOM:
+            break
+    return {"title": title, "bullets": bullets, "text_size": size}
+
+
+def render_slide(slide: dict, out_path: str):
+    """Renders one slide (title + bullet points) into a PNG (atomic write)."""
+    layout = layout_slide(slide)
+    img = Image.new("RGB", (SLIDE_W, SLIDE_H), "white")
+    draw = ImageDraw.Draw(img)
+
+    title_font = get_font(TITLE_SIZE, bold=True)
+    for x, y, text in layout["title"]:
+        draw.text((x, y), text, fill="black", font=title_font)
+    text_font = get_font(layout["text_size"])
+    for x, y, text in layout["bullets"]:
+        if y > SLIDE_H - MARGIN_BOTTOM:
+            break
+        draw.text((x, y), text, fill="black", font=text_font)
+
+    tmp = f"{out_path}.tmp"
+    img.save(tmp, format="PNG")
+    os.replace(tmp, out_path)
+
+
+def render_batch(jobs: list) -> int:
+    """Pool entry point: [(slide, out_path), ...]; returns the number of slides rendered."""
+    for slide, out_path in jobs:
+        render_slide(slide, out_path)
+    return len(jobs)
+
+
+def slide_hash(slide: dict) -> str:
+    raw = json.dumps(slide, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(f"{RENDERER_VERSION}:{raw}".encode("utf-8")).hexdigest()[:16]
+
+
+def slide_filename(index: int) -> str:
+    return f"slide-{index + 1}.png"
+
+
+def load_manifest(png_dir: Path) -> dict:
+    try:
+        manifest = json.loads((Path(png_dir) / MANIFEST_NAME).read_text(encoding="utf-8"))
+        return manifest if isinstance(manifest.get("slides"), dict) else {"slides": {}}
+    except (FileNotFoundError, ValueError):
+        return {"slides": {}}
+
+
+def _write_manifest(png_dir: Path, manifest: dict):
+    path = Path(png_dir) / MANIFEST_NAME
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_text(json.dumps(manifest, indent=2), encoding="utf-8")
+    os.replace(tmp, path)
+
+
+def slide_files(png_dir: Path) -> list:
+    """PNG file names of a rendered deck in slide order (manifest order, else numeric)."""
+    png_dir = Path(png_dir)
+    names = [n for n in load_manifest(png_dir)["slides"] if (png_dir / n).exists()]
+    if names:
+        return names
+    if not png_dir.exists():
+        return []
+
+    def _number(name):
+        digits = "".join(ch for ch in name if ch.isdigit())
+        return int(digits) if digits else 0
+    return sorted((p.name for p in png_dir.glob("*.png")), key=_number)
+
+
+async def render_deck(slides: list, png_dir) -> dict:
+    """
+    Renders `slides` into png_dir/slide-N.png, skipping slides whose PNG is already
+    rendered from the same content. Returns {"files", "rendered", "skipped"}.
+    """
+    png_dir = Path(png_dir)
+    png_dir.mkdir(parents=True, exist_ok=True)
+    previous = load_manifest(png_dir)["slides"]
+
+    hashes, jobs = {}, []
+    for i, slide in enumerate(slides):
+        name = slide_filename(i)
+        hashes[name] = slide_hash(slide)
+        if previous.get(name) != hashes[name] or not (png_dir / name).exists():
+            jobs.append((slide, str(png_dir / name)))
+
+    if jobs:
+        batches = min(PROCESS_POOL_WORKERS, len(jobs))
+        await asyncio.gather(*[
+            run_in_process(render_batch, jobs[b::batches]) for b in range(batches)
+        ])
+
+    # slides removed from the deck
+    for name in previous:
+        if name not in hashes:
+            (png_dir / name).unlink(missing_ok=True)
+    _write_manifest(png_dir, {"renderer": RENDERER_VERSION, "slides": hashes})
+
+    print(f"🖼️ Slides in {png_dir}: {len(jobs)} rendered, {len(slides) - len(jobs)} unchanged")
+    return {"files": list(hashes), "rendered": len(jobs), "skipped": len(slides) - len(jobs)}
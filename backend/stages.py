@@ -0,0 +1,73 @@
+"""
+Minimal dependency-aware stage runner for generation jobs.
+
+A job is a list of Stage(name, run, deps). Every stage starts as soon as all of its
+dependencies have finished, so independent stages (lesson content, logo, banner)
+run concurrently and the job takes as long as its critical path. `run` receives
+a dict with the results of its dependencies.
+"""
+import asyncio
+import time
+from typing import Awaitable, Callable, Iterable
+
+
+class Stage:
+    def __init__(self, name: str, run: Callable[[dict], Awaitable], deps: Iterable[str] = ()):
+        self.name = name
+        self.run = run
+        self.deps = tuple(deps)
+
+
+async def run_stages(stages: list, label: str = "job") -> dict:
+    """
+    Runs all stages and returns {stage name: result}. If a stage raises, its
+    dependents fail with the same error, independent stages still finish, and
+    the first error is re-raised at the end.
+    """
+    by_name = {s.name: s for s in stages}
+    if len(by_name) != len(stages):
+        raise ValueError("duplicate stage names")
+    for s in stages:
+        missing = [d for d in s.deps if d not in by_name]
+        if missing:
+            raise ValueError(f"stage {s.name} depends on unknown stages {missing}")
+
+    # topological order, so each task can look up its dependencies' tasks
+    order, visiting, done = [], set(), set()
+
+    def _visit(name):
+        if name in done:
+            return
+        if name in visiting:
+            raise ValueError(f"dependency cycle at stage {name}")
+        visiting.add(name)
+        for dep in by_name[name].deps:
+            _visit(dep)
+        visiting.discard(name)
+        done.add(name)
+        order.append(name)
+
+    for s in stages:
+        _visit(s.name)
+
+    tasks = {}
+
+    async def _run(stage: Stage):
+        dep_results = {}
+        for dep in stage.deps:
+            dep_results[dep] = await tasks[dep]
+        started = time.perf_counter()
+        result = await stage.run(dep_results)
+        print(f"  ⏱️ [{label}] stage '{stage.name}' took {time.perf_counter() - started:.2f}s")
+        return result
+
+    for name in order:
+        tasks[name] = asyncio.create_task(_run(by_name[name]))
+
+    outcomes = await asyncio.gather(*tasks.values(), return_exceptions=True)
+    results = {}
+    for name, outcome in zip(tasks, outcomes):
+        if isinstance(outcome, BaseException):
+            raise outcome
+        results[name] = outcome
+    return results
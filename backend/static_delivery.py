@@ -0,0 +1,154 @@
+"""
+Delivery of generated artifacts under /generated (videos, slide PNGs, logos,
+banners, course JSON/TXT).
+
+- Strong ETag (size + mtime) and Last-Modified; If-None-Match / If-Modified-Since
+  are answered with an empty 304.
+- Byte ranges (video seeking) and the transfer itself are handled by FileResponse,
+  which uses zero-copy "pathsend" when the ASGI server offers it.
+- Content-addressed URLs (?v=<fingerprint> matching the current file, see
+  versioned_url) get `Cache-Control: immutable`; everything else is revalidated
+  (`no-cache`), which a CDN answers with cheap 304s from us.
+- JSON/TXT files are precompressed once when a job is finalized (.gz, plus .br if
+  the brotli package is installed) and served according to Accept-Encoding.
+"""
+import gzip
+import mimetypes
+import os
+from email.utils import formatdate, parsedate_to_datetime
+from pathlib import Path
+from typing import Optional
+
+from fastapi import Request
+from fastapi.responses import FileResponse, Response
+
+from .json_responses import etag_matches
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+REVALIDATE_CACHE_CONTROL = "public, no-cache"
+
+PRECOMPRESS_SUFFIXES = {".json", ".txt", ".md", ".csv", ".html", ".svg"}
+PRECOMPRESS_MIN_BYTES = 1024
+# never served: partial uploads and atomic-write temp files
+HIDDEN_SUFFIXES = {".part", ".tmp"}
+
+
+def fingerprint(st: os.stat_result) -> str:
+    return f"{st.st_size:x}-{st.st_mtime_ns:x}"
+
+
+def versioned_url(url_path: str, file_path: Path) -> str:
+    """`/generated/...` URL with ?v=<fingerprint>, cacheable forever by browsers and CDNs."""
+    try:
+        return f"{url_path}?v={fingerprint(Path(file_path).stat())}"
+    except FileNotFoundError:
+        return url_path
+
+
+def resolve(root: Path, rel_path: str) -> Optional[Path]:
+    """Maps a URL path below `root` to a file, rejecting traversal, dotfiles and temp files."""
+    parts = [p for p in rel_path.replace("\\", "/").split("/") if p]
+    if not parts or any(p.startswith(".") for p in parts):
+        return None
+    path = root.joinpath(*parts)
+    if path.suffix.lower() in HIDDEN_SUFFIXES:
+        return None
+    try:
+        path.resolve().relative_to(root.resolve())
+    except ValueError:
+        return None
+    return path if path.is_file() else None
+
+
+def _not_modified_since(request: Request, st: os.stat_result) -> bool:
+    header = request.headers.get("if-modified-since")
+    if not header or request.headers.get("if-none-match"):
+        return False
+    try:
+        return int(st.st_mtime) <= parsedate_to_datetime(header).timestamp()
+    except (TypeError, ValueError):
+        return False
+
+
+def _precompressed_variant(request: Request, path: Path, st: os.stat_result):
+    """(variant path, stat, encoding) for a fresh .br/.gz sibling the client accepts, else None."""
+    if path.suffix.lower() not in PRECOMPRESS_SUFFIXES or "range" in request.headers:
+        return None
+    accepted = {part.split(";")[0].strip() for part in request.headers.get("accept-encoding", "").lower().split(",")}
+    for encoding, suffix in (("br", ".br"), ("gzip", ".gz")):
+        if encoding not in accepted:
+            continue
+        variant = path.with_name(path.name + suffix)
+        try:
+            vst = variant.stat()
+        except FileNotFoundError:
+            continue
+        if vst.st_mtime_ns >= st.st_mtime_ns:
+            return variant, vst, encoding
+    return None
+
+
+def serve_file(request: Request, root: Path, rel_path: str, cache_control: Optional[str] = None) -> Response:
+    """`cache_control` overrides the immutable/no-cache choice (e.g. for signed URLs)."""
+    path = resolve(root, rel_path)
+    if path is None:
+        return Response(status_code=404)
+    st = path.stat()
+
+    media_type = mimetypes.guess_type(path.name)[0] or "application/octet-stream"
+    variant = _precompressed_variant(request, path, st)
+    # an encoded body is a different representation -> its own ETag
+    etag = f'"{fingerprint(st)}-{variant[2]}"' if variant else f'"{fingerprint(st)}"'
+    immutable = request.query_params.get("v") == fingerprint(st)
+    headers = {
+        "ETag": etag,
+        "Last-Modified": formatdate(st.st_mtime, usegmt=True),
+        "Cache-Control": cache_control or (IMMUTABLE_CACHE_CONTROL if immutable else REVALIDATE_CACHE_CONTROL),
+    }
+    if path.suffix.lower() in PRECOMPRESS_SUFFIXES:
+        headers["Vary"] = "Accept-Encoding"
+
+    if etag_matches(request, etag) or _not_modified_since(request, st):
+        return Response(status_code=304, headers=headers)
+
+    if variant is not None:
+        variant_path, vst, encoding = variant
+        headers["Content-Encoding"] = encoding
+        return FileResponse(variant_path, media_type=media_type, headers=headers, stat_result=vst)
+    return FileResponse(path, media_type=media_type, headers=headers, stat_result=st)
+
+
+# =====================================
+# Precompression (runs once per finished job)
+# =====================================
+
+def _write_atomic(path: Path, data: bytes, mtime_ns: int):
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_bytes(data)
+    os.replace(tmp, path)
+    # same mtime as the source: the variant is fresh exactly as long as the source is unchanged
+    os.utime(path, ns=(mtime_ns, mtime_ns))
+
+
+def precompress_tree(folder: Path) -> int:
+    """Writes .gz (and .br) next to every compressible file in `folder`; returns the number of files."""
+    count = 0
+    for path in Path(folder).rglob("*"):
+        if not path.is_file() or path.suffix.lower() not in PRECOMPRESS_SUFFIXES:
+            continue
+        if any(part.startswith(".") for part in path.relative_to(folder).parts):
+            continue  # never served (e.g. .retrieval.json)
+        st = path.stat()
+        if st.st_size < PRECOMPRESS_MIN_BYTES:
+            continue
+        raw = path.read_bytes()
+        _write_atomic(path.with_name(path.name + ".gz"), gzip.compress(raw, compresslevel=9, mtime=0), st.st_mtime_ns)
+        if brotli is not None:
+            _write_atomic(path.with_name(path.name + ".br"), brotli.compress(raw, quality=11), st.st_mtime_ns)
+        count += 1
+    return count
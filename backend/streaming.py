@@ -0,0 +1,87 @@
+"""
+Server-Sent Events helpers for streamed completions.
+
+LessonStreamParser watches a JSON completion as it streams in and returns every
+object of the top-level "lessons" array (or of a top-level array) as soon as its closing
+brace arrives, so the frontend can render lessons before the completion is done.
+"""
+import json
+
+
+def sse_event(event: str, data, event_id=None) -> str:
+    """Formats one SSE frame; `data` is JSON-encoded."""
+    frame = f"id: {event_id}\n" if event_id is not None else ""
+    return frame + f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+SSE_HEADERS = {
+    "Cache-Control": "no-cache",
+    "X-Accel-Buffering": "no",  # nginx: do not buffer the stream
+}
+
+
+class LessonStreamParser:
+    def __init__(self, key: str = "lessons"):
+        self.key = key
+        self._buf = []          # all characters seen so far
+        self._stack = []        # open containers: "{" or "["
+        self._in_string = False
+        self._escape = False
+        self._string_start = 0
+        self._last_string = None
+        self._pending_key = None
+        self._array_depth = None  # stack depth inside the lessons array
+        self._item_start = None
+
+    def feed(self, chunk: str) -> list:
+        """Consumes a streamed chunk and returns the lesson objects completed by it."""
+        done = []
+        for ch in chunk:
+            pos = len(self._buf)
+            self._buf.append(ch)
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                    self._last_string = "".join(self._buf[self._string_start + 1:pos])
+                continue
+
+            if ch == '"':
+                self._in_string = True
+                self._string_start = pos
+            elif ch == ":":
+                self._pending_key = self._last_string
+            elif ch == ",":
+                self._pending_key = None
+            elif ch == "[":
+                # nur das Array direkt unter dem Top-Level-Key, nicht "lessons" in tieferen Objekten
+                is_target = self._array_depth is None and (
+                    not self._stack or (self._stack == ["{"] and self._pending_key == self.key))
+                self._stack.append("[")
+                if is_target:
+                    self._array_depth = len(self._stack)
+                self._pending_key = None
+            elif ch == "{":
+                if self._array_depth is not None and len(self._stack) == self._array_depth:
+                    self._item_start = pos
+                self._stack.append("{")
+                self._pending_key = None
+            elif ch in "]}":
+                if self._stack:
+                    self._stack.pop()
+                if (ch == "}" and self._item_start is not None
+                        and len(self._stack) == self._array_depth):
+                    raw = "".join(self._buf[self._item_start:pos + 1])
+                    self._item_start = None
+                    try:
+                        done.append(json.loads(raw))
+                    except json.JSONDecodeError:
+                        pass
+                elif ch == "]" and self._array_depth is not None and len(self._stack) < self._array_depth:
+                    # lessons array closed; ignore any later arrays
+                    self._array_depth = -1
+        return done
@@ -0,0 +1,274 @@
+"""
+Tolerant parsing of JSON answers from the model, with targeted repair.
+
+extract_json() accepts what models actually return: ```json fences, prose
+around the object, trailing commas, and answers cut off by max_tokens (open
+strings and containers are closed, a dangling half entry is dropped).
+
+parse() additionally validates the result against a small schema and, if fields
+are missing or invalid, asks the model again for *only those fields* and merges
+them in, instead of discarding the whole completion.
+
+Schema notation: {"key": type | (types,) | {nested schema} | [item schema]};
+a key ending in "?" is optional. Required strings, lists and dicts must be
+non-empty.
+"""
+import json
+import re
+from collections import Counter
+from typing import Awaitable, Callable, Optional
+
+_FENCE = re.compile(r"```[a-zA-Z0-9_-]*\s*\n?(.*?)(?:```|$)", re.DOTALL)
+_MAX_TRUNCATION_STEPS = 64
+
+_stats: Counter = Counter()
+
+
+class StructuredOutputError(ValueError):
+    pass
+
+
+# =====================================
+# Tolerant JSON extraction
+# =====================================
+
+def _scan(text: str):
+    """
+    Walks a JSON candidate. Returns (cleaned text without trailing commas, open
+    container stack, inside-string flag, cut points for dropping a partial tail).
+    """
+    out, stack, cuts = [], [], []
+    in_string = escape = False
+    for ch in text:
+        if in_string:
+            out.append(ch)
+            if escape:
+                escape = False
+            elif ch == "\\":
+                escape = True
+            elif ch == '"':
+                in_string = False
+            continue
+        if ch == '"':
+            in_string = True
+        elif ch in "{[":
+            stack.append("}" if ch == "{" else "]")
+            out.append(ch)
+            cuts.append(len(out))
+            continue
+        elif ch in "}]":
+            # trailing comma before a closer
+            while out and out[-1].isspace():
+                out.pop()
+            if out and out[-1] == ",":
+                out.pop()
+            if stack and stack[-1] == ch:
+                stack.pop()
+            out.append(ch)
+            if not stack:
+                break
+            continue
+        elif ch == ",":
+            cuts.append(len(out))
+        out.append(ch)
+    return "".join(out), stack, in_string, escape, cuts
+
+
+def _close(text: str, stack: list, in_string: bool, escape: bool) -> str:
+    if in_string:
+        if escape:
+            text = text[:-1]
+        text += '"'
+    text = text.rstrip()
+    if text.endswith(","):
+        text = text[:-1]
+    elif text.endswith(":"):
+        text += " null"
+    return text + "".join(reversed(stack))
+
+
+def _candidates(text: str):
+    """Possible JSON bodies: the text itself, fenced blocks, the first {...} / [...]."""
+    text = text.strip()
+    yield text
+    for block in _FENCE.findall(text):
+        yield block.strip()
+    starts = [i for i in (text.find("{"), text.find("[")) if i >= 0]
+    if starts:
+        yield text[min(starts):]
+
+
+def extract_json(text: str):
+    """Parses the JSON value in a model answer; raises StructuredOutputError if there is none."""
+    if not text or not text.strip():
+        raise StructuredOutputError("empty answer")
+    for candidate in _candidates(text):
+        try:
+            return json.loads(candidate)
+        except ValueError:
+            pass
+        start = min([i for i in (candidate.find("{"), candidate.find("[")) if i >= 0], default=-1)
+        if start < 0:
+            continue
+        body, stack, in_string, escape, cuts = _scan(candidate[start:])
+        attempt = body
+        for _ in range(_MAX_TRUNCATION_STEPS):
+            try:
+                value = json.loads(_close(attempt, stack, in_string, escape))
+                _stats["repaired_locally"] += 1
+                return value
+            except ValueError:
+                pass
+            # drop the last (probably partial) entry and try again
+            if not cuts:
+                break
+            attempt = body[:cuts.pop()]
+            _, stack, in_string, escape, _ = _scan(attempt)
+    raise StructuredOutputError("no JSON found in answer")
+
+
+# =====================================
+# Schema validation
+# =====================================
+
+def validate(data, schema: dict, path: str = "") -> list:
+    """Returns the paths of missing or invalid fields (empty list = valid)."""
+    if not isinstance(data, dict):
+        return [path or "$"]
+    problems = []
+    for raw_key, spec in schema.items():
+        optional = raw_key.endswith("?")
+        key = raw_key.rstrip("?")
+        field_path = f"{path}.{key}" if path else key
+        if key not in data or data[key] is None:
+            if not optional:
+                problems.append(field_path)
+            continue
+        if not _matches(data[key], spec, optional):
+            problems.append(field_path)
+        elif isinstance(spec, dict):
+            problems.extend(validate(data[key], spec, field_path))
+    return problems
+
+
+def _matches(value, spec, optional: bool) -> bool:
+    if isinstance(spec, dict):
+        return isinstance(value, dict)
+    if isinstance(spec, list):
+        if not isinstance(value, list) or (not value and not optional):
+            return False
+        item = spec[0] if spec else None
+        if isinstance(item, dict):
+            return all(not validate(v, item) for v in value)
+        return item is None or all(_matches(v, item, True) for v in value)
+    if not isinstance(value, spec) or isinstance(value, bool) and spec in (int, float):
+        return False
+    if not optional and isinstance(value, (str, list, dict)) and not value:
+        return False
+    return True
+
+
+def _example(spec):
+    if isinstance(spec, dict):
+        return {k.rstrip("?"): _example(v) for k, v in spec.items()}
+    if isinstance(spec, list):
+        return [_example(spec[0])] if spec else []
+    if isinstance(spec, tuple):
+        return _example(spec[0])
+    if spec is str:
+        return "..."
+    if spec is dict:
+        return {}
+    if spec is list:
+        return []
+    if spec in (int, float):
+        return 0
+    if spec is bool:
+        return True
+    return None
+
+
+def _subschema(schema: dict, paths: list) -> dict:
+    """Skeleton of only the fields named in `paths` (top-level granularity for nested dicts)."""
+    out = {}
+    for path in paths:
+        node_schema, node_out = schema, out
+        parts = path.split(".")
+        for i, part in enumerate(parts):
+            key = part if part in node_schema else f"{part}?"
+            spec = node_schema.get(key)
+            if spec is None:
+                break
+            if i == len(parts) - 1 or not isinstance(spec, dict):
+                node_out[part] = _example(spec)
+                break
+            node_schema = spec
+            node_out = node_out.setdefault(part, {})
+    return out
+
+
+def _merge(base: dict, patch: dict):
+    for key, value in patch.items():
+        if isinstance(value, dict) and isinstance(base.get(key), dict):
+            _merge(base[key], value)
+        else:
+            base[key] = value
+
+
+# =====================================
+# Parse + targeted repair
+# =====================================
+
+async def parse(
+    raw: str,
+    schema: dict,
+    *,
+    prompt: str,
+    call: Optional[Callable[[str], Awaitable[str]]] = None,
+    label: str = "",
+):
+    """
+    Parses `raw` and validates it against `schema`. Missing/invalid fields are
+    requested once more via `call(repair_prompt)` (only those fields) and merged.
+    Returns (data, remaining problem paths).
+    """
+    try:
+        data = extract_json(raw)
+    except StructuredOutputError:
+        data = {}
+    if not isinstance(data, dict):
+        data = {}
+
+    problems = validate(data, schema)
+    if not problems:
+        _stats["valid"] += 1
+        return data, []
+    if call is None:
+        _stats["invalid"] += 1
+        return data, problems
+
+    print(f"🩹 {label or 'structured output'}: requesting only {problems}")
+    _stats["repair_calls"] += 1
+    skeleton = json.dumps(_subschema(schema, problems), indent=2)
+    repair_prompt = f"""{prompt}
+
+---
+An earlier answer to this task was incomplete. Return ONLY a JSON object with
+these fields, nothing else (no markdown): {", ".join(problems)}
+Shape:
+{skeleton}
+"""
+    try:
+        patch = extract_json(await call(repair_prompt))
+        if isinstance(patch, dict):
+            _merge(data, patch)
+    except Exception as e:
+        print(f"⚠️ Repair call failed ({label}):", e)
+
+    problems = validate(data, schema)
+    _stats["repaired" if not problems else "invalid"] += 1
+    return data, problems
+
+
+def stats() -> dict:
+    return dict(_stats)
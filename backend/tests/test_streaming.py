@@ -0,0 +1,32 @@
+import json
+
+from backend.streaming import LessonStreamParser
+
+
+def _parse(doc: str, chunk_size: int = 5) -> list:
+    parser = LessonStreamParser()
+    lessons = []
+    for i in range(0, len(doc), chunk_size):
+        lessons += parser.feed(doc[i:i + chunk_size])
+    return lessons
+
+
+def test_streams_top_level_lessons():
+    doc = json.dumps({"course_title": "T", "lessons": [{"lesson_title": "A"}, {"lesson_title": "B"}]})
+    assert _parse(doc) == [{"lesson_title": "A"}, {"lesson_title": "B"}]
+
+
+def test_ignores_nested_lessons_key():
+    doc = json.dumps({
+        "meta": {"lessons": [{"lesson_title": "nested"}]},
+        "lessons": [{"lesson_title": "A", "parts": {"lessons": [{"x": 1}]}}, {"lesson_title": "B"}],
+    })
+    assert _parse(doc) == [
+        {"lesson_title": "A", "parts": {"lessons": [{"x": 1}]}},
+        {"lesson_title": "B"},
+    ]
+
+
+def test_top_level_array():
+    doc = json.dumps([{"lesson_title": "A"}, {"lesson_title": "B"}])
+    assert _parse(doc, chunk_size=3) == [{"lesson_title": "A"}, {"lesson_title": "B"}]
@@ -0,0 +1,196 @@
+"""
+Cheap lexical ranking of extracted material for prompt context.
+
+Text is split into paragraph-aligned chunks, indexed in a small BM25 inverted
+index and scored against a query (course topic / outcome / lesson title). Only
+documents that contain a query term are touched, so scoring costs
+O(postings of the query terms), not O(corpus). pack_context() then fills a
+token budget with the best chunks and returns them in reading order.
+
+Pure Python on purpose: the backend has no numpy dependency, and the corpora
+(a handful of uploaded files) are small enough that sparse postings beat dense
+vectors anyway.
+"""
+import math
+import re
+from collections import Counter, defaultdict
+
+# rough token estimate for budgeting (OpenAI tokenizers average ~4 chars/token)
+CHARS_PER_TOKEN = 4
+CHUNK_CHARS = 1200
+MIN_CHUNK_CHARS = 200
+
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+_WORD = re.compile(r"\w+", re.UNICODE)
+STOPWORDS = {
+    # en
+    "the", "and", "for", "are", "but", "not", "you", "your", "with", "this", "that", "from",
+    "they", "have", "has", "had", "was", "were", "will", "would", "can", "could", "should",
+    "what", "when", "where", "which", "who", "how", "all", "any", "our", "out", "into", "about",
+    "their", "there", "them", "then", "than", "its", "also", "more", "most", "such", "only",
+    "other", "some", "these", "those", "been", "being", "does", "did", "doing", "each", "very",
+    # de
+    "der", "die", "das", "und", "oder", "aber", "nicht", "ist", "sind", "war", "wir", "ihr",
+    "sie", "ich", "mit", "von", "für", "auf", "aus", "bei", "ein", "eine", "einer", "eines",
+    "einem", "einen", "dem", "den", "des", "zu", "zum", "zur", "im", "in", "an", "am", "als",
+    "auch", "es", "so", "wie", "wird", "werden", "kann", "können", "noch", "nur", "schon",
+    "sich", "dass", "über", "unter", "nach", "vor", "bis", "durch", "wenn", "dann", "hier",
+    "ihre", "ihren", "ihrer", "unsere", "sehr", "mehr", "alle", "diese", "dieser", "dieses",
+}
+
+
+def tokenize(text: str) -> list:
+    return [
+        w for w in _WORD.findall(text.lower())
+        if len(w) > 1 and not w.isdigit() and w not in STOPWORDS
+    ]
+
+
+def estimate_tokens(text: str) -> int:
+    return max(1, len(text) // CHARS_PER_TOKEN)
+
+
+def chunk_text(text: str, max_chars: int = CHUNK_CHARS) -> list:
+    """Splits text into chunks of up to max_chars along paragraph / sentence / word borders."""
+    pieces = []
+    for para in re.split(r"\n\s*\n", text):
+        para = " ".join(para.split())
+        if not para:
+            continue
+        if len(para) <= max_chars:
+            pieces.append(para)
+            continue
+        sentence_buf = ""
+        for sentence in re.split(r"(?<=[.!?])\s+", para):
+            while len(sentence) > max_chars:
+                cut = sentence.rfind(" ", 0, max_chars)
+                cut = cut if cut > 0 else max_chars
+                pieces.append(sentence[:cut])
+                sentence = sentence[cut:].lstrip()
+            if sentence_buf and len(sentence_buf) + 1 + len(sentence) > max_chars:
+                pieces.append(sentence_buf)
+                sentence_buf = sentence
+            else:
+                sentence_buf = f"{sentence_buf} {sentence}".strip()
+        if sentence_buf:
+            pieces.append(sentence_buf)
+
+    # merge small neighbours (headings, short lines) into the following chunk
+    chunks, buf = [], ""
+    for piece in pieces:
+        if buf and len(buf) + 1 + len(piece) > max_chars:
+            chunks.append(buf)
+            buf = ""
+        buf = f"{buf}\n{piece}" if buf else piece
+        if len(buf) >= MIN_CHUNK_CHARS:
+            chunks.append(buf)
+            buf = ""
+    if buf:
+        chunks.append(buf)
+    return chunks
+
+
+class BM25Index:
+    """Inverted index over a list of documents (token lists)."""
+
+    def __init__(self, docs: list):
+        self.doc_len = [len(d) for d in docs]
+        self.avg_len = (sum(self.doc_len) / len(docs)) if docs else 0.0
+        self.postings = defaultdict(list)  # term -> [(doc index, term frequency)]
+        for i, doc in enumerate(docs):
+            for term, tf in Counter(doc).items():
+                self.postings[term].append((i, tf))
+        n = len(docs)
+        self.idf = {
+            term: math.log(1 + (n - len(p) + 0.5) / (len(p) + 0.5))
+            for term, p in self.postings.items()
+        }
+
+    def scores(self, query_tokens: list) -> dict:
+        """{doc index: score} for all documents containing at least one query term."""
+        scores = defaultdict(float)
+        for term, qtf in Counter(query_tokens).items():
+            idf = self.idf.get(term)
+            if idf is None:
+                continue
+            for i, tf in self.postings[term]:
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * self.doc_len[i] / (self.avg_len or 1))
+                scores[i] += qtf * idf * tf * (BM25_K1 + 1) / (tf + norm)
+        return scores
+
+    def top_k(self, query_tokens: list, k: int) -> list:
+        """[(doc index, score)] best first."""
+        ranked = sorted(self.scores(query_tokens).items(), key=lambda x: (-x[1], x[0]))
+        return ranked[:k]
+
+    def key_terms(self, n: int = 20) -> list:
+        """Terms that characterize the corpus (frequent, but not everywhere)."""
+        weight = {
+            term: sum(tf for _, tf in postings) * self.idf[term]
+            for term, postings in self.postings.items()
+        }
+        return sorted(weight, key=lambda t: (-weight[t], t))[:n]
+
+    def to_dict(self) -> dict:
+        return {"doc_len": self.doc_len, "postings": self.postings}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "BM25Index":
+        index = cls([])
+        index.doc_len = data["doc_len"]
+        index.avg_len = (sum(index.doc_len) / len(index.doc_len)) if index.doc_len else 0.0
+        index.postings = defaultdict(list, {t: [tuple(p) for p in ps] for t, ps in data["postings"].items()})
+        n = len(index.doc_len)
+        index.idf = {
+            term: math.log(1 + (n - len(p) + 0.5) / (len(p) + 0.5))
+            for term, p in index.postings.items()
+        }
+        return index
+
+
+def pack_context(documents: list, query: str, budget_tokens: int,
+                 max_chunk_chars: int = CHUNK_CHARS) -> list:
+    """
+    documents: [{"filename", "content"}]. Returns the selected chunks as
+    [{"filename", "chunk", "text", "score"}] in document order, within budget_tokens.
+    Without a usable query, the corpus' own key terms are used as query.
+    """
+    chunks = []
+    for doc in documents:
+        for ci, text in enumerate(chunk_text(doc.get("content") or "", max_chunk_chars)):
+            chunks.append({"filename": doc.get("filename"), "chunk": ci, "text": text})
+    if not chunks:
+        return []
+
+    index = BM25Index([tokenize(c["text"]) for c in chunks])
+    query_tokens = tokenize(query or "")
+    if not any(t in index.idf for t in query_tokens):
+        query_tokens = index.key_terms()
+    scores = index.scores(query_tokens)
+
+    ranked = sorted(range(len(chunks)), key=lambda i: (-scores.get(i, 0.0), i))
+    selected, used = [], 0
+    for i in ranked:
+        cost = estimate_tokens(chunks[i]["text"])
+        if used + cost > budget_tokens:
+            continue
+        selected.append(i)
+        used += cost
+
+    return [
+        {**chunks[i], "score": round(scores.get(i, 0.0), 3)}
+        for i in sorted(selected)
+    ]
+
+
+def format_context(selected: list) -> str:
+    """Selected chunks as prompt text, grouped under their file names."""
+    out, current = [], None
+    for c in selected:
+        if c["filename"] != current:
+            current = c["filename"]
+            out.append(f"### {current}")
+        out.append(c["text"])
+    return "\n\n".join(out)
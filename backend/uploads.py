@@ -0,0 +1,313 @@
+"""
+Resumable, chunked uploads for lesson videos (tus-style offsets).
+
+A client creates a session (course_id, lesson_id, filename, total length), then
+PATCHes the bytes starting at the current offset. Bytes are streamed straight
+into generated/<course_id>/<lesson_id>/<filename>.part, so memory per upload is
+constant; the committed offset is the size of the .part file, so an interrupted
+upload resumes from whatever reached the disk. When the offset reaches the
+length, the .part file is renamed to its final name.
+
+Session metadata lives in a JSON sidecar under UPLOAD_SESSION_DIR. Only one PATCH
+per upload runs at a time, across all uvicorn workers: it holds an flock on
+<upload_id>.lock next to the sidecar.
+"""
+import asyncio
+import hashlib
+import json
+import os
+import re
+import time
+import uuid
+from contextlib import contextmanager
+from pathlib import Path, PurePath
+from typing import AsyncIterator, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows: nur prozesslokal gesperrt
+    fcntl = None
+
+UPLOAD_ROOT = Path("generated")  # served under /generated
+UPLOAD_SESSION_DIR = Path(os.environ.get("UPLOAD_SESSION_DIR", ".cache/uploads"))
+UPLOAD_MAX_BYTES = int(os.environ.get("UPLOAD_MAX_MB", "4096")) * 1024 * 1024
+UPLOAD_SESSION_TTL = int(os.environ.get("UPLOAD_SESSION_TTL_SECONDS", str(24 * 3600)))
+# bytes collected from the request stream before one disk write
+UPLOAD_WRITE_BUFFER = 1024 * 1024
+
+VIDEO_SUFFIXES = {".webm", ".mp4", ".mov", ".mkv", ".m4v"}
+# /generated/slides is not served (see serve_generated), uploads there would be unreachable
+RESERVED_COURSE_IDS = {"slides"}
+
+_SAFE_SEGMENT = re.compile(r"^[A-Za-z0-9][A-Za-z0-9_.-]{0,127}$")
+_SAFE_CHARS = re.compile(r"[^A-Za-z0-9_.-]+")
+_UPLOAD_ID = re.compile(r"^[0-9a-f]{32}$")
+
+# upload ids locked by this process (the only lock without fcntl)
+_busy: set = set()
+
+
+class UploadError(Exception):
+    status_code = 400
+
+
+class UploadNotFound(UploadError):
+    status_code = 404
+
+
+class UploadConflict(UploadError):
+    status_code = 409
+
+
+class UploadTooLarge(UploadError):
+    status_code = 413
+
+
+def safe_segment(value: str, what: str) -> str:
+    """course_id / lesson_id: a single path segment, no traversal."""
+    if not _SAFE_SEGMENT.match(value or "") or ".." in value:
+        raise UploadError(f"invalid {what}")
+    return value
+
+
+def safe_filename(filename: str) -> str:
+    """Strips directories and unusual characters; only video suffixes are accepted."""
+    name = PurePath((filename or "").replace("\\", "/")).name
+    name = _SAFE_CHARS.sub("_", name).lstrip("._") or "video.webm"
+    if PurePath(name).suffix.lower() not in VIDEO_SUFFIXES:
+        raise UploadError(f"unsupported video type: {PurePath(name).suffix or name}")
+    return name[-128:]
+
+
+def target_dir(course_id: str, lesson_id: str) -> Path:
+    if course_id in RESERVED_COURSE_IDS:
+        raise UploadError(f"course_id '{course_id}' is reserved")
+    return UPLOAD_ROOT / safe_segment(course_id, "course_id") / safe_segment(lesson_id, "lesson_id")
+
+
+def public_path(course_id: str, lesson_id: str, filename: str) -> str:
+    return f"/generated/{course_id}/{lesson_id}/{filename}"
+
+
+# =====================================
+# Sessions
+# =====================================
+
+def _sidecar(upload_id: str) -> Path:
+    if not _UPLOAD_ID.match(upload_id or ""):
+        raise UploadNotFound("unknown upload")
+    return UPLOAD_SESSION_DIR / f"{upload_id}.json"
+
+
+def _lock_path(upload_id: str) -> Path:
+    return _sidecar(upload_id).with_suffix(".lock")
+
+
+@contextmanager
+def _upload_lock(upload_id: str, path: Optional[Path] = None):
+    """Non-blocking exclusive lock for one upload; raises UploadConflict if it is held."""
+    path = path or _lock_path(upload_id)
+    UPLOAD_SESSION_DIR.mkdir(parents=True, exist_ok=True)
+    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        if upload_id in _busy:
+            raise UploadConflict("upload is busy")
+        if fcntl is not None:
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                raise UploadConflict("upload is busy") from None
+        _busy.add(upload_id)
+        try:
+            yield
+        finally:
+            _busy.discard(upload_id)
+    finally:
+        os.close(fd)  # gibt auch das flock frei
+
+
+def _part_path(session: dict) -> Path:
+    return target_dir(session["course_id"], session["lesson_id"]) / f"{session['filename']}.part"
+
+
+def _write_sidecar(session: dict):
+    UPLOAD_SESSION_DIR.mkdir(parents=True, exist_ok=True)
+    path = _sidecar(session["upload_id"])
+    tmp = path.with_suffix(".tmp")
+    tmp.write_text(json.dumps(session), encoding="utf-8")
+    os.replace(tmp, path)
+
+
+def _target_lock_path(course_id: str, lesson_id: str, filename: str) -> Path:
+    digest = hashlib.sha1(f"{course_id}/{lesson_id}/{filename}".encode("utf-8")).hexdigest()
+    return UPLOAD_SESSION_DIR / f"target-{digest}.lock"
+
+
+def _find_session(course_id: str, lesson_id: str, filename: str) -> Optional[dict]:
+    """The session that currently owns this target's .part file, if any."""
+    for sidecar in UPLOAD_SESSION_DIR.glob("*.json"):
+        try:
+            session = json.loads(sidecar.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            continue
+        if (session.get("course_id"), session.get("lesson_id"), session.get("filename")) == (course_id, lesson_id, filename):
+            return session
+    return None
+
+
+def create_session(course_id: str, lesson_id: str, filename: str, length: int) -> dict:
+    """
+    Opens an upload for the target. If a live session already writes to the same
+    .part file, that session is returned (session["resumed"] = True, PATCH from its
+    offset) when the length matches, otherwise UploadConflict is raised.
+    """
+    folder = target_dir(course_id, lesson_id)
+    filename = safe_filename(filename)
+    if length <= 0:
+        raise UploadError("length must be positive")
+    if length > UPLOAD_MAX_BYTES:
+        raise UploadTooLarge(f"upload exceeds {UPLOAD_MAX_BYTES} bytes")
+
+    # serialisiert parallele Creates für dasselbe Ziel (auch über Worker hinweg)
+    lock_path = _target_lock_path(course_id, lesson_id, filename)
+    with _upload_lock(lock_path.stem, path=lock_path):
+        existing = _find_session(course_id, lesson_id, filename)
+        if existing is not None:
+            expired = existing.get("created_at", 0) < time.time() - UPLOAD_SESSION_TTL
+            try:
+                if not expired:
+                    if existing.get("length") != length:
+                        raise UploadConflict("another upload for this file is in progress")
+                    session = get_session(existing["upload_id"])
+                    session["resumed"] = True
+                    return session
+            except UploadNotFound:
+                pass  # .part ist weg: Session ist tot, neu anlegen
+            # abgelaufen/tot: nur ersetzen, wenn gerade kein PATCH darauf läuft
+            with _upload_lock(existing["upload_id"]):
+                _sidecar(existing["upload_id"]).unlink(missing_ok=True)
+            _lock_path(existing["upload_id"]).unlink(missing_ok=True)
+
+        folder.mkdir(parents=True, exist_ok=True)
+        session = {
+            "upload_id": uuid.uuid4().hex,
+            "course_id": course_id,
+            "lesson_id": lesson_id,
+            "filename": filename,
+            "length": length,
+            "created_at": time.time(),
+        }
+        # no live session owns the .part file, so it starts from scratch
+        _part_path(session).write_bytes(b"")
+        _write_sidecar(session)
+        session["offset"] = 0
+        session["resumed"] = False
+        return session
+
+
+def get_session(upload_id: str) -> dict:
+    try:
+        session = json.loads(_sidecar(upload_id).read_text(encoding="utf-8"))
+    except FileNotFoundError:
+        raise UploadNotFound("unknown upload") from None
+    session["offset"] = current_offset(session)
+    return session
+
+
+def current_offset(session: dict) -> int:
+    try:
+        return _part_path(session).stat().st_size
+    except FileNotFoundError:
+        raise UploadNotFound("upload data is gone, start a new upload") from None
+
+
+def _write_chunk(f, data: bytes):
+    f.write(data)
+    f.flush()
+
+
+def _fsync_close(f):
+    f.flush()
+    os.fsync(f.fileno())
+    f.close()
+
+
+async def append(upload_id: str, offset: int, stream: AsyncIterator[bytes]) -> dict:
+    """
+    Appends the request body at `offset`. Raises UploadConflict if the offset is not
+    the committed one (client must HEAD and resume). Returns the updated session;
+    session["complete"] is True once the final file is in place.
+    """
+    with _upload_lock(upload_id):
+        session = get_session(upload_id)
+        if offset != session["offset"]:
+            raise UploadConflict(f"offset mismatch, expected {session['offset']}")
+
+        remaining = session["length"] - offset
+        f = open(_part_path(session), "ab")
+        buffer = bytearray()
+        try:
+            async for chunk in stream:
+                if len(chunk) > remaining:
+                    raise UploadTooLarge("more data than announced")
+                remaining -= len(chunk)
+                buffer += chunk
+                if len(buffer) >= UPLOAD_WRITE_BUFFER:
+                    await asyncio.to_thread(_write_chunk, f, bytes(buffer))
+                    buffer.clear()
+        finally:
+            # also on disconnect: everything received so far gets committed
+            if buffer:
+                await asyncio.to_thread(_write_chunk, f, bytes(buffer))
+            await asyncio.to_thread(_fsync_close, f)
+
+        session["offset"] = session["length"] - remaining
+        session["complete"] = remaining == 0
+        if session["complete"]:
+            _finalize(session)
+        return session
+
+
+def _finalize(session: dict):
+    part = _part_path(session)
+    os.replace(part, part.with_suffix(""))
+    _sidecar(session["upload_id"]).unlink(missing_ok=True)
+    _lock_path(session["upload_id"]).unlink(missing_ok=True)
+    print(f"🎬 Upload complete: {public_path(session['course_id'], session['lesson_id'], session['filename'])}")
+
+
+def delete_session(upload_id: str):
+    session = get_session(upload_id)
+    _part_path(session).unlink(missing_ok=True)
+    _sidecar(upload_id).unlink(missing_ok=True)
+    _lock_path(upload_id).unlink(missing_ok=True)
+
+
+def purge_expired(now: Optional[float] = None) -> int:
+    """Removes sessions (and their .part files) older than UPLOAD_SESSION_TTL."""
+    if not UPLOAD_SESSION_DIR.exists():
+        return 0
+    cutoff = (now or time.time()) - UPLOAD_SESSION_TTL
+    purged = 0
+    for sidecar in UPLOAD_SESSION_DIR.glob("*.json"):
+        try:
+            session = json.loads(sidecar.read_text(encoding="utf-8"))
+            if session.get("created_at", 0) >= cutoff:
+                continue
+            with _upload_lock(sidecar.stem):
+                _part_path(session).unlink(missing_ok=True)
+                _lock_path(sidecar.stem).unlink(missing_ok=True)
+        except UploadConflict:
+            continue  # PATCH läuft gerade
+        except (OSError, ValueError, UploadError):
+            pass
+        sidecar.unlink(missing_ok=True)
+        purged += 1
+    # lock files left behind by requests for sessions that were already gone
+    for lock_file in UPLOAD_SESSION_DIR.glob("*.lock"):
+        try:
+            if not lock_file.with_suffix(".json").exists() and lock_file.stat().st_mtime < cutoff:
+                lock_file.unlink(missing_ok=True)
+        except OSError:
+            pass
+    return purged
@@ -0,0 +1,138 @@
+"""
+Generation worker: `python -m backend.worker`
+
+Claims background jobs from the job queue (see job_queue.py) and runs them
+outside the API process, so generation can be scaled separately from request
+handling and survives API deploys. Start the API with JOB_EXECUTION=queue.
+
+While a job runs, its lease is renewed every JOB_LEASE_SECONDS / 3. If the
+lease is lost (e.g. the worker was paused longer than the lease), the local run
+is cancelled because another worker has taken the job over. On SIGTERM/SIGINT
+the worker stops claiming, gives running jobs WORKER_SHUTDOWN_GRACE seconds and
+then hands the rest back to the queue.
+
+Progress and results go to the shared job store, so /api/job-status and
+/api/job-events on the API side work unchanged. On start (and periodically)
+the worker also resumes full-course jobs that stopped sending heartbeats;
+they continue from their checkpoints.
+"""
+import asyncio
+import os
+import signal
+import socket
+import time
+import uuid
+from contextlib import suppress
+
+from . import llm_gateway, process_pool
+from .job_queue import JOB_LEASE_SECONDS, get_job_queue
+from .main import EVENTS, JOB_STALE_SECONDS, JOBS, _job_coroutine, _recover_stale_jobs
+
+WORKER_CONCURRENCY = max(1, int(os.environ.get("WORKER_CONCURRENCY", "2")))
+WORKER_POLL_INTERVAL = float(os.environ.get("WORKER_POLL_INTERVAL", "1.0"))
+WORKER_SHUTDOWN_GRACE = float(os.environ.get("WORKER_SHUTDOWN_GRACE", "30"))
+HEARTBEAT_INTERVAL = max(1.0, JOB_LEASE_SECONDS / 3)
+
+
+class Worker:
+    def __init__(self, queue=None, concurrency: int = WORKER_CONCURRENCY):
+        self.queue = queue or get_job_queue()
+        self.concurrency = concurrency
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+        self.running = set()
+        self.stopping = asyncio.Event()
+
+    async def _requeue_expired(self):
+        result = self.queue.requeue_expired()
+        for job_id in result["requeued"]:
+            print(f"♻️ Job {job_id}: lease expired, re-queued")
+        for job_id in result["failed"]:
+            print(f"💥 Job {job_id}: lease expired too often, giving up")
+            await JOBS.update(job_id, status="error", error="worker lost (lease expired)")
+            await EVENTS.publish(job_id, "error", error="worker lost (lease expired)")
+
+    async def _run(self, job: dict):
+        job_id = job["job_id"]
+        print(f"🛠️ [{self.worker_id}] job {job_id} ({job['kind']}, attempt {job['attempts']})")
+        task = asyncio.create_task(_job_coroutine(job["kind"], job_id, job["payload"]))
+        try:
+            while True:
+                done, _ = await asyncio.wait({task}, timeout=HEARTBEAT_INTERVAL)
+                if done:
+                    break
+                await JOBS.update(job_id)  # sign of life for stale-job detection
+                if not self.queue.heartbeat(job_id, self.worker_id):
+                    print(f"⚠️ Job {job_id}: lease lost, stopping local run")
+                    task.cancel()
+                    with suppress(asyncio.CancelledError, Exception):
+                        await task
+                    return
+        except asyncio.CancelledError:
+            # shutdown: abbrechen und für einen anderen Worker freigeben
+            task.cancel()
+            with suppress(asyncio.CancelledError, Exception):
+                await task
+            self.queue.release(job_id, self.worker_id)
+            print(f"↩️ Job {job_id} handed back to the queue")
+            raise
+
+        error = task.exception()
+        if error is not None:
+            await JOBS.update(job_id, status="error", error=str(error))
+            await EVENTS.publish(job_id, "error", error=str(error))
+            self.queue.fail(job_id, self.worker_id, str(error))
+        elif await JOBS.get_status(job_id) == "error":
+            # the job recorded its own failure
+            self.queue.fail(job_id, self.worker_id, (await JOBS.get_meta(job_id) or {}).get("error") or "")
+        else:
+            self.queue.complete(job_id, self.worker_id)
+
+    async def run(self):
+        print(f"👷 Worker {self.worker_id} started (concurrency {self.concurrency})")
+        stop = asyncio.ensure_future(self.stopping.wait())
+        next_recovery = 0.0
+        while not self.stopping.is_set():
+            try:
+                await self._requeue_expired()
+                if time.monotonic() >= next_recovery:
+                    # jobs whose process died without a lease (e.g. inline runs) -> resume
+                    # via this worker's queue, so they get a lease like any other job
+                    await _recover_stale_jobs(start=self.queue.enqueue)
+                    next_recovery = time.monotonic() + JOB_STALE_SECONDS / 2
+                while len(self.running) < self.concurrency:
+                    job = self.queue.claim(self.worker_id)
+                    if job is None:
+                        break
+                    task = asyncio.create_task(self._run(job))
+                    self.running.add(task)
+                    task.add_done_callback(self.running.discard)
+            except Exception as e:
+                print("⚠️ Worker poll failed:", e)
+            # next poll: after the interval, when a job finishes, or on shutdown
+            await asyncio.wait({stop, *self.running}, timeout=WORKER_POLL_INTERVAL,
+                               return_when=asyncio.FIRST_COMPLETED)
+
+        if self.running:
+            print(f"⏳ Waiting up to {WORKER_SHUTDOWN_GRACE:.0f}s for {len(self.running)} running jobs")
+            _, pending = await asyncio.wait(set(self.running), timeout=WORKER_SHUTDOWN_GRACE)
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+        print(f"👋 Worker {self.worker_id} stopped")
+
+
+async def main():
+    worker = Worker()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        with suppress(NotImplementedError):
+            loop.add_signal_handler(sig, worker.stopping.set)
+    try:
+        await worker.run()
+    finally:
+        await llm_gateway.close()
+        process_pool.shutdown()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
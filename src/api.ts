@@ -105,9 +105,16 @@ export async function sendAudienceToBackend(audience: string, audienceLevel: str
 // ---------------------------------------------------------
 // MATERIAL UPLOAD
 // ---------------------------------------------------------
-export async function uploadMaterialsToBackend(files: File[]) {
+export async function uploadMaterialsToBackend(
+    files: File[],
+    context?: { topic?: string; outcome?: string; tokenBudget?: number }
+) {
     const formData = new FormData();
     files.forEach((file) => formData.append("files", file));
+    // Thema/Ziel steuern, welche Abschnitte der Dateien in den Prompt kommen
+    if (context?.topic) formData.append("topic", context.topic);
+    if (context?.outcome) formData.append("outcome", context.outcome);
+    if (context?.tokenBudget) formData.append("token_budget", String(context.tokenBudget));
 
     const res = await fetch(`${base}/api/materials`, {
         method: "POST",
@@ -121,45 +128,242 @@ export async function uploadMaterialsToBackend(files: File[]) {
 // ---------------------------------------------------------
 // FULL COURSE GENERATION
 // ---------------------------------------------------------
-export async function generateFullCourse(courseData?: any) {
-    try {
-        const response = await fetch(`${base}/api/generate-full-course`, {
-            method: "POST",
-            headers: { "Content-Type": "application/json" },
-            body: JSON.stringify(courseData || {}),
-        });
+const FULL_COURSE_ATTEMPTS = 3;
+
+// crypto.randomUUID gibt es nur in secure contexts (HTTPS/localhost);
+// getRandomValues auch über plain HTTP, Math.random als letzter Fallback.
+function newIdempotencyKey(): string {
+    const c = globalThis.crypto;
+    if (typeof c?.randomUUID === "function") return c.randomUUID();
+    const bytes = new Uint8Array(16);
+    if (typeof c?.getRandomValues === "function") {
+        c.getRandomValues(bytes);
+    } else {
+        for (let i = 0; i < bytes.length; i++) bytes[i] = Math.floor(Math.random() * 256);
+    }
+    const hex = Array.from(bytes, (b) => b.toString(16).padStart(2, "0")).join("");
+    return `${Date.now().toString(36)}-${hex}`;
+}
+
+// Eine Idempotency-Key pro Klick: Retries (und Doppelklicks innerhalb des Fensters)
+// liefern den bereits laufenden Job zurück statt einen zweiten zu starten.
+export async function generateFullCourse(courseData?: any, idempotencyKey: string = newIdempotencyKey()) {
+    for (let attempt = 1; ; attempt++) {
+        try {
+            const response = await fetch(`${base}/api/generate-full-course`, {
+                method: "POST",
+                headers: { "Content-Type": "application/json", "Idempotency-Key": idempotencyKey },
+                body: JSON.stringify(courseData || {}),
+            });
+
+            if (!response.ok) {
+                const text = await response.text();
+                const retryable = response.status >= 500;
+                throw Object.assign(new Error(text), { retryable });
+            }
 
-        if (!response.ok) {
-            const text = await response.text();
-            throw new Error(text);
+            return await response.json();
+        } catch (err: any) {
+            // Netzwerkfehler (TypeError) und 5xx werden mit demselben Key wiederholt
+            const retryable = err instanceof TypeError || err?.retryable;
+            if (!retryable || attempt >= FULL_COURSE_ATTEMPTS) {
+                console.error("💥 Full course generation failed:", err);
+                throw err;
+            }
+            await new Promise((resolve) => setTimeout(resolve, 1000 * attempt));
         }
+    }
+}
 
-        return await response.json();
-    } catch (err) {
-        console.error("💥 Full course generation failed:", err);
-        throw err;
+// ---------------------------------------------------------
+// JOB EVENTS (Server-Sent Events)
+// ---------------------------------------------------------
+export interface JobEvent {
+    seq: number;
+    event: string;
+    lesson?: number;
+    title?: string;
+    lessons?: number;
+    error?: string;
+    [key: string]: any;
+}
+
+function describeJobEvent(evt: JobEvent): string {
+    switch (evt.event) {
+        case "job_started":
+            return `Generating ${evt.lessons} lessons...`;
+        case "resumed":
+            return "Resuming course generation...";
+        case "lesson_started":
+            return `Writing lesson ${evt.lesson}: ${evt.title}`;
+        case "lesson_finished":
+            return `Lesson ${evt.lesson} finished: ${evt.title}`;
+        case "zip_built":
+            return "Packaging course files...";
+        case "logo_done":
+            return "Logo ready";
+        case "banner_done":
+            return "Banner ready";
+        default:
+            return evt.event;
     }
 }
 
+// Aufeinanderfolgende Verbindungsfehler ohne ein Event, bevor wir aufgeben (-> Polling)
+const JOB_EVENTS_MAX_RECONNECTS = 10;
+
+// Resolves once the job reports done/error; rejects if the stream stays unavailable.
+// Transient drops (proxy, server restart) are left to EventSource's own reconnect,
+// which resumes via Last-Event-ID.
+export function waitForJobEvents(jobId: string, onEvent?: (evt: JobEvent) => void): Promise<JobEvent> {
+    return new Promise((resolve, reject) => {
+        const source = new EventSource(`${base}/api/job-events/${jobId}`);
+        const types = [
+            "queued", "resumed", "job_started", "lesson_started", "lesson_finished", "lesson_failed",
+            "zip_built", "logo_done", "logo_failed", "banner_done", "banner_failed", "done", "error",
+        ];
+        let failures = 0;
+
+        types.forEach((type) => {
+            source.addEventListener(type, (e) => {
+                failures = 0;
+                const evt: JobEvent = JSON.parse((e as MessageEvent).data);
+                if (onEvent) onEvent(evt);
+                if (type === "done" || type === "error") {
+                    source.close();
+                    resolve(evt);
+                }
+            });
+        });
+
+        source.onopen = () => {
+            failures = 0;
+        };
+
+        source.onerror = () => {
+            failures++;
+            // CLOSED: the browser will not retry (e.g. 404); CONNECTING: it retries itself
+            if (source.readyState === EventSource.CLOSED || failures >= JOB_EVENTS_MAX_RECONNECTS) {
+                source.close();
+                reject(new Error("Job event stream closed"));
+            }
+        };
+    });
+}
+
 // ---------------------------------------------------------
 // JOB POLLING
 // ---------------------------------------------------------
 export async function pollJobStatus(jobId: string, onProgress?: (status: string) => void) {
+    // Push channel first; the loop below then only fetches the final result once.
+    if (typeof EventSource !== "undefined") {
+        try {
+            await waitForJobEvents(jobId, (evt) => onProgress?.(describeJobEvent(evt)));
+        } catch (err) {
+            console.warn("Job event stream unavailable, falling back to polling:", err);
+        }
+    }
+
     while (true) {
-        const res = await fetch(`${base}/api/job-status/${jobId}`);
+        // Status-only polls are tiny; the full result is fetched once the job is done.
+        const res = await fetch(`${base}/api/job-status/${jobId}?fields=status`);
         const data = await res.json();
 
         if (onProgress) onProgress(data.status);
 
-        if (data.status === "done" && data.result) {
-            sessionStorage.setItem("coursia_full_course", JSON.stringify(data.result));
-            return data.result;
+        if (data.status === "done") {
+            const fullRes = await fetch(`${base}/api/job-status/${jobId}?fields=full`);
+            const full = await fullRes.json();
+            sessionStorage.setItem("coursia_full_course", JSON.stringify(full.result));
+            return full.result;
         }
 
-        if (data.status === "failed") {
+        if (data.status === "failed" || data.status === "error") {
             throw new Error("Course generation failed");
         }
 
         await new Promise((resolve) => setTimeout(resolve, 3000));
     }
 }
+
+// ---------------------------------------------------------
+// VIDEO UPLOAD (resumable, chunked)
+// ---------------------------------------------------------
+const VIDEO_CHUNK_SIZE = 8 * 1024 * 1024;
+const VIDEO_UPLOAD_RETRIES = 5;
+
+interface VideoUploadState {
+    upload_id: string;
+    offset: number;
+    length: number;
+    complete: boolean;
+    video_url?: string;
+}
+
+async function getVideoUploadState(uploadId: string): Promise<VideoUploadState | null> {
+    const res = await fetch(`${base}/api/upload-video/${uploadId}`, { cache: "no-store" });
+    if (!res.ok) return null;
+    return res.json();
+}
+
+/**
+ * Uploads a recording in chunks. The session id is remembered in localStorage, so a
+ * retry after a dropped connection (or page reload) continues at the committed offset.
+ */
+export async function uploadVideoResumable(
+    video: Blob,
+    courseId: string,
+    lessonId: string,
+    filename: string,
+    onProgress?: (fraction: number) => void
+): Promise<string> {
+    const storageKey = `coursia_upload:${courseId}:${lessonId}:${filename}:${video.size}`;
+
+    let state: VideoUploadState | null = null;
+    const savedId = localStorage.getItem(storageKey);
+    if (savedId) state = await getVideoUploadState(savedId);
+
+    if (!state) {
+        const res = await fetch(`${base}/api/upload-video/sessions`, {
+            method: "POST",
+            headers: { "Content-Type": "application/json" },
+            body: JSON.stringify({ course_id: courseId, lesson_id: lessonId, filename, length: video.size }),
+        });
+        if (!res.ok) throw new Error(`Upload session failed: ${res.status}`);
+        state = await res.json();
+        localStorage.setItem(storageKey, state!.upload_id);
+    }
+
+    let failures = 0;
+    while (!state!.complete) {
+        onProgress?.(state!.offset / video.size);
+        try {
+            const res = await fetch(`${base}/api/upload-video/${state!.upload_id}`, {
+                method: "PATCH",
+                headers: {
+                    "Content-Type": "application/offset+octet-stream",
+                    "Upload-Offset": String(state!.offset),
+                },
+                body: video.slice(state!.offset, state!.offset + VIDEO_CHUNK_SIZE),
+            });
+            if (res.status === 404) {
+                localStorage.removeItem(storageKey);
+                throw new Error("Upload session expired");
+            }
+            if (!res.ok && res.status !== 409) throw new Error(`Upload failed: ${res.status}`);
+            // 409 = offset mismatch: ask the server where to continue
+            state = res.ok ? await res.json() : await getVideoUploadState(state!.upload_id);
+            if (!state) throw new Error("Upload session lost");
+            failures = 0;
+        } catch (err) {
+            if (++failures > VIDEO_UPLOAD_RETRIES || (err as Error).message.startsWith("Upload session")) throw err;
+            console.warn(`⚠️ Upload chunk failed (retry ${failures}):`, err);
+            await new Promise((resolve) => setTimeout(resolve, 1000 * 2 ** failures));
+            state = (await getVideoUploadState(state!.upload_id).catch(() => null)) || state;
+        }
+    }
+
+    localStorage.removeItem(storageKey);
+    onProgress?.(1);
+    return state!.video_url!;
+}
@@ -16,6 +16,7 @@ import { generatePreviewCourse } from "@/api";
 import { sendOutcomeToBackend } from "@/api";
 import { sendAudienceToBackend } from "@/api";
 import { generateFullCourse } from "@/api";
+import { pollJobStatus } from "@/api";
 import { API_BASE } from "@/cofig";
 
 
@@ -26,6 +27,7 @@ interface WizardData {
   courseSize?: string;
   materials?: string;
   links?: string;
+  files?: string[];
 }
 
 const IntakeWizard = () => {
@@ -122,44 +124,27 @@ Generate a realistic, engaging, English-only JSON course structure with:
       // 🚀 Automatische Weiterleitung zur Preview-Seite
       navigate("/preview", { state: { preview: parsed } });
       console.log("🚀 Generating full course package...");
-      try {
-        console.log("🚀 Triggering full course generation in background...");
-        const fullCourseResponse = await generateFullCourse();
-        console.log("✅ Full course generation started:", fullCourseResponse);
-      } catch (err) {
-        console.error("⚠️ Could not trigger full course generation:", err);
-      }
-
       try {
         const payload = {
           preview: {
             topic: data.outcome || "Untitled Course",
             lessons: parsed.lessons ?? parsed,
+            // Materialien für die Lektionen (Backend sucht pro Lektion passende Abschnitte)
+            materials: data.materials,
+            files: data.files,
           },
         };
         console.log("📤 Sending full course generation request to backend...");
-        const response = await fetch(`${API_BASE}/api/generate-full-course`, {
-          method: "POST",
-          headers: { "Content-Type": "application/json" },
-          body: JSON.stringify(payload),
-        });
-        console.log("📥 Full course response status:", response.status);
-
-        const job = await response.json();
+        const job = await generateFullCourse(payload);
         console.log("📦 Full course job started:", job);
 
-        // Optional: du kannst hier warten, bis das ZIP fertig ist
-        const interval = setInterval(async () => {
-          const statusRes = await fetch(`${API_BASE}/api/job/${job.jobId}`);
-          const statusData = await statusRes.json();
-
-          if (statusData.status === "done") {
-            clearInterval(interval);
-            console.log("✅ Full course ready!", statusData);
-            alert("Your full course package is ready for download!");
-            window.open(`${API_BASE}/generated/${job.jobId}.zip`, "_blank");
-          }
-        }, 2000);
+        // Warten, bis das ZIP fertig ist: SSE, bei Abbruch weiter per Polling
+        const fullCourse = await pollJobStatus(job.jobId, (status) =>
+          console.log("📡 Job progress:", status)
+        );
+        console.log("✅ Full course ready!", fullCourse);
+        alert("Your full course package is ready for download!");
+        window.open(`${API_BASE}/generated/${job.jobId}.zip`, "_blank");
       } catch (err) {
         console.error("❌ Error generating full course:", err);
       }
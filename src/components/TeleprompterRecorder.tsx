@@ -1,7 +1,7 @@
 import { useRef, useState } from "react";
 import { Button } from "@/components/ui/button";
 import { Loader2, CheckCircle, Video } from "lucide-react";
-import { API_BASE } from "@/cofig";
+import { uploadVideoResumable } from "@/api";
 
 interface TeleprompterRecorderProps {
     courseId: string;
@@ -19,6 +19,7 @@ export default function TeleprompterRecorder({
     const [isRecording, setIsRecording] = useState(false);
     const [isUploading, setIsUploading] = useState(false);
     const [recordedBlob, setRecordedBlob] = useState<Blob | null>(null);
+    const [uploadProgress, setUploadProgress] = useState(0);
 
     const startRecording = async () => {
         const stream = await navigator.mediaDevices.getUserMedia({ video: true, audio: true });
@@ -57,21 +58,22 @@ export default function TeleprompterRecorder({
     const uploadVideo = async () => {
         if (!recordedBlob) return;
         setIsUploading(true);
-
-        const formData = new FormData();
-        formData.append("video", recordedBlob, `${lessonId}.webm`);
-        formData.append("course_id", courseId);
-        formData.append("lesson_id", lessonId);
-
-        const response = await fetch(`${API_BASE}/api/upload-video`, {
-            method: "POST",
-            body: formData,
-        });
-
-        const data = await response.json();
-        setIsUploading(false);
-        if (data.video_url) {
-            onUploadComplete(data.video_url);
+        setUploadProgress(0);
+
+        try {
+            // Chunked + resumable: a retry continues where the last attempt stopped
+            const videoUrl = await uploadVideoResumable(
+                recordedBlob,
+                courseId,
+                lessonId,
+                `${lessonId}.webm`,
+                setUploadProgress
+            );
+            onUploadComplete(videoUrl);
+        } catch (err) {
+            console.error("❌ Video upload failed:", err);
+        } finally {
+            setIsUploading(false);
         }
     };
 
@@ -107,7 +109,7 @@ export default function TeleprompterRecorder({
 
                 {isUploading && (
                     <Button disabled className="bg-gray-400 text-white">
-                        <Loader2 className="mr-2 animate-spin w-4 h-4" /> Uploading...
+                        <Loader2 className="mr-2 animate-spin w-4 h-4" /> Uploading... {Math.round(uploadProgress * 100)}%
                     </Button>
                 )}
             </div>
@@ -33,7 +33,7 @@ const MaterialsStep = ({ onNext, onBack }: MaterialsStepProps) => {
       if (fileInput?.files && fileInput.files.length > 0) {
         const filesArray = Array.from(fileInput.files);
         console.log("📂 Uploading files to backend:", filesArray.map(f => f.name));
-        const res = await uploadMaterialsToBackend(filesArray);
+        const res = await uploadMaterialsToBackend(filesArray, { topic: materials });
         console.log("✅ Uploaded materials:", res);
         uploadedMaterials = res.materials || [];
       }
@@ -42,7 +42,8 @@ const MaterialsStep = ({ onNext, onBack }: MaterialsStepProps) => {
       onNext({
         materials: materials,
         links: links,
-        files: uploadedMaterials.map((m) => m.filename),
+        // Inhalts-Keys: das Backend findet darüber genau diese Dateien wieder
+        files: uploadedMaterials.map((m) => m.file_key ?? m.filename),
       });
 
       setUploading(false);
@@ -3,6 +3,7 @@ import { motion } from "framer-motion";
 import { Button } from "@/components/ui/button";
 import { Loader2, CheckCircle2 } from "lucide-react";
 import { API_BASE } from "@/cofig";
+import { generateFullCourse } from "@/api";
 
 export default function CourseView() {
     const [course, setCourse] = useState<any>(null);
@@ -112,14 +113,7 @@ export default function CourseView() {
                         onClick={async () => {
                             setLoading(true);
                             try {
-                                const res = await fetch(`${API_BASE}/api/generate-full-course`, {
-                                    method: "POST",
-                                    headers: { "Content-Type": "application/json" },
-                                    body: JSON.stringify({ course: courseData }),
-                                });
-
-                                if (!res.ok) throw new Error("Fehler beim Generieren");
-                                const data = await res.json();
+                                const data = await generateFullCourse({ course: courseData });
 
                                 sessionStorage.setItem("coursia_full", JSON.stringify(data));
                                 alert("✅ Full Course erfolgreich generiert!");
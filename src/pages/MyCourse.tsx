@@ -279,7 +279,7 @@ const MyCourse = () => {
         }
         try {
             setDownloading(true);
-            const res = await fetch(course.zip);
+            const res = await fetch(toURL(course.zip));
             if (!res.ok) throw new Error("Download failed");
             const blob = await res.blob();
             const url = URL.createObjectURL(blob);
@@ -5,8 +5,7 @@ import { Check, Sparkles, ArrowLeft } from "lucide-react";
 import { Logo } from "@/components/Logo";
 import { ThemeToggle } from "@/components/ThemeToggle";
 import { BackgroundOrbs } from "@/components/BackgroundOrbs";
-import { pollJobStatus } from "@/api";
-import { API_BASE } from "@/cofig";
+import { generateFullCourse, pollJobStatus } from "@/api";
 
 interface PricingTier {
   name: string;
@@ -296,20 +295,14 @@ const Pricing = () => {
 
                     const previewData = JSON.parse(sessionStorage.getItem("coursia_preview") || "{}");
 
-                    const res = await fetch(`${API_BASE}/api/generate-full-course`, {
-                      method: "POST",
-                      headers: { "Content-Type": "application/json" },
-                      body: JSON.stringify({ course: previewData }),
-                    });
+                    const data = await generateFullCourse({ course: previewData });
 
-                    const data = await res.json();
+                    if (!data.jobId) throw new Error("No job ID returned from backend");
 
-                    if (!data.job_id) throw new Error("No job ID returned from backend");
-
-                    console.log("⏳ Job started, polling for status...", data.job_id);
+                    console.log("⏳ Job started, polling for status...", data.jobId);
 
                     // Polling starten
-                    const fullCourse = await pollJobStatus(data.job_id, (s) =>
+                    const fullCourse = await pollJobStatus(data.jobId, (s) =>
                       console.log("📡 Status:", s)
                     );
 